@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+
+#
+# Script (adaptiveDownload.py) to download packages in Range segments, with a number of connections that follows the throughput.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - segments are written to <file>.part, under the per-file lock of singleFlight.py.
+#		   - finished segments are kept in <file>.segments, and an interrupted download continues with the other segments.
+#		   - retries are counted per attempt without progress (with a backoff), failed segments are queued again,
+#		     and files that still fail are passed to fallback.
+#
+# Usage:
+#		   - statistics = downloadSegments([[url, targetFilename, size], ...], maximumConnections, fallback=downloadFallback)
+#		   - files without a size, or from servers without Range support, are passed to fallback([url, targetFilename, size]),
+#		     which returns False when the download failed.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import socket
+import threading
+
+try:
+	from urllib2 import Request, urlopen, URLError
+	from httplib import HTTPException
+except ImportError:
+	from urllib.request import Request, urlopen
+	from urllib.error import URLError
+	from http.client import HTTPException
+
+import downloadProgress
+import bandwidthLimiter
+import singleFlight
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+SEGMENT_RETRIES = 3
+#
+# A segment that failed SEGMENT_RETRIES times in a row is queued again (continuing at its last offset), at most
+# SEGMENT_REQUEUES times per file, and the retries wait RETRY_DELAY seconds, doubled each time up to MAXIMUM_RETRY_DELAY.
+#
+SEGMENT_REQUEUES = 3
+RETRY_DELAY = 0.5
+MAXIMUM_RETRY_DELAY = 8.0
+#
+# The controller starts with INITIAL_CONNECTIONS (it can go down to one) and looks at the throughput every CONTROL_INTERVAL seconds.
+#
+INITIAL_CONNECTIONS = 2
+CONTROL_INTERVAL = 2.0
+#
+# Less than GAIN_THRESHOLD more throughput after adding a connection means that we are at the limit of the link,
+# and a drop of more than SLOWDOWN_THRESHOLD (or any error) halves the number of connections.
+#
+GAIN_THRESHOLD = 0.05
+SLOWDOWN_THRESHOLD = 0.25
+#
+# Intervals to wait before we try another connection, after the throughput leveled off (one after a decrease).
+#
+HOLD_INTERVALS = 5
+
+
+class RangeNotSupported(Exception):
+	pass
+
+
+class ConcurrencyController(object):
+	# additive increase (one connection at a time) and multiplicative decrease (on errors and slowdowns).
+
+	def __init__(self, maximum, minimum=1, initial=INITIAL_CONNECTIONS, interval=CONTROL_INTERVAL):
+		self.maximum = max(maximum, minimum)
+		self.minimum = minimum
+		self.limit = max(min(initial, self.maximum), minimum)
+		self.interval = interval
+		self.active = 0
+		self.byteCount = 0
+		self.errors = 0
+		self.lastRate = None
+		self.increased = False
+		self.decreased = False
+		self.holdIntervals = 0
+		self.startTime = time.time()
+		self.intervalStart = self.startTime
+		self.history = []
+		self.condition = threading.Condition()
+
+	def acquire(self):
+		with self.condition:
+			while self.active >= self.limit:
+				self.condition.wait(self.interval)
+				self.adjust()
+			self.active += 1
+
+	def release(self):
+		with self.condition:
+			self.active -= 1
+			self.condition.notify_all()
+
+	def addBytes(self, byteCount):
+		with self.condition:
+			self.byteCount += byteCount
+			self.adjust()
+
+	def addError(self):
+		with self.condition:
+			self.errors += 1
+			self.adjust()
+
+	def adjust(self):
+		# called with the condition held.
+		now = time.time()
+		if now - self.intervalStart < self.interval:
+			return
+
+		rate = self.byteCount / (now - self.intervalStart)
+		limit = self.limit
+
+		if self.errors:
+			limit = max(self.minimum, limit // 2)
+			self.holdIntervals = 1
+		elif self.lastRate and not self.decreased and rate < self.lastRate * (1 - SLOWDOWN_THRESHOLD):
+			# slower with the same (or more) connections: congestion.
+			limit = max(self.minimum, limit // 2)
+			self.holdIntervals = 1
+		elif self.increased and self.lastRate and rate < self.lastRate * (1 + GAIN_THRESHOLD):
+			# throughput leveled off, the last connection didn't help.
+			limit = max(self.minimum, limit - 1)
+			self.holdIntervals = HOLD_INTERVALS
+		elif self.holdIntervals:
+			self.holdIntervals -= 1
+		elif self.active >= limit:
+			limit = min(self.maximum, limit + 1)
+
+		self.increased = limit > self.limit
+		self.decreased = limit < self.limit
+		self.history.append((round(now - self.startTime, 3), self.limit, rate, self.errors))
+		self.limit = limit
+		self.lastRate = rate
+		self.byteCount = 0
+		self.errors = 0
+		self.intervalStart = now
+		self.condition.notify_all()
+
+
+class SegmentedFile(object):
+
+	def __init__(self, url, targetFilename, size, segmentSize, fileLock):
+		self.url = url
+		self.targetFilename = targetFilename
+		self.partFilename = singleFlight.getPartFilename(targetFilename)
+		self.segmentsFilename = singleFlight.getSegmentsFilename(targetFilename)
+		self.fileLock = fileLock
+		self.name = os.path.basename(targetFilename)
+		self.size = size
+		segments = [(start, min(start + segmentSize, size) - 1) for start in range(0, size, segmentSize)]
+		self.finishedSegments = self.getFinishedSegments(segments)
+		self.segments = [(start, end) for start, end in segments if start not in self.finishedSegments]
+		self.resumedBytes = sum(end - start + 1 for start, end in segments if start in self.finishedSegments)
+		self.remaining = len(self.segments)
+		self.requeues = 0
+		self.failed = False
+		self.rangeNotSupported = False
+		self.lock = threading.Lock()
+		# the list is saved before the file gets its full size, so that the holes are never taken for data.
+		self.saveFinishedSegments()
+		# the segments are written in place, and the file is renamed when complete.
+		if not os.path.isfile(self.partFilename):
+			open(self.partFilename, 'wb').close()
+		with open(self.partFilename, 'r+b') as f:
+			f.seek(0, os.SEEK_END)
+			if f.tell() < size:
+				f.truncate(size)
+
+	def getFinishedSegments(self, segments):
+		try:
+			with open(self.segmentsFilename, 'r') as f:
+				return set(json.load(f))
+		except (IOError, OSError, ValueError):
+			pass
+		# a .part without a segments file was written from the start (by installSeed.py), so its segments are done.
+		if os.path.isfile(self.partFilename):
+			partSize = os.path.getsize(self.partFilename)
+			return set(start for start, end in segments if end < partSize)
+		return set()
+
+	def saveFinishedSegments(self):
+		temporaryFile = self.segmentsFilename + ".%d" % os.getpid()
+		with open(temporaryFile, 'w') as f:
+			json.dump(sorted(self.finishedSegments), f)
+		os.rename(temporaryFile, self.segmentsFilename)
+
+	def segmentDone(self, start):
+		with self.lock:
+			self.finishedSegments.add(start)
+			self.saveFinishedSegments()
+			self.remaining -= 1
+			if self.remaining:
+				return False
+		self.complete()
+		return True
+
+	def complete(self):
+		os.rename(self.partFilename, self.targetFilename)
+		os.remove(self.segmentsFilename)
+		self.fileLock.release(True)
+
+
+def getRetryDelay(retries):
+	return min(RETRY_DELAY * 2 ** (retries - 1), MAXIMUM_RETRY_DELAY)
+
+
+def downloadSegment(segmentedFile, offset, end, controller):
+	# returns the offset where the download stopped, which is end + 1 when the segment is complete.
+	reporter = downloadProgress.Reporter(segmentedFile.name)
+	throttle = bandwidthLimiter.Throttle()
+	retries = 0
+
+	with open(segmentedFile.partFilename, 'r+b') as file:
+		while offset <= end:
+			attemptOffset = offset
+			request = Request(segmentedFile.url)
+			request.add_header('Range', "bytes=%d-%d" % (offset, end))
+			try:
+				response = urlopen(request)
+				if response.getcode() != 206:
+					raise RangeNotSupported(segmentedFile.url)
+				file.seek(offset)
+				while offset <= end:
+					chunk = response.read(min(BLOCK_SIZE, end - offset + 1))
+					if not chunk:
+						break
+					file.write(chunk)
+					offset += len(chunk)
+					reporter.add(len(chunk))
+					throttle.add(len(chunk))
+					controller.addBytes(len(chunk))
+				if offset <= end:
+					error = "connection closed"
+			except (URLError, socket.error, HTTPException) as exception:
+				error = exception
+
+			if offset <= end:
+				controller.addError()
+				if offset > attemptOffset:
+					# only attempts without progress count.
+					retries = 0
+				if retries == SEGMENT_RETRIES:
+					print("Download of %s interrupted (%s)" % (segmentedFile.name, error), file=sys.stderr)
+					break
+				retries += 1
+				reporter.retry()
+				time.sleep(getRetryDelay(retries))
+
+	reporter.flush()
+	return offset
+
+
+def runSegments(segments, controller):
+	while True:
+		controller.acquire()
+		try:
+			try:
+				segmentedFile, start, offset, end = segments.pop(0)
+			except IndexError:
+				return
+			if segmentedFile.failed or segmentedFile.rangeNotSupported:
+				continue
+			try:
+				offset = downloadSegment(segmentedFile, offset, end, controller)
+			except RangeNotSupported:
+				segmentedFile.rangeNotSupported = True
+				continue
+			if offset <= end:
+				with segmentedFile.lock:
+					if segmentedFile.requeues == SEGMENT_REQUEUES:
+						# the remaining segments are left to the fallback.
+						segmentedFile.failed = True
+						continue
+					segmentedFile.requeues += 1
+				# at the end of the queue, to give the server (or the link) some time.
+				segments.append((segmentedFile, start, offset, end))
+				continue
+			if segmentedFile.segmentDone(start):
+				reportFinished(segmentedFile.name)
+		finally:
+			controller.release()
+
+
+def reportFinished(name):
+	if downloadProgress.isReporting():
+		downloadProgress.Reporter(name).finish()
+	else:
+		print("Download of %s finished" % name)
+
+
+def downloadSegments(downloads, maximumConnections, segmentSize=SEGMENT_SIZE, fallback=None):
+	# returns statistics, and the urls that failed (also with the fallback) under 'errors'.
+	controller = ConcurrencyController(maximumConnections)
+	files = []
+	unsegmented = []
+
+	for url, targetFilename, size in downloads:
+		fileLock = singleFlight.FileLock(targetFilename)
+		if not size or not fileLock.tryAcquire():
+			# downloads of other processes are waited for by the fallback.
+			unsegmented.append([url, targetFilename, size])
+		elif singleFlight.isComplete(targetFilename, size):
+			fileLock.release(True)
+			reportFinished(os.path.basename(targetFilename))
+		else:
+			segmentedFile = SegmentedFile(url, targetFilename, size, segmentSize, fileLock)
+			if segmentedFile.resumedBytes:
+				# segments of an earlier (interrupted) run.
+				reporter = downloadProgress.Reporter(segmentedFile.name)
+				reporter.add(segmentedFile.resumedBytes)
+				reporter.flush()
+			if segmentedFile.remaining:
+				files.append(segmentedFile)
+			else:
+				segmentedFile.complete()
+				reportFinished(segmentedFile.name)
+
+	# in the order of the list, so that the first files are finished first.
+	segments = [(segmentedFile, start, start, end) for segmentedFile in files for start, end in segmentedFile.segments]
+	errors = []
+	threads = [threading.Thread(target=runSegments, args=(segments, controller)) for index in range(controller.maximum)]
+
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	for segmentedFile in files:
+		if segmentedFile.remaining:
+			segmentedFile.fileLock.release()
+
+	for segmentedFile in files:
+		if segmentedFile.failed:
+			print("Download of %s continues with one connection" % segmentedFile.name, file=sys.stderr)
+	unsegmented.extend([[segmentedFile.url, segmentedFile.targetFilename, segmentedFile.size] for segmentedFile in files if segmentedFile.rangeNotSupported or segmentedFile.failed])
+
+	for download in unsegmented:
+		# the fallback returns False when the download failed.
+		if fallback is None or fallback(download) == False:
+			errors.append(download[0])
+
+	return dict(segments=sum(len(segmentedFile.segments) for segmentedFile in files), connections=controller.limit,
+		history=controller.history, errors=errors)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+#
+# Script (bandwidthLimiter.py) with a token bucket to cap the download rate of installSeed.py (per day-time window).
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+# Usage:
+#		   - schedule = parseSchedule("08:00-18:00=2M,10M") (2 MB/s during office hours, 10 MB/s otherwise).
+#		   - bucket = SharedTokenBucket(schedule) (one cap for all Pool workers of this process), or
+#		   - bucket = FileTokenBucket(schedule, path) (one cap for all processes that use the same file).
+#		   - Pool(initializer=initWorker, initargs=(bucket,)), and throttle = Throttle() / throttle.add(len(chunk)) in the worker.
+#
+
+from __future__ import print_function
+
+import os
+import re
+import time
+import struct
+
+#
+# The bucket holds up to BURST_SECONDS worth of tokens (bytes).
+#
+BURST_SECONDS = 1.0
+#
+# Workers take tokens in blocks of (at least) THROTTLE_BLOCK bytes.
+#
+THROTTLE_BLOCK = 64 * 1024
+
+STATE_FORMAT = "dd"
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+SCHEDULE_ENTRY_RE = re.compile(r'^(?:(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=)?(.+)$')
+
+#
+# Set in the Pool workers by initWorker (None means no limit).
+#
+workerBucket = None
+
+
+def initWorker(bucket):
+	global workerBucket
+	workerBucket = bucket
+
+
+def parseRate(text):
+	# bytes per second, with an optional K, M or G suffix (0 means no limit).
+	match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$', text, re.IGNORECASE)
+	if not match:
+		raise ValueError("invalid rate '%s'" % text)
+	return float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+
+
+def parseSchedule(text):
+	# comma separated list of [HH:MM-HH:MM=]rate, the entry without a time window is the default.
+	schedule = []
+
+	for entry in text.split(','):
+		match = SCHEDULE_ENTRY_RE.match(entry.strip())
+		if not match:
+			raise ValueError("invalid schedule entry '%s'" % entry)
+		startHour, startMinute, endHour, endMinute, rate = match.groups()
+		if startHour is None:
+			schedule.append((None, None, parseRate(rate)))
+		else:
+			schedule.append((int(startHour) * 60 + int(startMinute), int(endHour) * 60 + int(endMinute), parseRate(rate)))
+
+	return schedule
+
+
+def getScheduledRate(schedule, now=None):
+	# the first matching time window wins, windows can span midnight (22:00-06:00).
+	localTime = time.localtime(now)
+	minute = localTime.tm_hour * 60 + localTime.tm_min
+	defaultRate = 0
+
+	for start, end, rate in schedule:
+		if start is None:
+			defaultRate = rate
+		elif start <= end and start <= minute < end:
+			return rate
+		elif start > end and (minute >= start or minute < end):
+			return rate
+
+	return defaultRate
+
+
+class TokenBucket(object):
+	# tokens can go negative: the caller then sleeps until the debt is paid off.
+
+	def __init__(self, schedule):
+		self.schedule = schedule
+
+	def take(self, count):
+		rate = getScheduledRate(self.schedule)
+		if rate <= 0:
+			return 0.0
+
+		with self:
+			tokens, timestamp = self.readState()
+			now = time.time()
+			capacity = rate * BURST_SECONDS
+			if timestamp <= 0:
+				tokens = capacity
+			tokens = min(tokens + max(now - timestamp, 0) * rate, capacity) - count
+			self.writeState(tokens, now)
+
+		delay = -tokens / rate if tokens < 0 else 0.0
+		if delay > 0:
+			time.sleep(delay)
+		return delay
+
+
+class SharedTokenBucket(TokenBucket):
+	# state in shared memory, for the processes of one Pool.
+
+	def __init__(self, schedule):
+		import multiprocessing
+		TokenBucket.__init__(self, schedule)
+		self.state = multiprocessing.Array('d', [0.0, 0.0])
+
+	def __enter__(self):
+		self.state.get_lock().acquire()
+
+	def __exit__(self, type, value, traceback):
+		self.state.get_lock().release()
+		return False
+
+	def readState(self):
+		return (self.state[0], self.state[1])
+
+	def writeState(self, tokens, timestamp):
+		self.state[0] = tokens
+		self.state[1] = timestamp
+
+
+class FileTokenBucket(TokenBucket):
+	# state in a (locked) file, for all processes (installSeed.py runs) using the same path.
+
+	def __init__(self, schedule, path):
+		TokenBucket.__init__(self, schedule)
+		self.path = os.path.abspath(path)
+		self.fd = None
+		self.pid = None
+
+	def __getstate__(self):
+		# file descriptors aren't inherited by pickling, the worker opens its own.
+		state = self.__dict__.copy()
+		state['fd'] = None
+		return state
+
+	def __enter__(self):
+		import fcntl
+		if self.fd is None or self.pid != os.getpid():
+			self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+			self.pid = os.getpid()
+		fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+	def __exit__(self, type, value, traceback):
+		import fcntl
+		fcntl.flock(self.fd, fcntl.LOCK_UN)
+		return False
+
+	def readState(self):
+		os.lseek(self.fd, 0, os.SEEK_SET)
+		data = os.read(self.fd, STATE_SIZE)
+		if len(data) < STATE_SIZE:
+			return (0.0, 0.0)
+		return struct.unpack(STATE_FORMAT, data)
+
+	def writeState(self, tokens, timestamp):
+		os.lseek(self.fd, 0, os.SEEK_SET)
+		os.write(self.fd, struct.pack(STATE_FORMAT, tokens, timestamp))
+
+
+def createBucket(scheduleText, sharedFile=None):
+	schedule = parseSchedule(scheduleText)
+	if sharedFile:
+		return FileTokenBucket(schedule, sharedFile)
+	return SharedTokenBucket(schedule)
+
+
+class Throttle(object):
+	# used in the download loop, takes tokens for every THROTTLE_BLOCK bytes.
+
+	def __init__(self, bucket=None):
+		self.bucket = bucket or workerBucket
+		self.pending = 0
+
+	def add(self, byteCount):
+		if self.bucket is None:
+			return
+		self.pending += byteCount
+		if self.pending >= THROTTLE_BLOCK:
+			self.bucket.take(self.pending)
+			self.pending = 0
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+#
+# Script (downloadPipeline.py) to benchmark the installSeed.py download path against a local HTTP stand-in.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - options -A (segmented downloads) and -B (bandwidth of the whole server) added.
+#		   - ETag and 304 (Not Modified) support for the catalog (seedWatcher.py).
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+import shutil
+import socket
+import argparse
+import plistlib
+import tempfile
+import platform
+import threading
+
+try:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+except ImportError:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+BUILD_ID = "17Z999"
+PRODUCT_KEY = "091-00000"
+PACKAGE_NAMES = ["InstallAssistantAuto.pkg", "InstallESDDmg.pkg", "BaseSystem.dmg", "RecoveryHDMetaDmg.pkg"]
+
+
+def dumpPlist(data):
+	if hasattr(plistlib, 'dumps'):
+		return plistlib.dumps(data)
+	return plistlib.writePlistToString(data)
+
+
+def createCatalog(baseURL, packageSize, packageCount, noiseProducts):
+	products = {}
+	# products that don't match, so that the catalog is as big as the real thing.
+	for index in range(noiseProducts):
+		products["041-%05d" % index] = {
+			'ExtendedMetaInfo': {'ProductType': 'other', 'ProductVersion': '1.0'},
+			'Distributions': {'English': "%s/content/downloads/%05d.English.dist" % (baseURL, index)},
+			'Packages': [{'URL': "%s/content/downloads/%05d/Update.pkg" % (baseURL, index), 'Size': 1024}],
+			'PostDate': '2018-01-01T00:00:00Z'
+		}
+	products[PRODUCT_KEY] = {
+		'ExtendedMetaInfo': {'InstallAssistantPackageIdentifiers': {'InstallInfo': 'com.apple.plist.InstallInfo', 'OSInstall': 'com.apple.mpkg.OSInstall'}},
+		'Distributions': {'English': "%s/content/downloads/%s/%s.English.dist" % (baseURL, PRODUCT_KEY, PRODUCT_KEY)},
+		'Packages': [{'URL': "%s/content/downloads/%s/%s" % (baseURL, PRODUCT_KEY, name), 'Size': packageSize} for name in PACKAGE_NAMES[:packageCount]]
+	}
+	return dumpPlist({'CatalogVersion': 2, 'Products': products})
+
+
+def createDistribution():
+	return ('<?xml version="1.0" encoding="utf-8"?>\n<installer-gui-script minSpecVersion="2">'
+		'<auxinfo><dict><key>BUILD</key><string>%s</string><key>VERSION</key><string>10.13.9</string></dict></auxinfo>'
+		'<localization><strings language="English">"SU_TITLE" = "macOS High Sierra";</strings></localization>'
+		'</installer-gui-script>\n' % BUILD_ID).encode('utf-8')
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, options):
+		HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+		self.options = options
+		self.baseURL = "http://127.0.0.1:%d" % self.server_address[1]
+		self.catalog = createCatalog(self.baseURL, options.packageSize, options.packageCount, options.noiseProducts)
+		self.distribution = createDistribution()
+		self.lock = threading.Lock()
+		self.bucket = None
+		if options.totalBandwidth:
+			import bandwidthLimiter
+			self.bucket = bandwidthLimiter.SharedTokenBucket([(None, None, options.totalBandwidth * MB)])
+		self.resetStatistics()
+
+	def resetStatistics(self):
+		self.statistics = dict(requests=0, rangeRequests=0, bytesSent=0, drops=0)
+
+	def count(self, **values):
+		with self.lock:
+			for name, value in values.items():
+				self.statistics[name] += value
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+	def log_message(self, format, *args):
+		pass
+
+	def sendData(self, data, contentType):
+		import hashlib
+		etag = '"%s"' % hashlib.md5(data).hexdigest()
+		if self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		self.send_response(200)
+		self.send_header('ETag', etag)
+		self.send_header('Content-Type', contentType)
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+		self.server.count(bytesSent=len(data))
+
+	def getRange(self, size):
+		# only the 'bytes=<first>-[<last>]' form is used by the download code.
+		value = self.headers.get('Range')
+		if not value or not value.startswith('bytes='):
+			return None
+		first, last = value[len('bytes='):].split('-', 1)
+		first = int(first)
+		last = int(last) if last else size - 1
+		if first >= size:
+			return None
+		return (first, min(last, size - 1))
+
+	def sendPackage(self):
+		options = self.server.options
+		size = options.packageSize
+		byteRange = self.getRange(size)
+
+		if byteRange:
+			first, last = byteRange
+			self.send_response(206)
+			self.send_header('Content-Range', "bytes %d-%d/%d" % (first, last, size))
+			self.server.count(rangeRequests=1)
+		else:
+			first, last = (0, size - 1)
+			self.send_response(200)
+		self.send_header('Accept-Ranges', 'bytes')
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(last - first + 1))
+		self.end_headers()
+
+		remaining = last - first + 1
+		# injected drop: close the connection somewhere in the response.
+		if random.random() < options.dropRate:
+			remaining = random.randint(0, remaining - 1)
+			self.server.count(drops=1)
+			self.close_connection = True
+
+		block = b'\0' * BLOCK_SIZE
+		start = time.time()
+		sent = 0
+
+		while sent < remaining:
+			length = min(BLOCK_SIZE, remaining - sent)
+			try:
+				self.wfile.write(block[:length])
+			except socket.error:
+				break
+			sent += length
+			self.server.count(bytesSent=length)
+			if self.server.bucket:
+				self.server.bucket.take(length)
+			# bandwidth cap (per connection).
+			if options.bandwidth:
+				delay = (sent / (options.bandwidth * MB)) - (time.time() - start)
+				if delay > 0:
+					time.sleep(delay)
+
+		if sent < last - first + 1:
+			self.wfile.flush()
+			self.connection.shutdown(socket.SHUT_RDWR)
+
+	def do_GET(self):
+		self.server.count(requests=1)
+
+		if self.server.options.latency:
+			time.sleep(self.server.options.latency / 1000.0)
+
+		if self.path.endswith('.sucatalog'):
+			self.sendData(self.server.catalog, 'text/xml')
+		elif self.path.endswith('.dist'):
+			self.sendData(self.server.distribution, 'text/xml')
+		elif '/content/downloads/%s/' % PRODUCT_KEY in self.path:
+			self.sendPackage()
+		else:
+			self.send_error(404)
+
+
+def createTargetVolume(targetVolume):
+	coreServices = os.path.join(targetVolume, "System/Library/CoreServices")
+	shared = os.path.join(targetVolume, "Users/Shared")
+	os.makedirs(coreServices)
+	os.makedirs(shared)
+	plistlib.writePlist({'ProductBuildVersion': '17A000', 'ProductVersion': '10.13'}, os.path.join(coreServices, "SystemVersion.plist"))
+	plistlib.writePlist({'SeedProgram': 'DeveloperSeed'}, os.path.join(shared, ".SeedEnrollment.plist"))
+
+
+def measure(timings, name, function, *args):
+	start = time.time()
+	result = function(*args)
+	timings.append((name, time.time() - start))
+	return result
+
+
+def runPipeline(installSeed, server, targetVolume):
+	timings = []
+	catalogURL = installSeed.getCatalogURL(targetVolume, False)
+	measure(timings, 'catalog', installSeed.getCatalog, catalogURL)
+	measure(timings, 'product', installSeed.getProduct, 'install', '10.13', targetVolume, '*', False)
+	packageBytes = server.statistics['bytesSent']
+	measure(timings, 'packages', installSeed.getPackages, 'install', '10.13', '*', targetVolume, '', False, 'English')
+	packageBytes = server.statistics['bytesSent'] - packageBytes
+	return (timings, packageBytes)
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Benchmark catalog, product lookup and package downloads of installSeed.py against a local HTTP server.')
+	parser.add_argument('-s', dest='packageSize', type=int, default=256, help='package size in MB (default: %(default)s)')
+	parser.add_argument('-n', dest='packageCount', type=int, default=len(PACKAGE_NAMES), choices=range(1, len(PACKAGE_NAMES) + 1), help='number of packages (default: %(default)s)')
+	parser.add_argument('-p', dest='noiseProducts', type=int, default=2000, help='other products in the catalog (default: %(default)s)')
+	parser.add_argument('-l', dest='latency', type=float, default=0, help='latency per request in ms (default: %(default)s)')
+	parser.add_argument('-b', dest='bandwidth', type=float, default=0, help='bandwidth cap per connection in MB/s (default: no cap)')
+	parser.add_argument('-B', dest='totalBandwidth', type=float, default=0, help='bandwidth cap of the server (all connections) in MB/s (default: no cap)')
+	parser.add_argument('-d', dest='dropRate', type=float, default=0, help='chance (0-1) that a package request is dropped (default: %(default)s)')
+	parser.add_argument('-L', dest='downloadLimit', help='installSeed.py download cap (-L argument, like 8M)')
+	parser.add_argument('-G', dest='downloadLimitFile', help='installSeed.py shared download cap file (-G argument)')
+	parser.add_argument('-A', dest='adaptiveConnections', type=int, help='installSeed.py segmented downloads with up to this many connections (-A argument)')
+	parser.add_argument('-r', dest='repeat', type=int, default=1, help='number of runs (default: %(default)s)')
+	args = parser.parse_args(argv)
+	args.packageSize *= MB
+
+	import installSeed
+
+	if not platform.mac_ver()[0]:
+		# not running on macOS, report a version for the stand-in volume.
+		installSeed.getOSVersion = lambda: 10.13
+
+	server = StandInServer(args)
+	serverThread = threading.Thread(target=server.serve_forever)
+	serverThread.daemon = True
+	serverThread.start()
+	installSeed.CATALOG_URL = server.baseURL + "/content/catalogs/others/"
+	installSeed.downloadLimit = args.downloadLimit
+	installSeed.downloadLimitFile = args.downloadLimitFile
+	installSeed.adaptiveConnections = args.adaptiveConnections
+	workFolder = tempfile.mkdtemp(prefix='downloadPipeline.')
+
+	try:
+		for run in range(args.repeat):
+			targetVolume = os.path.join(workFolder, "Volume%d" % run)
+			createTargetVolume(targetVolume)
+			installSeed.catalogCache.clear()
+			server.resetStatistics()
+			start = time.time()
+			timings, packageBytes = runPipeline(installSeed, server, targetVolume)
+			wallTime = time.time() - start
+			statistics = server.statistics
+			packageTime = dict(timings)['packages']
+			print("\nRun %d: %.2f s wall time, %.1f MB transferred, %i requests" % (run + 1, wallTime, statistics['bytesSent'] / float(MB), statistics['requests']))
+			for name, seconds in timings:
+				print("  %-10s %8.3f s" % (name, seconds))
+			print("  throughput %8.1f MB/s" % (packageBytes / float(MB) / packageTime))
+			print("  drops      %8i (resumed with Range: %i)" % (statistics['drops'], statistics['rangeRequests']))
+			shutil.rmtree(targetVolume, ignore_errors=True)
+	finally:
+		server.shutdown()
+		shutil.rmtree(workFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
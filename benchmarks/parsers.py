@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+
+#
+# Script (parsers.py) to benchmark the catalog, distribution, pbzx and firmware parsers (time and peak memory).
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - baselines for Python 2.7 (-s 1) added, peak memory that maxrss can't measure is reported as n/a.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import plistlib
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parserBaselines.json")
+
+sys.path.insert(0, SCRIPT_DIRECTORY)
+
+MB = 1024 * 1024
+#
+# Differences below these are noise (timer resolution, maxrss page granularity).
+#
+MIN_TIME_DIFFERENCE = 0.001
+MIN_MEMORY_DIFFERENCE = 64 * 1024
+APPLE_GUID = b"\x4a\x25\x1f\x78\x57\xc4\x13\x5d\x92\x75\x1b\xf5\xd5\x6e\x07\x24"
+BIOS_ID = "MBP114.88Z.0172.B00.1708311658"
+
+
+def dumpPlist(data):
+	if hasattr(plistlib, 'dumps'):
+		return plistlib.dumps(data)
+	return plistlib.writePlistToString(data)
+
+
+def loadPlist(data):
+	if hasattr(plistlib, 'loads'):
+		return plistlib.loads(data)
+	return plistlib.readPlistFromString(data)
+
+
+def createCatalog(path, productCount):
+	products = {}
+	for index in range(productCount):
+		key = "091-%05d" % index
+		products[key] = {
+			'ExtendedMetaInfo': {'ProductType': 'macOS', 'ProductVersion': '10.13.%d' % (index % 7)},
+			'Distributions': dict((language, "https://swdist.apple.com/content/downloads/%s/%s.%s.dist" % (key, key, language)) for language in ['English', 'French', 'German', 'Japanese', 'Dutch']),
+			'Packages': [{'URL': "https://swdist.apple.com/content/downloads/%s/Package%d.pkg" % (key, package), 'Size': 1024 * package, 'MetadataURL': "https://swdist.apple.com/content/downloads/%s/Package%d.pkm" % (key, package)} for package in range(8)],
+			'PostDate': '2018-01-01T00:00:00Z'
+		}
+	with open(path, 'wb') as f:
+		f.write(dumpPlist({'CatalogVersion': 2, 'Products': products}))
+
+
+def createDistribution(path, packageCount):
+	# auxinfo comes last, so the whole document has to be parsed.
+	lines = ['<?xml version="1.0" encoding="utf-8"?>', '<installer-gui-script minSpecVersion="2">']
+	lines.append('<localization><strings language="English">"SU_TITLE" = "macOS High Sierra Beta";%s</strings></localization>' % ('"SU_TEXT" = "text";' * 1000))
+	for index in range(packageCount):
+		lines.append('<pkg-ref id="com.apple.pkg.Package%d" auth="Root" packageIdentifier="com.apple.pkg.Package%d">#Package%d.pkg</pkg-ref>' % (index, index, index))
+	lines.append('<auxinfo><dict><key>BUILD</key><string>17E199</string><key>VERSION</key><string>10.13.4</string></dict></auxinfo>')
+	lines.append('</installer-gui-script>')
+	with open(path, 'w') as f:
+		f.write('\n'.join(lines))
+
+
+def createPayload(path, chunkCount, chunkSize):
+	# pbzx payload with xz chunks (raw stored data when lzma isn't available).
+	try:
+		import lzma
+	except ImportError:
+		lzma = None
+	with open(path, 'wb') as f:
+		# bit 24 of the flags is set as long as there are more chunks.
+		f.write(b"pbzx" + struct.pack('>Q', 1 << 24))
+		for index in range(chunkCount):
+			data = struct.pack('>Q', index) * (chunkSize // 8)
+			chunk = lzma.compress(data) if lzma else b"\xfd7zXZ\x00" + data + b"YZ"
+			flags = (1 << 24) if index < chunkCount - 1 else 0
+			f.write(struct.pack('>QQ', flags, len(chunk)) + chunk)
+
+
+def createFirmwareImage(path, size, guidPosition, biosIDPosition):
+	image = bytearray(size)
+	image[guidPosition:guidPosition + 16] = APPLE_GUID
+	# board-id's start 28 bytes after the GUID.
+	for index in range(5):
+		position = guidPosition + 28 + (index * 8)
+		if index < 4:
+			image[position:position + 8] = struct.pack('>Q', 0x1234567800000000 + index)
+		else:
+			image[position:position + 8] = b"\xff" * 8
+	biosID = b"$IBIOSI$" + BIOS_ID.encode('utf-16-le')
+	image[biosIDPosition:biosIDPosition + len(biosID)] = biosID
+	with open(path, 'wb') as f:
+		f.write(bytes(image))
+
+
+def createFixtures(fixtureFolder, scale):
+	createCatalog(os.path.join(fixtureFolder, "catalog.sucatalog"), 2000 * scale)
+	createDistribution(os.path.join(fixtureFolder, "distribution.dist"), 5000 * scale)
+	createPayload(os.path.join(fixtureFolder, "Payload"), 8 * scale, MB)
+	# .scap files are scanned forward (for $IBIOSI$) from 0xb0, .fd files backwards from the end.
+	createFirmwareImage(os.path.join(fixtureFolder, "MBP114_0172_B00.scap"), 4 * MB * scale, 0x1048, 0x40000 * scale)
+	# the GUID is planted near the start, so that searchForGUID scans (backwards) through most of the file.
+	createFirmwareImage(os.path.join(fixtureFolder, "MBP114_0172_B00.fd"), 1 * MB * scale, 0x2000, 0x40000)
+
+
+#
+# The benchmarks. Each one returns a function (run once per repeat), or None when it can't run here.
+#
+
+def benchmarkCatalog(fixtureFolder):
+	# what getProduct does with the catalog data.
+	with open(os.path.join(fixtureFolder, "catalog.sucatalog"), 'rb') as f:
+		data = f.read()
+	return lambda: loadPlist(data)
+
+
+def benchmarkDistribution(fixtureFolder):
+	try:
+		import installSeed
+	except (ImportError, SyntaxError):
+		return None
+	path = os.path.join(fixtureFolder, "distribution.dist")
+	return lambda: (installSeed.getBuildAndVersion(path, '*', ''), installSeed.isBetaSeed(path))
+
+
+def benchmarkPayloadToZX(fixtureFolder):
+	import pbzx
+	path = os.path.join(fixtureFolder, "Payload")
+	zxPath = os.path.join(fixtureFolder, "Payload.zx")
+	return lambda: pbzx.convertPayloadToZX(path, zxPath)
+
+
+def benchmarkPayloadDecompress(fixtureFolder):
+	import pbzx
+	if pbzx.lzma is None:
+		return None
+	path = os.path.join(fixtureFolder, "Payload")
+
+	def run():
+		for data in pbzx.readPayload(path, 1):
+			pass
+	return run
+
+
+def benchmarkScanSCAP(fixtureFolder):
+	from firmwareScan import scanFirmwareFile
+	path = os.path.join(fixtureFolder, "MBP114_0172_B00.scap")
+	return lambda: scanFirmwareFile(path)
+
+
+def benchmarkScanFD(fixtureFolder):
+	from firmwareScan import scanFirmwareFile
+	path = os.path.join(fixtureFolder, "MBP114_0172_B00.fd")
+	return lambda: scanFirmwareFile(path)
+
+
+BENCHMARKS = [
+	('catalog', benchmarkCatalog),
+	('distribution', benchmarkDistribution),
+	('pbzx-to-zx', benchmarkPayloadToZX),
+	('pbzx-decompress', benchmarkPayloadDecompress),
+	('scan-scap', benchmarkScanSCAP),
+	('scan-fd', benchmarkScanFD)
+]
+
+
+def getMaxRSS():
+	import resource
+	maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# bytes on macOS, kilobytes on Linux.
+	if sys.platform == 'darwin':
+		return maxRSS
+	return maxRSS * 1024
+
+
+def runBenchmark(name, fixtureFolder, repeat):
+	# runs in a child process, so that the peak memory of one benchmark doesn't hide the next one.
+	function = dict(BENCHMARKS)[name](fixtureFolder)
+	if function is None:
+		return None
+
+	try:
+		import tracemalloc
+	except ImportError:
+		tracemalloc = None
+
+	# memory first, the maximum RSS won't grow any more after the first run.
+	if tracemalloc:
+		tracemalloc.start()
+		function()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		memoryType = 'tracemalloc'
+	else:
+		startRSS = getMaxRSS()
+		function()
+		# no growth means that the benchmark stayed below the peak of the interpreter itself, so we don't know.
+		peak = (getMaxRSS() - startRSS) or None
+		memoryType = 'maxrss'
+
+	timings = []
+	for index in range(repeat):
+		start = time.time()
+		function()
+		timings.append(time.time() - start)
+
+	return {'seconds': min(timings), 'peak': peak, 'memoryType': memoryType}
+
+
+def measure(name, fixtureFolder, repeat):
+	cmd = [sys.executable, os.path.abspath(__file__), '-x', name, '-f', fixtureFolder, '-r', str(repeat)]
+	output = subprocess.check_output(cmd)
+	return json.loads(output.decode('utf-8'))
+
+
+def loadBaselines():
+	try:
+		with open(BASELINES_FILE, 'r') as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return {}
+
+
+def saveBaselines(baselines):
+	temporaryFile = BASELINES_FILE + ".%d" % os.getpid()
+	with open(temporaryFile, 'w') as f:
+		json.dump(baselines, f, indent=1, sort_keys=True)
+	os.rename(temporaryFile, BASELINES_FILE)
+
+
+def formatPeak(peak):
+	if peak is None:
+		return 'n/a'
+	return "%.1f" % (peak / 1024.0)
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Benchmark the parsers (time and peak memory) and compare the results with the stored baselines.')
+	parser.add_argument('-r', dest='repeat', type=int, default=3, help='number of runs, the best one is reported (default: %(default)s)')
+	parser.add_argument('-s', dest='scale', type=int, default=1, help='fixture scale factor (default: %(default)s)')
+	parser.add_argument('-t', dest='timeTolerance', type=float, default=0.25, help='allowed slowdown (default: %(default)s)')
+	parser.add_argument('-m', dest='memoryTolerance', type=float, default=0.10, help='allowed peak memory increase (default: %(default)s)')
+	parser.add_argument('-w', dest='writeBaselines', action='store_true', help='store the results as the new baselines')
+	parser.add_argument('-b', dest='benchmarks', action='append', help='benchmark to run (default: all)')
+	# used for the child processes.
+	parser.add_argument('-x', dest='runBenchmark', help=argparse.SUPPRESS)
+	parser.add_argument('-f', dest='fixtureFolder', help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.runBenchmark:
+		print(json.dumps(runBenchmark(args.runBenchmark, args.fixtureFolder, args.repeat)))
+		return 0
+
+	# baselines depend on the Python version (and the machine they were written on).
+	baselineKey = "python%d.%d-s%d" % (sys.version_info[0], sys.version_info[1], args.scale)
+	baselines = loadBaselines()
+	currentBaselines = baselines.get(baselineKey, {})
+	fixtureFolder = tempfile.mkdtemp(prefix='parsers.')
+	regressions = []
+
+	try:
+		createFixtures(fixtureFolder, args.scale)
+		print("%-16s %10s %12s %10s %10s" % ('benchmark', 'time (ms)', 'peak (KB)', 'time', 'memory'))
+
+		for name, function in BENCHMARKS:
+			if args.benchmarks and name not in args.benchmarks:
+				continue
+			result = measure(name, fixtureFolder, args.repeat)
+			if result is None:
+				print("%-16s %10s" % (name, 'skipped'))
+				continue
+			baseline = currentBaselines.get(name)
+			timeChange = memoryChange = ''
+			if baseline and not args.writeBaselines:
+				timeRatio = result['seconds'] / max(baseline['seconds'], 1e-6)
+				timeChange = "%+.0f%%" % ((timeRatio - 1) * 100)
+				if timeRatio > 1 + args.timeTolerance and result['seconds'] - baseline['seconds'] > MIN_TIME_DIFFERENCE:
+					regressions.append(name)
+				# only compared when both runs could measure it.
+				if result['peak'] is not None and baseline['peak'] is not None:
+					memoryRatio = max(result['peak'], 1) / float(max(baseline['peak'], 1))
+					memoryChange = "%+.0f%%" % ((memoryRatio - 1) * 100)
+					if memoryRatio > 1 + args.memoryTolerance and result['peak'] - baseline['peak'] > MIN_MEMORY_DIFFERENCE and name not in regressions:
+						regressions.append(name)
+			print("%-16s %10.2f %12s %10s %10s" % (name, result['seconds'] * 1000, formatPeak(result['peak']), timeChange, memoryChange))
+			currentBaselines[name] = {'seconds': result['seconds'], 'peak': result['peak']}
+	finally:
+		shutil.rmtree(fixtureFolder, ignore_errors=True)
+
+	if args.writeBaselines:
+		baselines[baselineKey] = currentBaselines
+		saveBaselines(baselines)
+		print("Baselines written to %s (%s)" % (BASELINES_FILE, baselineKey))
+	elif regressions:
+		print("ERROR: regression in %s" % ', '.join(regressions), file=sys.stderr)
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+#
+# Script (smcLoader.py) to benchmark the SMC JSON loaders of firmwareScan.py on a synthetic SMCJSONs folder.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firmwareScan import readSMCVersion, readSMCVersions, loadSMCVersionTable, SMC_VERSIONS_CACHE
+
+
+def createSMCJSONs(targetFolder, count, keysPerFile):
+	jsonsFolder = os.path.join(targetFolder, "Scripts", "Tools", "SMCJSONs")
+	os.makedirs(jsonsFolder)
+
+	for index in range(count):
+		boardID = "Mac-%016X" % random.getrandbits(64)
+		# mimic the real files: lots of keys we don't need around the smc-version.
+		smcData = dict(("key-%04d" % key, "%08x" % random.getrandbits(32)) for key in range(keysPerFile))
+		smcData['smc-version'] = "2.%df%d" % (random.randint(1, 50), random.randint(1, 99))
+		with open(os.path.join(jsonsFolder, boardID + ".json"), 'w') as f:
+			json.dump({boardID: smcData}, f, indent=2)
+
+	return os.path.join(jsonsFolder, "*.json")
+
+
+def measure(function, repeat):
+	timings = []
+	for index in range(repeat):
+		start = time.time()
+		result = function()
+		timings.append(time.time() - start)
+	return (min(timings), result)
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Benchmark the SMC JSON loaders.')
+	parser.add_argument('-n', dest='count', type=int, default=500, help='number of JSON files (default: %(default)s)')
+	parser.add_argument('-k', dest='keysPerFile', type=int, default=400, help='keys per JSON file (default: %(default)s)')
+	parser.add_argument('-r', dest='repeat', type=int, default=5, help='number of runs, the best one is reported (default: %(default)s)')
+	parser.add_argument('-j', dest='workers', type=int, default=8, help='loader threads (default: %(default)s)')
+	args = parser.parse_args(argv)
+
+	targetFolder = tempfile.mkdtemp(prefix='smcLoader.')
+
+	try:
+		jsonsPath = createSMCJSONs(targetFolder, args.count, args.keysPerFile)
+		jsonFiles = glob.glob(jsonsPath)
+		cacheFile = os.path.join(targetFolder, "Scripts", "Tools", SMC_VERSIONS_CACHE)
+
+		def sequential():
+			return dict(readSMCVersion(jsonFile) for jsonFile in jsonFiles)
+
+		def batched():
+			return readSMCVersions(jsonFiles, args.workers)
+
+		def uncached():
+			if os.path.exists(cacheFile):
+				os.remove(cacheFile)
+			return loadSMCVersionTable(jsonsPath, args.workers)
+
+		def cached():
+			return loadSMCVersionTable(jsonsPath, args.workers)
+
+		expected = None
+		print("%d JSON files with %d keys each, best of %d runs:" % (args.count, args.keysPerFile, args.repeat))
+		for name, function in [('json.load (sequential)', sequential), ('batched partial parse', batched), ('table (cache miss)', uncached), ('table (cache hit)', cached)]:
+			seconds, result = measure(function, args.repeat)
+			if expected is None:
+				expected = result
+			elif result != expected:
+				print("ERROR: %s returned different versions!" % name, file=sys.stderr)
+				sys.exit(1)
+			print("%-24s %8.2f ms" % (name, seconds * 1000))
+	finally:
+		shutil.rmtree(targetFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+#
+# Script (startupTime.py) to benchmark the import (startup) time of installSeed.py, efiver.py and friends.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - option -t is gated on the interpreter version (-X importtime needs Python 3.7), with a message when skipped.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ['installSeed', 'efiver', 'smcver', 'firmwareScan', 'firmwareVersion']
+
+
+def measureImport(python, module, repeat):
+	timings = []
+	for index in range(repeat):
+		start = time.time()
+		# a fresh interpreter per run, just like efiver.py launching installSeed.py.
+		process = subprocess.Popen([python, '-c', 'import %s' % module], cwd=SCRIPT_DIRECTORY, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		output, error = process.communicate()
+		timings.append(time.time() - start)
+		if process.returncode != 0:
+			return (None, error.decode('utf-8', 'replace').strip().splitlines()[-1])
+	return (min(timings), None)
+
+
+def getImportTimes(python, module, count):
+	# -X importtime is available on Python 3.7 and later (output goes to stderr).
+	process = subprocess.Popen([python, '-X', 'importtime', '-c', 'import %s' % module], cwd=SCRIPT_DIRECTORY, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	output, error = process.communicate()
+	importTimes = []
+
+	for line in error.decode('utf-8', 'replace').splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		fields = line[len('import time:'):].split('|')
+		if len(fields) == 3:
+			importTimes.append((int(fields[1]), fields[2].strip()))
+
+	return sorted(importTimes, reverse=True)[:count]
+
+
+def getPythonVersion(python):
+	output = subprocess.check_output([python, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])'])
+	return tuple(int(value) for value in output.decode('ascii').strip().split('.'))
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Benchmark the startup (import) time of the scripts.')
+	parser.add_argument('-p', dest='python', default=sys.executable, help='Python interpreter to use (default: %(default)s)')
+	parser.add_argument('-r', dest='repeat', type=int, default=10, help='number of runs, the best one is reported (default: %(default)s)')
+	parser.add_argument('-t', dest='top', type=int, default=5, help='show the slowest imports (-X importtime) per module (default: %(default)s)')
+	parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+	args = parser.parse_args(argv)
+
+	baseline, error = measureImport(args.python, 'sys', args.repeat)
+	pythonVersion = getPythonVersion(args.python)
+	showImportTimes = args.top > 0 and pythonVersion >= (3, 7)
+	print("Interpreter startup: %.1f ms (best of %d runs)" % (baseline * 1000, args.repeat))
+
+	if args.top > 0 and not showImportTimes:
+		# with -p <python3.7+> only the modules that run on Python 3 (firmwareScan, firmwareVersion ...) can be broken down.
+		print("Slowest imports (-t) skipped: -X importtime needs Python 3.7 or later, %s is Python %d.%d (use -t 0 to hide this)." %
+			(args.python, pythonVersion[0], pythonVersion[1]))
+
+	for module in args.modules:
+		seconds, error = measureImport(args.python, module, args.repeat)
+		if seconds is None:
+			print("%-16s import failed: %s" % (module, error))
+			continue
+		print("%-16s %8.1f ms (+%.1f ms)" % (module, seconds * 1000, (seconds - baseline) * 1000))
+		if showImportTimes:
+			for microseconds, name in getImportTimes(args.python, module, args.top):
+				print("    %-28s %8.1f ms" % (name, microseconds / 1000.0))
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
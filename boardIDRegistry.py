@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+#
+# Script (boardIDRegistry.py) to look up board-id's and model identifiers (shared by efiver.py and smcver.py).
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version (board-id/model data moved to boardIDModelIDs.json).
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "boardIDModelIDs.json")
+
+
+def loadBoardIDModelIDs(path=REGISTRY_FILE):
+	with open(path, 'r') as f:
+		return [(boardID, modelID) for boardID, modelID in json.load(f)]
+
+
+def buildIndexes(boardIDModelIDs):
+	modelsByBoardID = {}
+	boardIDsByModel = {}
+
+	for boardID, modelID in boardIDModelIDs:
+		# the first entry wins, just like the old linear scans did.
+		modelsByBoardID.setdefault(boardID, modelID)
+		boardIDsByModel.setdefault(modelID, []).append(boardID)
+
+	return (modelsByBoardID, boardIDsByModel)
+
+
+boardIDModelIDs = loadBoardIDModelIDs()
+modelsByBoardID, boardIDsByModel = buildIndexes(boardIDModelIDs)
+
+
+def getModelByBoardID(boardID):
+	return modelsByBoardID.get(boardID, 'Unknown')
+
+
+def getBoardIDsByModel(modelID):
+	# some models (like iMac17,1) use more than one board-id.
+	return boardIDsByModel.get(modelID, [])
+
+
+def getBoardIDByModel(modelID):
+	boardIDs = boardIDsByModel.get(modelID)
+	if boardIDs:
+		return boardIDs[0]
+
+	return 'Unknown'
+
+
+def main(argv):
+	for arg in argv:
+		if arg.startswith('Mac-'):
+			print('%s - %s' % (arg, getModelByBoardID(arg)))
+		else:
+			print('%s - %s' % (arg, ', '.join(getBoardIDsByModel(arg)) or 'Unknown'))
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+#
+# Script (downloadProgress.py) to show the combined progress of the parallel package downloads of installSeed.py.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+# Usage:
+#		   - with DownloadProgress([(filename, size), ...], sys.stdout, statusFile) as progress:
+#		         Pool(initializer=initWorker, initargs=(progress.queue,))
+#		   - in the worker: reporter = Reporter(filename), reporter.add(len(chunk)) and reporter.finish()
+#		   - python downloadProgress.py <status file> (shows the numbers of a running download).
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import threading
+
+from collections import deque
+
+try:
+	from Queue import Empty
+except ImportError:
+	from queue import Empty
+
+#
+# Seconds between two updates (of the output and the status file).
+#
+UPDATE_INTERVAL = 1.0
+#
+# Rates are measured over the last RATE_WINDOW seconds.
+#
+RATE_WINDOW = 5.0
+#
+# Workers send at most one message per REPORT_INTERVAL seconds (per file).
+#
+REPORT_INTERVAL = 0.25
+#
+# Seconds to wait for the last messages of the workers.
+#
+STOP_TIMEOUT = 1.0
+
+#
+# Set in the Pool workers by initWorker (None means nobody is listening).
+#
+progressQueue = None
+
+
+def initWorker(queue):
+	global progressQueue
+	progressQueue = queue
+
+
+def isReporting():
+	return progressQueue is not None
+
+
+def formatBytes(byteCount):
+	if byteCount < 1024:
+		return "%i bytes" % byteCount
+	for unit in ('KB', 'MB'):
+		byteCount /= 1024.0
+		if byteCount < 1024:
+			return "%.1f %s" % (byteCount, unit)
+	return "%.2f GB" % (byteCount / 1024.0)
+
+
+def formatSeconds(seconds):
+	if seconds is None:
+		return "--:--"
+	minutes, seconds = divmod(int(seconds), 60)
+	if minutes >= 60:
+		return "%i:%02i:%02i" % (minutes // 60, minutes % 60, seconds)
+	return "%i:%02i" % (minutes, seconds)
+
+
+def getStatusLines(snapshot):
+	if snapshot['expectedBytes']:
+		percentage = " (%i%%)" % (snapshot['bytes'] * 100 // snapshot['expectedBytes'])
+		total = "%s of %s%s" % (formatBytes(snapshot['bytes']), formatBytes(snapshot['expectedBytes']), percentage)
+	else:
+		total = formatBytes(snapshot['bytes'])
+	lines = ["Total: %s at %s/s, ETA %s" % (total, formatBytes(snapshot['bytesPerSecond']), formatSeconds(snapshot['eta']))]
+
+	for item in snapshot['files']:
+		if item['state'] != 'downloading':
+			continue
+		percentage = "%3i%%" % (item['bytes'] * 100 // item['size']) if item['size'] else " ---"
+		lines.append("  %-32s %s %12s/s" % (item['name'], percentage, formatBytes(item['bytesPerSecond'])))
+
+	return lines
+
+
+class Reporter(object):
+	# byte counts are added up in the worker, and sent in batches.
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.pending = 0
+		self.lastReport = 0
+
+	def send(self, event, value=0):
+		if progressQueue is not None:
+			progressQueue.put((self.filename, event, value))
+
+	def flush(self):
+		if self.pending:
+			self.send('bytes', self.pending)
+			self.pending = 0
+		self.lastReport = time.time()
+
+	def add(self, byteCount):
+		self.pending += byteCount
+		if time.time() - self.lastReport >= REPORT_INTERVAL:
+			self.flush()
+
+	def restart(self):
+		# the server ignored our Range header, and the file is written from the start.
+		self.pending = 0
+		self.send('restart')
+
+	def retry(self):
+		self.flush()
+		self.send('retry')
+
+	def finish(self):
+		self.flush()
+		self.send('finished')
+
+	def fail(self):
+		self.flush()
+		self.send('failed')
+
+
+class FileProgress(object):
+
+	def __init__(self, name, size):
+		self.name = name
+		self.size = size
+		self.bytes = 0
+		self.retries = 0
+		self.state = 'queued'
+		self.samples = deque()
+
+	def addSample(self, now):
+		self.samples.append((now, self.bytes))
+		while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+			self.samples.popleft()
+
+	def getRate(self):
+		if self.state != 'downloading' or len(self.samples) < 2:
+			return 0.0
+		(firstTime, firstBytes), (lastTime, lastBytes) = self.samples[0], self.samples[-1]
+		if lastTime <= firstTime:
+			return 0.0
+		return max(lastBytes - firstBytes, 0) / (lastTime - firstTime)
+
+
+class DownloadProgress(object):
+
+	def __init__(self, files, output=None, statusFile=None, interval=UPDATE_INTERVAL):
+		import multiprocessing
+		self.queue = multiprocessing.Queue()
+		self.files = [FileProgress(name, size) for name, size in files]
+		self.filesByName = dict((progress.name, progress) for progress in self.files)
+		self.output = output
+		self.statusFile = statusFile
+		self.interval = interval
+		self.lock = threading.Lock()
+		self.samples = deque()
+		self.startTime = None
+		self.thread = None
+		self.drawnLines = 0
+		self.isTerminal = output is not None and hasattr(output, 'isatty') and output.isatty()
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.stop()
+		return False
+
+	def start(self):
+		self.startTime = time.time()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		if self.thread:
+			self.queue.put(None)
+			self.thread.join()
+			self.thread = None
+
+	def isComplete(self):
+		with self.lock:
+			return not [progress for progress in self.files if progress.state not in ('finished', 'failed')]
+
+	def run(self):
+		nextUpdate = time.time()
+		stopTime = None
+
+		while True:
+			try:
+				message = self.queue.get(timeout=max(nextUpdate - time.time(), 0.01))
+			except Empty:
+				message = False
+
+			if message is None:
+				stopTime = time.time()
+			# messages of the workers may arrive after the stop message, wait a little for them.
+			if stopTime and (self.isComplete() or time.time() - stopTime > STOP_TIMEOUT):
+				break
+			if message:
+				self.handleMessage(*message)
+			if time.time() >= nextUpdate:
+				self.update()
+				nextUpdate = time.time() + self.interval
+
+		self.update()
+		self.clear()
+
+		if self.output:
+			snapshot = self.snapshot()
+			print("Downloaded %s in %s (%s/s)" % (formatBytes(snapshot['bytes']), formatSeconds(snapshot['elapsed']),
+				formatBytes(snapshot['averageBytesPerSecond'])), file=self.output)
+
+	def handleMessage(self, name, event, value):
+		with self.lock:
+			progress = self.filesByName.get(name)
+			if progress is None:
+				progress = self.filesByName[name] = FileProgress(name, None)
+				self.files.append(progress)
+			if progress.state == 'queued':
+				progress.state = 'downloading'
+			if event == 'bytes':
+				progress.bytes += value
+			elif event == 'restart':
+				progress.bytes = 0
+				progress.samples.clear()
+			elif event == 'retry':
+				progress.retries += 1
+			elif event in ('finished', 'failed'):
+				progress.state = event
+
+		if event in ('finished', 'failed'):
+			self.clear()
+			if self.output:
+				print("Download of %s %s" % (name, event), file=self.output)
+
+	def update(self):
+		now = time.time()
+
+		with self.lock:
+			for progress in self.files:
+				progress.addSample(now)
+			self.samples.append((now, sum(progress.bytes for progress in self.files)))
+			while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+				self.samples.popleft()
+
+		snapshot = self.snapshot()
+
+		if self.isTerminal:
+			self.draw(snapshot)
+		if self.statusFile:
+			self.writeStatusFile(snapshot)
+
+	def snapshot(self):
+		# the numbers shown in the output, for monitoring (also written to the status file).
+		now = time.time()
+
+		with self.lock:
+			files = [dict(name=progress.name, bytes=progress.bytes, size=progress.size, bytesPerSecond=progress.getRate(),
+				retries=progress.retries, state=progress.state) for progress in self.files]
+			samples = list(self.samples)
+
+		totalBytes = sum(item['bytes'] for item in files)
+		elapsed = now - self.startTime if self.startTime else 0.0
+		rate = 0.0
+
+		if len(samples) > 1 and samples[-1][0] > samples[0][0]:
+			rate = max(samples[-1][1] - samples[0][1], 0) / (samples[-1][0] - samples[0][0])
+
+		expectedBytes = None
+		eta = None
+
+		if None not in [item['size'] for item in files]:
+			expectedBytes = sum(item['size'] for item in files)
+			remaining = sum(max(item['size'] - item['bytes'], 0) for item in files if item['state'] != 'finished')
+			if remaining == 0:
+				eta = 0.0
+			elif rate > 0:
+				eta = remaining / rate
+
+		return dict(time=now, elapsed=elapsed, bytes=totalBytes, expectedBytes=expectedBytes, bytesPerSecond=rate,
+			averageBytesPerSecond=(totalBytes / elapsed if elapsed > 0 else 0.0), eta=eta, files=files)
+
+	def draw(self, snapshot):
+		lines = getStatusLines(snapshot)
+		# move up to the first line of the previous update, and overwrite it.
+		if self.drawnLines:
+			self.output.write("\x1b[%iA" % self.drawnLines)
+		for line in lines:
+			self.output.write("\r\x1b[K%s\n" % line)
+		self.output.write("\x1b[J")
+		self.output.flush()
+		self.drawnLines = len(lines)
+
+	def clear(self):
+		if self.isTerminal and self.drawnLines:
+			self.output.write("\x1b[%iA\r\x1b[J" % self.drawnLines)
+			self.output.flush()
+			self.drawnLines = 0
+
+	def writeStatusFile(self, snapshot):
+		temporaryFile = self.statusFile + ".%d" % os.getpid()
+
+		try:
+			with open(temporaryFile, 'w') as f:
+				json.dump(snapshot, f, indent=1, sort_keys=True)
+			os.rename(temporaryFile, self.statusFile)
+		except (IOError, OSError) as error:
+			print("ERROR: writing of %s failed with %s." % (self.statusFile, error), file=sys.stderr)
+			self.statusFile = None
+
+
+if __name__ == "__main__":
+	for path in sys.argv[1:]:
+		with open(path, 'r') as f:
+			snapshot = json.load(f)
+		print("\n".join(getStatusLines(snapshot)))
@@ -35,6 +35,17 @@
 #		   - added support for the -m argument (selects target macOS version).
 #		   - added missing lines in getRawEFIVersion()
 #		   - workaround added for missing firmware updates (like iMacPro1,1).
+#		   - extract only the firmware files from the InstallAssistantAuto payload.
+#		   - added support for the -j argument (number of decompression threads).
+#		   - board-id/model data moved to boardIDRegistry.py (no more linear scans).
+#		   - added support for the -o argument (json/csv records instead of a table).
+#		   - payload parsing moved to firmwareScan.py (can be used without IOKit).
+#		   - EFI versions are now compared with firmwareVersion.py (version, build and date).
+#		   - load IOKit and other heavy modules on first use only.
+#		   - use the installSeed.py API (one process and one catalog fetch for both packages).
+#		   - added support for the -T and -P arguments (stage timing trace and cProfile stats).
+#		   - installSeed.py is no longer downloaded (the API is only in the local copy).
+#		   - a malformed firmware file is reported and skipped (no longer aborts the scan).
 #
 # License:
 #		   -  BSD 3-Clause License
@@ -71,21 +82,21 @@ import os
 import glob
 import sys
 import subprocess
-import binascii
 import signal
-import objc
-import stat
-import urllib2
-import struct
 import shutil
 import argparse
+import tracing
 #import uuid
 
-from os.path import basename
-from Foundation import NSBundle
 from subprocess import Popen, PIPE
+from firmwareScan import getFirmwareFiles, getBiosIDString, scanFirmwareFile
+from reportWriter import RecordWriter, OUTPUT_FORMATS
+from firmwareVersion import isNewerEFIVersion
 
-IOKitBundle = NSBundle.bundleWithIdentifier_('com.apple.framework.IOKit')
+#
+# IOKit functions (loaded on first use by getIOKitFunctions).
+#
+IOKit = None
 
 functions = [
  ("IOServiceGetMatchingService", b"II@"),
@@ -94,278 +105,81 @@ functions = [
  ("IORegistryEntryCreateCFProperty", b"@I@@I")
 ]
 
-objc.loadBundleFunctions(IOKitBundle, globals(), functions)
-
 VERSION = 2.7
 EFIUPDATER = "/usr/libexec/efiupdater"
 INSTALLSEED = "installSeed.py"
 FIRMWARE_UPDATE_PATH = "/tmp/FirmwareUpdate"
 PAYLOAD_PATH = "Scripts/Tools/EFIPayloads"
 TMP_IA_PATH = "/tmp/InstallAssistantAuto"
-TMP_PAYLOAD = "/tmp/payload"
 FIRMWARE_PATH = "Contents/Resources/Firmware"
 
 GLOB_SCAP_EXTENSION = "*.scap"
 GLOB_FD_EXTENSION = "*.fd"
 
-oldStyleFWModels = [
- "MB51","MB52","MB61","MB71","MBP41","MBP51","MBP52","MBP53",
- "MBP55","MBP61","MBP71","MBP81","MBP91","MBP101","MBP102","MBA21",
- "MBA31","MBA41","MBA51","IM81","IM91","IM101","IM111","IM112",
- "IM121","IM131","MM32","MM41","MM51","MM61","MP51","MP61"
-]
-
-boardIDModelIDs = [
-["Mac-F22C8AC8", "MacBook6,1"],
-["Mac-F22C89C8", "MacBook7,1"],
-["Mac-BE0E8AC46FE800CC", "MacBook8,1"],
-["Mac-F305150B0C7DEEEF", "MacBook8,x"],
-["Mac-9AE82516C7C6B903", "MacBook9,1"],
-["Mac-EE2EBD4B90B839A8", "MacBook10,1"],
-["Mac-F22589C8", "MacBookPro6,1"],
-["Mac-F22586C8", "MacBookPro6,2"],
-["Mac-F222BEC8", "MacBookPro7,1"],
-["Mac-94245B3640C91C81", "MacBookPro8,1"],
-["Mac-94245A3940C91C80", "MacBookPro8,2"],
-["Mac-942459F5819B171B", "MacBookPro8,3"],
-["Mac-4B7AC7E43945597E", "MacBookPro9,1"],
-["Mac-6F01561E16C75D06", "MacBookPro9,2"],
-["Mac-C3EC7CD22292981F", "MacBookPro10,1"],
-["Mac-AFD8A9D944EA4843", "MacBookPro10,2"],
-["Mac-189A3D4F975D5FFC", "MacBookPro11,1"],
-["Mac-D1FF70AF6D8C849A", "MacBookPro11,x"],
-["Mac-3CBD00234E554E41", "MacBookPro11,2"],
-["Mac-2BD1B31983FE1663", "MacBookPro11,3"],
-["Mac-06F11FD93F0323C5", "MacBookPro11,4"],
-["Mac-06F11F11946D27C5", "MacBookPro11,5"],
-["Mac-E43C1C25D4880AD6", "MacBookPro12,1"],
-["Mac-473D31EABEB93F9B", "MacBookPro13,1"],
-["Mac-66E35819EE2D0D05", "MacBookPro13,2"],
-["Mac-1BDAB09B689867E2", "MacBookPro13,x"],
-["Mac-A5C67F76ED83108C", "MacBookPro13,3"],
-["Mac-B4831CEBD52A0C4C","MacBookPro14,1"],
-["Mac-CAD6701F7CEA0921","MacBookPro14,2"],
-["Mac-551B86E5744E2388","MacBookPro14,3"],
-["Mac-942452F5819B1C1B", "MacBookAir3,1"],
-["Mac-942C5DF58193131B", "MacBookAir3,2"],
-["Mac-C08A6BB70A942AC2", "MacBookAir4,1"],
-["Mac-742912EFDBEE19B3", "MacBookAir4,2"],
-["Mac-66F35F19FE2A0D05", "MacBookAir5,1"],
-["Mac-2E6FAB96566FE58C", "MacBookAir5,2"],
-["Mac-35C1E88140C3E6CF", "MacBookAir6,1"],
-["Mac-7DF21CB3ED6977E5", "MacBookAir6,2"],
-["Mac-9F18E312C5C2BF0B", "MacBookAir7,1"],
-["Mac-937CB26E2E02BB01", "MacBookAir7,2"],
-["Mac-F2268CC8", "iMac10,1"],
-["Mac-F2268DAE", "iMac11,1"],
-["Mac-F2238AC8", "iMac11,2"],
-["Mac-F2238BAE", "iMac11,3"],
-["Mac-942B5BF58194151B", "iMac12,1"],
-["Mac-942B59F58194171B", "iMac12,2"],
-["Mac-00BE6ED71E35EB86", "iMac13,1"],
-["Mac-FC02E91DDD3FA6A4", "iMac13,2"],
-["Mac-7DF2A3B5E5D671ED", "iMac13,3"],
-["Mac-031B6874CF7F642A", "iMac14,1"],
-["Mac-27ADBB7B4CEE8E61", "iMac14,2"],
-["Mac-77EB7D7DAF985301", "iMac14,3"],
-["Mac-81E3E92DD6088272", "iMac14,4"],
-["Mac-FA842E06C61E91C5", "iMac15,1"],
-["Mac-42FD25EABCABB274", "iMac15,1"],
-["Mac-A369DDC4E67F1C45", "iMac16,1"],
-["Mac-FFE5EF870D7BA81A", "iMac16,2"],
-["Mac-DB15BD556843C820", "iMac17,1"],
-["Mac-65CE76090165799A", "iMac17,1"],
-["Mac-B809C3757DA9BB8D", "iMac17,1"],
-["Mac-4B682C642B45593E", "iMac18,1"],
-["Mac-77F17D7DA9285301", "iMac18,2"],
-["Mac-BE088AF8C5EB4FA2", "iMac18,3"],
-["Mac-F2208EC8", "Macmini4,1"],
-["Mac-8ED6AF5B48C039E1", "Macmini5,1"],
-["Mac-4BC72D62AD45599E", "Macmini5,2"],
-["Mac-7BA5B2794B2CDB12", "Macmini5,3"],
-["Mac-031AEE4D24BFF0B1", "Macmini6,1"],
-["Mac-F65AE981FFA204ED", "Macmini6,2"],
-["Mac-35C5E08120C7EEAF", "Macmini7,1"],
-["Mac-F221BEC8", "MacPro4,1"],
-["Mac-F221DCC8", "MacPro5,1"],
-["Mac-F60DEB81FF30ACF6", "MacPro6,1"],
-["Mac-7BA5B2D9E42DDD94", "iMacPro1,1"],
-["Mac-CF21D135A7D34AA6","Unknown"],
-["Mac-112B0A653D3AAB9C","Unknown"],
-["Mac-90BE64C3CB5A9AEB","Unknown"]
-]
+REPORT_FIELDS = ['boardID', 'modelID', 'biosID', 'isCurrentMachine', 'needsUpdate']
 
 #x = uuid.UUID(bytes_le='\x4A\x25\x1F\x78\x57\xC4\x13\x5D\x92\x75\x1B\xF5\xD5\x6E\x07\x24')
 #print uuid.UUID(x.hex)
 
 
-def getInstallSeed(scriptDirectory):
-	URL = "https://raw.githubusercontent.com/Piker-Alpha/HandyScripts/master/installSeed.py"
-	try:
-		req = urllib2.urlopen(URL)
-	except urllib2.URLError:
-		print >> sys.stderr("\nERROR: opening of (%s) failed. Aborting ...\n" % URL)
-
-	filename = basename(URL)
-	filesize = req.info().getheader('Content-Length')
-	targetFile = os.path.join(scriptDirectory, filename)
-
-	if os.path.exists(targetFile):
-		os.remove(targetFile)
-
-	with open(targetFile, 'w') as f:
-		print '\nDownloading: %s [%s bytes] ...' % (filename, filesize)
-		while True:
-			chunk = req.read(1024)
-			if not chunk:
-				break
-			f.write(chunk)
-		# get/set file mode (think chmod +x <filename>)
-		mode = os.fstat(f.fileno()).st_mode
-		mode |= stat.S_IXUSR
-		os.fchmod(f.fileno(), stat.S_IMODE(mode))
-
-
-def launchInstallSeed(action, targetPackage, unpackPath, macOSVersion):
+class attrdict(dict):
+	__getattr__ = dict.__getitem__
+	__setattr__ = dict.__setitem__
+
+
+def getIOKitFunctions():
+	global IOKit
+	if IOKit is None:
+		import objc
+		from Foundation import NSBundle
+		IOKitBundle = NSBundle.bundleWithIdentifier_('com.apple.framework.IOKit')
+		IOKit = attrdict()
+		objc.loadBundleFunctions(IOKitBundle, IOKit, functions)
+	return IOKit
+
+
+def launchInstallSeed(action, targetPackage, unpackPath, macOSVersion, output=None):
 	scriptDirectory = os.path.dirname(os.path.abspath(__file__))
 	helperScript = os.path.join(scriptDirectory, INSTALLSEED)
+	# the API and helper modules (tracing.py, singleFlight.py ...) are only in the local copy, so we no longer download it.
 	if not os.path.exists(helperScript):
-		getInstallSeed(scriptDirectory)
+		print >> sys.stderr, ("\nERROR: %s not found (it should be in %s with the other scripts). Aborting ...\n" % (INSTALLSEED, scriptDirectory))
+		sys.exit(-1)
 	#
-	# installSeed -a update -f FirmwareUpdate.pkg -t / -c 0 -u /tmp/FirmwareUpdate
+	# in-process version of: installSeed -a update -f FirmwareUpdate.pkg -t / -c 0 -u /tmp/FirmwareUpdate
 	#
-	cmd = [helperScript]
-	cmd.extend(['-a', action])
-	cmd.extend(['-f', targetPackage])
-	cmd.extend(['-t', '/'])
-	cmd.extend(['-c', '0'])
-	cmd.extend(['-u', unpackPath])
-	cmd.extend(['-m', macOSVersion])
-
+	# installSeed.py sets __OS_INSTALL (on import) for its installer runs, and not for the rest of this process.
+	osInstall = os.environ.get('__OS_INSTALL')
 	try:
-		retcode = subprocess.call(cmd)
-	except OSError, error:
-		print >> sys.stderr, ("ERROR: launch of installSeed.py failed with %s." % error)
-
-
-def getFirmwareFiles(path):
-	return glob.glob(path)
-
-
-def shouldPerformGUIDCheck(filename):
-	id = filename.split('_')[0]
-
-	if id in oldStyleFWModels:
-		return False
-	return True
-
-
-def getBoardIDs(f, position, trailingBytes):
-	boardIDs = []
-	count = 15
-	# skip GUID + the the first four bytes of the structure.
-	position+=20
-	f.seek(position, 0)
-	while count > 1:
-		count-=1
-		# skip eight bytes (the first time this is the structure, and after that a board-id).
-		position+=8
-		f.seek(position, 0)
-		boardID = binascii.hexlify(f.read(8)).upper()
-		if boardID == "FFFFFFFFFFFFFFFF":
-			break
+		import installSeed
+	except ImportError, error:
+		print >> sys.stderr, ("\nERROR: import of %s failed with %s. Aborting ...\n" % (helperScript, error))
+		sys.exit(-1)
+	stdout = sys.stdout
+	os.environ['__OS_INSTALL'] = "1"
+
+	if output:
+		sys.stdout = output
+	try:
+		return installSeed.fetchAndExpandPackage(action, macOSVersion, targetPackage, unpackPath)
+	finally:
+		sys.stdout = stdout
+		if osInstall is None:
+			del os.environ['__OS_INSTALL']
 		else:
-			boardIDs.append("Mac-%s" % boardID)
-		#
-		if trailingBytes == True:
-			position+=2
-	return boardIDs
-
-
-def getEFIVersion(f, position):
-	f.seek(position, 0)
-
-	if position > 4096:
-		while not f.read(8) == "$IBIOSI$":
-			position-=4
-			f.seek(position)
-	else:
-		while not f.read(8) == "$IBIOSI$":
-			position+=4
-			f.seek(position)
-
-	return f.read(0x41)
-
-
-def getEFIData(f, position):
-	biosID = getEFIVersion(f, position)
-	model = biosID.split('.')[0]
-	modelID = getModelID(model)
-	boardID = getBoardIDByModel(modelID)
-	return (boardID, modelID, biosID)
-
-
-def getModelNumberString(decimals):
-	length = len(decimals)
-
-	if length == 2:
-		strData = decimals[0] + ',' + decimals[1]
-	elif length == 3:
-		strData = decimals[0] + decimals[1] + ',' + decimals[2]
-	return strData
-
-
-def getModelID(id):
-	did = id.decode('utf-16')
-	lid = did.lstrip()
-	length = (len(lid) - 1)
-
-	if lid.startswith('IM'):
-		number = lid.strip('IM')
-		return 'iMac%s' % getModelNumberString(number)
-	elif lid.startswith('MBP'):
-		number = lid.strip('MBP')
-		return 'MacBookPro%s' % getModelNumberString(number)
-	elif lid.startswith('MBA'):
-		number = lid.strip('MBA')
-		return 'MacBookAir%s' % getModelNumberString(number)
-	elif lid.startswith('MB'):
-		number = lid.strip('MB')
-		return 'MacBook%s' % getModelNumberString(number)
-	elif lid.startswith('MM'):
-		number = lid.strip('MP')
-		return 'Macmini%s' % getModelNumberString(number)
-	elif lid.startswith('MP'):
-		number = lid.strip('MP')
-		return 'MacPro%s' % getModelNumberString(number)
-
-	return 'Unknown'
-
-
-def getBoardIDByModel(modelID):
-	for x in boardIDModelIDs:
-		if modelID == x[1]:
-			return x[0]
-
-	return 'Unknown'
-
-
-def getModelByBoardID(boardID):
-	for x in boardIDModelIDs:
-		if boardID == x[0]:
-			return x[1]
-
-	return 'Unknown'
+			os.environ['__OS_INSTALL'] = osInstall
 
 
 def getMyBoardID():
-	data = IORegistryEntryCreateCFProperty(IOServiceGetMatchingService(0, IOServiceMatching("IOPlatformExpertDevice")), "board-id", None, 0)
+	IOKit = getIOKitFunctions()
+	data = IOKit.IORegistryEntryCreateCFProperty(IOKit.IOServiceGetMatchingService(0, IOKit.IOServiceMatching("IOPlatformExpertDevice")), "board-id", None, 0)
 	if data and len(data):
 		return str(data).strip('\x00')
 
 
 def getRawEFIVersion():
-	data = IORegistryEntryCreateCFProperty(IORegistryEntryFromPath(0, "IODeviceTree:/rom"), "version", None, 0)
+	IOKit = getIOKitFunctions()
+	data = IOKit.IORegistryEntryCreateCFProperty(IOKit.IORegistryEntryFromPath(0, "IODeviceTree:/rom"), "version", None, 0)
 	if data and len(data):
 		return str(data).strip('\x00')
 
@@ -402,46 +216,6 @@ def getEFIDate(efiDate):
 	return efiDate.strip('\x00')
 
 
-def searchForGUID(f, filesize, filename):
-	# Check for MacPro5,1 because it uses a different UUID.
-	if filename.startswith('MP51'):
-		position = 0
-		# Check for Apple UUID(C3E36D09-8294-4B97-A857-D5288FE33E28)
-		while not binascii.hexlify(f.read(16)) == "096de3c39482974ba857d5288fe33e28":
-			if position < (filesize-8):
-				position+=4
-				f.seek(position, 0)
-	else:
-		position = 0x98
-		f.seek(position, 0)
-		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
-		if binascii.hexlify(f.read(16)) == "4a251f7857c4135d92751bf5d56e0724":
-			return position
-
-		position = 0x1200
-		f.seek(position, 0)
-		# Check for Apple UUID(11380FF9-CFBF-5CD5-997E-83FD089569F0)
-		if binascii.hexlify(f.read(16)) == "f90f3811bfcfd55c997e83fd089569f0":
-			return position
-
-		position = 0x1048
-		f.seek(position, 0)
-		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
-		if binascii.hexlify(f.read(16)) == "4a251f7857c4135d92751bf5d56e0724":
-			return position
-
-		position = (filesize-8)
-		f.seek(position, 0)
-		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
-		while not binascii.hexlify(f.read(16)) == "4a251f7857c4135d92751bf5d56e0724":
-			if position > 8:
-				position-=4
-				f.seek(position, 0)
-
-	#print 'GUID found @ byte 0x%x' % position
-	return position
-
-
 def showSystemData(linePrinted, boardID, modelID, biosID):
 	if linePrinted == False:
 		print '---------------------------------------------------------------------------'
@@ -450,101 +224,87 @@ def showSystemData(linePrinted, boardID, modelID, biosID):
 	return True
 
 
+def showFirmwareData(writer, linePrinted, boardID, modelID, biosID, myBoardID, rawVersion):
+	isCurrentMachine = (boardID == myBoardID)
+	needsUpdate = isCurrentMachine and shouldWarnAboutUpdate(rawVersion, biosID)
+
+	if writer:
+		writer.write(boardID=boardID, modelID=modelID, biosID=getBiosIDString(biosID), isCurrentMachine=isCurrentMachine, needsUpdate=needsUpdate)
+	elif isCurrentMachine:
+		linePrinted = showSystemData(linePrinted, boardID, modelID, biosID)
+	else:
+		print '  %20s | %14s |%s' % (boardID, modelID, biosID)
+		linePrinted = False
+	return (linePrinted, needsUpdate)
+
+
 def shouldWarnAboutUpdate(rawVersion, biosID):
-	myBiosDate = rawVersion.split('.')[4]
-	biosDate = biosID.split('.')[4].replace('\x00', '')
-	if myBiosDate < biosDate:
-		return True
-
-	return False
-
-
-def convertPayloadToZX(payloadPath):
-	with open(payloadPath, 'rb') as sourceFile:
-		# Payload Binary ZX magic found?
-		if sourceFile.read(4) != 'pbzx':
-			return False
-		with open("/tmp/payload.zx", 'wb') as outFile:
-			sourceFile.seek(16, 1)
-			data64 = sourceFile.read(8)
-			blockSize = struct.unpack('>Q', data64)[0]
-			outFile.write(sourceFile.read(blockSize))
-			sourceFile.seek(8, 1)
-			data64 = sourceFile.read(8)
-			blockSize = struct.unpack('>Q', data64)[0]
-			outFile.write(sourceFile.read(blockSize))
-		# check the footer of the created file.
-		with open("/tmp/payload.zx", 'rb') as checkFile:
-			checkFile.seek(-2, 2)
-			if checkFile.read(2) == 'YZ':
-				return True
-	return False
-
-
-def extractPayloadToDirectory():
+	return isNewerEFIVersion(rawVersion, getBiosIDString(biosID))
+
+
+def extractFirmwareUpdates(workers):
+	import pbzx
 	payloadPath = os.path.join(TMP_IA_PATH, "Payload")
 	if not os.path.exists(payloadPath):
 		return False
-	if not convertPayloadToZX(payloadPath):
-		return False
-	if os.path.exists(TMP_PAYLOAD):
-		shutil.rmtree(TMP_PAYLOAD)
-	os.makedirs(TMP_PAYLOAD)
-	cmd = ['cd /tmp/payload && /usr/bin/cpio -iF /tmp/payload.zx --quiet']
+	targetFolder = os.path.join(FIRMWARE_UPDATE_PATH, PAYLOAD_PATH)
+	targetFileTypes = [GLOB_SCAP_EXTENSION, GLOB_FD_EXTENSION]
+	# only the firmware files are written to disk, everything else is skipped.
+	patterns = [os.path.join("*", FIRMWARE_PATH, fileType) for fileType in targetFileTypes]
 
 	try:
-		retcode = subprocess.call(cmd, shell=True)
-		try:
-			os.remove("/tmp/payload.zx")
-		except OSError:
-			pass
-		return True
-	except OSError, error:
-		print >> sys.stderr, ("ERROR: cpio -iF /tmp/payload.zx --quiet failed with %s." % error)
-		sys.exit(0)
-
-	return False
-
-
-def copyFirmwareUpdates():
-	targetFolder = glob.glob(TMP_PAYLOAD + "/*")[0]
-	targetFileTypes = [GLOB_SCAP_EXTENSION, GLOB_FD_EXTENSION]
+		pbzx.extractPayload(payloadPath, patterns, targetFolder, workers)
+	except IOError, error:
+		print >> sys.stderr, ("ERROR: extraction of %s failed with %s." % (payloadPath, error))
+		return False
 
-	for fileType in targetFileTypes:
-		targetFiles = os.path.join(targetFolder, FIRMWARE_PATH, fileType)
-		firmwareFiles = getFirmwareFiles(targetFiles)
-		for firmwareFile in firmwareFiles:
-			targetFile = os.path.join(FIRMWARE_UPDATE_PATH, PAYLOAD_PATH, basename(firmwareFile))
-			shutil.copyfile(firmwareFile, targetFile)
 	try:
-		shutil.rmtree(TMP_PAYLOAD)
 		shutil.rmtree(TMP_IA_PATH)
 	except OSError:
 		pass
+	return True
 
 
 def main(argv):
-	sys.stdout.write("\x1b[2J\x1b[H")
-
 	parser = argparse.ArgumentParser()
 	parser.add_argument('-m', dest='macOSVersion')
+	parser.add_argument('-j', dest='workers', type=int)
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS)
+	parser.add_argument('-T', '--trace', dest='traceFile')
+	parser.add_argument('-P', '--profile', dest='profileDirectory')
 	args = parser.parse_args()
 
+	if args.traceFile or args.profileDirectory:
+		tracing.enableTracing(args.traceFile, args.profileDirectory)
+
+	writer = None
+	installSeedOutput = None
+
+	if args.outputFormat:
+		writer = RecordWriter(args.outputFormat, REPORT_FIELDS)
+		# keep stdout clean for the records.
+		installSeedOutput = sys.stderr
+	else:
+		sys.stdout.write("\x1b[2J\x1b[H")
+
 	if args.macOSVersion == None:
 		macOSVersion = "10.13"
 	else:
 		macOSVersion = args.macOSVersion
 
 	if not os.path.exists(FIRMWARE_UPDATE_PATH):
-		launchInstallSeed('update', 'FirmwareUpdate.pkg', FIRMWARE_UPDATE_PATH, macOSVersion)
+		with tracing.span('installSeed', package='FirmwareUpdate.pkg'):
+			launchInstallSeed('update', 'FirmwareUpdate.pkg', FIRMWARE_UPDATE_PATH, macOSVersion, installSeedOutput)
 	if not os.path.exists(TMP_IA_PATH):
-		launchInstallSeed('install', 'InstallAssistantAuto.pkg', TMP_IA_PATH, macOSVersion)
-	if extractPayloadToDirectory() == True:
-		copyFirmwareUpdates()
+		with tracing.span('installSeed', package='InstallAssistantAuto.pkg'):
+			launchInstallSeed('install', 'InstallAssistantAuto.pkg', TMP_IA_PATH, macOSVersion, installSeedOutput)
+	with tracing.span('extract'):
+		extractFirmwareUpdates(args.workers)
 
-	print '---------------------------------------------------------------------------'
-	print '         EFIver.py v%s Copyright (c) 2017 by Dr. Pike R. Alpha' % VERSION
-	print '---------------------------------------------------------------------------'
+	if not writer:
+		print '---------------------------------------------------------------------------'
+		print '         EFIver.py v%s Copyright (c) 2017 by Dr. Pike R. Alpha' % VERSION
+		print '---------------------------------------------------------------------------'
 
 	linePrinted = True
 	warnAboutEFIVersion = False
@@ -552,43 +312,24 @@ def main(argv):
 	rawVersion, currentVersion, updateVersion = getEFIVersionsFromEFIUpdater()
 	targetFileTypes = [GLOB_SCAP_EXTENSION, GLOB_FD_EXTENSION]
 
-	for fileType in targetFileTypes:
-		targetFiles = os.path.join(FIRMWARE_UPDATE_PATH, PAYLOAD_PATH, fileType)
-		firmwareFiles = getFirmwareFiles(targetFiles)
-		for firmwareFile in firmwareFiles:
-			with open(firmwareFile, 'rb') as f:
-				position = 0xb0
-				filename = basename(firmwareFile)
-				if shouldPerformGUIDCheck(filename):
-					filesize = os.stat(firmwareFile).st_size
-					if fileType == GLOB_SCAP_EXTENSION:
-						position = 0xb0
-					else:
-						position = filesize-44
-					biosID = getEFIVersion(f, position)
-					position = searchForGUID(f, position, filename)
-					trailingBytes = False
-					if position == 0x1200:
-						trailingBytes = True
-					boardIDs = getBoardIDs(f, position, trailingBytes)
-					for boardID in boardIDs:
-						modelID = getModelByBoardID(boardID)
-						if boardID == myBoardID:
-							linePrinted = showSystemData(linePrinted, boardID, modelID, biosID)
-							if shouldWarnAboutUpdate(rawVersion, biosID):
-								warnAboutEFIVersion = True
-						else:
-							print '  %20s | %14s |%s' % (boardID, modelID, biosID)
-							linePrinted = False
-				else:
-					boardID, modelID, biosID = getEFIData(f, 0xb0)
-					if boardID == myBoardID:
-						linePrinted = showSystemData(linePrinted, boardID, modelID, biosID)
-						if shouldWarnAboutUpdate(rawVersion, biosID):
-							warnAboutEFIVersion = True
-					else:
-						print '  %20s | %14s |%s' % (boardID, modelID, biosID)
-						linePrinted = False
+	with tracing.span('firmwareScan') as span:
+		for fileType in targetFileTypes:
+			targetFiles = os.path.join(FIRMWARE_UPDATE_PATH, PAYLOAD_PATH, fileType)
+			firmwareFiles = getFirmwareFiles(targetFiles)
+			span.setArgument(fileType, len(firmwareFiles))
+			for firmwareFile in firmwareFiles:
+				try:
+					firmwareData = scanFirmwareFile(firmwareFile)
+				except (IOError, ValueError, KeyError), error:
+					print >> sys.stderr, ("ERROR: scan of %s failed with %s." % (firmwareFile, error))
+					continue
+				for boardID, modelID, biosID in firmwareData:
+					linePrinted, needsUpdate = showFirmwareData(writer, linePrinted, boardID, modelID, biosID, myBoardID, rawVersion)
+					if needsUpdate:
+						warnAboutEFIVersion = True
+
+	if writer:
+		return
 
 	if linePrinted == False:
 		print '---------------------------------------------------------------------------'
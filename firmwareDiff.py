@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+#
+# Script (firmwareDiff.py) to show the EFI and SMC version changes between two FirmwareUpdate packages.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - the board-ids of the parsed .scap/.fd files are cached by hash, so that only the unchanged files
+#		     with a changed board-id (or without a cache entry) are parsed.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import json
+import signal
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+from multiprocessing import Pool
+from firmwareScan import findPayloadFiles, scanPayloadFile
+from reportWriter import RecordWriter, OUTPUT_FORMATS
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+CACHE_DIRECTORY = os.path.expanduser("~/Library/Caches/firmwareDiff")
+BOARD_ID_INDEX_FILE = os.path.join(CACHE_DIRECTORY, "boardIDs.json")
+BOARD_ID_INDEX_VERSION = 1
+
+REPORT_FIELDS = ['boardID', 'modelID', 'type', 'change', 'oldVersion', 'newVersion']
+
+
+def expandPackage(source):
+	# directories are used as is, packages are expanded first (macOS only).
+	if os.path.isdir(source):
+		return (source, None)
+	targetFolder = tempfile.mkdtemp(prefix='firmwareDiff.')
+	expandFolder = os.path.join(targetFolder, "package")
+	subprocess.check_call(['pkgutil', '--expand', source, expandFolder])
+	return (expandFolder, targetFolder)
+
+
+def getFileHash(path):
+	sha1 = hashlib.sha1()
+	with open(path, 'rb') as f:
+		while True:
+			data = f.read(HASH_BLOCK_SIZE)
+			if not data:
+				break
+			sha1.update(data)
+	return (path, sha1.hexdigest())
+
+
+def getPayloadHashes(pool, directory):
+	firmwareFiles, jsonFiles = findPayloadFiles([directory])
+	hashes = {}
+
+	for path, digest in pool.imap_unordered(getFileHash, firmwareFiles + jsonFiles):
+		hashes[os.path.relpath(path, directory)] = (path, digest)
+	return hashes
+
+
+def scanFiles(pool, paths):
+	# path -> records (imap keeps the order of paths).
+	return dict(zip(paths, pool.imap(scanPayloadFile, paths)))
+
+
+def loadBoardIDIndex():
+	# file hash -> board-ids in the file.
+	try:
+		with open(BOARD_ID_INDEX_FILE, 'r') as f:
+			indexData = json.load(f)
+		if indexData['version'] == BOARD_ID_INDEX_VERSION:
+			return indexData['files']
+	except (IOError, OSError, ValueError, KeyError):
+		pass
+	return {}
+
+
+def saveBoardIDIndex(boardIDIndex):
+	try:
+		if not os.path.isdir(CACHE_DIRECTORY):
+			os.makedirs(CACHE_DIRECTORY)
+		temporaryFile = BOARD_ID_INDEX_FILE + ".%d" % os.getpid()
+		with open(temporaryFile, 'w') as f:
+			json.dump({'version': BOARD_ID_INDEX_VERSION, 'files': boardIDIndex}, f)
+		os.rename(temporaryFile, BOARD_ID_INDEX_FILE)
+	except (IOError, OSError):
+		# no cache, the next run parses the unchanged files again.
+		pass
+
+
+def updateBoardIDIndex(boardIDIndex, scannedFiles, hashes):
+	for name, (path, digest) in hashes.items():
+		if path in scannedFiles and not name.endswith('.json'):
+			boardIDIndex[digest] = sorted(set(record[0] for record in scannedFiles[path]))
+
+
+def mayContainBoardIDs(name, digest, boardIDs, boardIDIndex):
+	# SMC JSONs are named after their board-id, firmware files are looked up in the index (unknown files are parsed).
+	if name.endswith('.json'):
+		return os.path.splitext(os.path.basename(name))[0] in boardIDs
+	if digest not in boardIDIndex:
+		return True
+	return not boardIDs.isdisjoint(boardIDIndex[digest])
+
+
+def getVersions(scannedFiles, files):
+	# files: (name, path) tuples, the first name (sorted) wins when a board-id is in more than one file.
+	versions = {}
+
+	for name, path in sorted(files):
+		for boardID, modelID, type, version, recordPath in scannedFiles[path]:
+			versions.setdefault((boardID, type), (modelID, version))
+	return versions
+
+
+def getChanges(oldVersions, newVersions):
+	changes = []
+
+	for key in sorted(set(oldVersions) | set(newVersions)):
+		boardID, type = key
+		oldModelID, oldVersion = oldVersions.get(key, (None, None))
+		newModelID, newVersion = newVersions.get(key, (None, None))
+		if oldVersion == newVersion:
+			continue
+		if oldVersion is None:
+			change = 'added'
+		elif newVersion is None:
+			change = 'removed'
+		else:
+			change = 'changed'
+		changes.append((boardID, newModelID or oldModelID, type, change, oldVersion, newVersion))
+
+	return changes
+
+
+def diffPackages(oldSource, newSource, workers=None):
+	pool = Pool(workers)
+	boardIDIndex = loadBoardIDIndex()
+
+	try:
+		oldHashes = getPayloadHashes(pool, oldSource)
+		newHashes = getPayloadHashes(pool, newSource)
+		# only files that are new, removed or have a different hash are parsed.
+		oldFiles = [(name, path) for name, (path, digest) in oldHashes.items() if newHashes.get(name, (None, None))[1] != digest]
+		newFiles = [(name, path) for name, (path, digest) in newHashes.items() if oldHashes.get(name, (None, None))[1] != digest]
+		scannedFiles = scanFiles(pool, [path for name, path in oldFiles + newFiles])
+		changes = getChanges(getVersions(scannedFiles, oldFiles), getVersions(scannedFiles, newFiles))
+		parsedFiles = len(scannedFiles)
+
+		if changes:
+			# a board-id can also be in an unchanged file (the same in both packages), so the changes are checked
+			# against the unchanged files that (may) have one of the changed board-ids. Without a board-id index
+			# (the first run), that are all the unchanged firmware files.
+			boardIDs = set(change[0] for change in changes)
+			unchangedFiles = [(name, path) for name, (path, digest) in newHashes.items() if oldHashes.get(name, (None, None))[1] == digest
+				and mayContainBoardIDs(name, digest, boardIDs, boardIDIndex)]
+			scannedFiles.update(scanFiles(pool, [path for name, path in unchangedFiles]))
+			changes = getChanges(getVersions(scannedFiles, oldFiles + unchangedFiles), getVersions(scannedFiles, newFiles + unchangedFiles))
+			parsedFiles = len(scannedFiles)
+	finally:
+		pool.close()
+		pool.join()
+
+	updateBoardIDIndex(boardIDIndex, scannedFiles, oldHashes)
+	updateBoardIDIndex(boardIDIndex, scannedFiles, newHashes)
+	saveBoardIDIndex(boardIDIndex)
+
+	return (changes, parsedFiles, len(oldHashes) + len(newHashes))
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Show EFI/SMC version changes between two FirmwareUpdate packages (.pkg or expanded directory).')
+	parser.add_argument('-j', dest='workers', type=int, help='number of worker processes (default: number of CPUs)')
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS, default='json')
+	parser.add_argument('oldSource')
+	parser.add_argument('newSource')
+	args = parser.parse_args(argv)
+
+	temporaryFolders = []
+
+	try:
+		oldSource, temporaryFolder = expandPackage(args.oldSource)
+		temporaryFolders.append(temporaryFolder)
+		newSource, temporaryFolder = expandPackage(args.newSource)
+		temporaryFolders.append(temporaryFolder)
+
+		changes, parsedFiles, totalFiles = diffPackages(oldSource, newSource, args.workers)
+		writer = RecordWriter(args.outputFormat, REPORT_FIELDS)
+
+		for boardID, modelID, type, change, oldVersion, newVersion in changes:
+			writer.write(boardID=boardID, modelID=modelID, type=type, change=change, oldVersion=oldVersion, newVersion=newVersion)
+		print("%d of %d payload files parsed, %d changes." % (parsedFiles, totalFiles, len(changes)), file=sys.stderr)
+	finally:
+		for temporaryFolder in temporaryFolders:
+			if temporaryFolder:
+				shutil.rmtree(temporaryFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	main(sys.argv[1:])
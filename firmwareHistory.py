@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+#
+# Script (firmwareHistory.py) to keep a local database with EFI and SMC versions from FirmwareUpdate.pkg releases.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import signal
+import sqlite3
+import argparse
+
+from datetime import datetime
+from firmwareScan import scanPayloads
+from reportWriter import RecordWriter, OUTPUT_FORMATS
+
+DEFAULT_DATABASE = os.path.expanduser("~/.firmwareHistory.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	label TEXT NOT NULL UNIQUE,
+	source TEXT,
+	ingested TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+	package_id INTEGER NOT NULL REFERENCES packages(id),
+	board_id TEXT NOT NULL,
+	model_id TEXT,
+	type TEXT NOT NULL,
+	version TEXT NOT NULL,
+	UNIQUE (package_id, board_id, type)
+);
+CREATE INDEX IF NOT EXISTS versions_board_id ON versions (board_id, type);
+CREATE INDEX IF NOT EXISTS versions_version ON versions (type, version);
+"""
+
+
+def openDatabase(path=DEFAULT_DATABASE):
+	connection = sqlite3.connect(path)
+	connection.executescript(SCHEMA)
+	return connection
+
+
+def isIngested(connection, label):
+	row = connection.execute("SELECT id FROM packages WHERE label = ?", (label,)).fetchone()
+	return row is not None
+
+
+def ingest(connection, label, directories, workers=None):
+	# packages are recorded once, and never changed afterwards.
+	if isIngested(connection, label):
+		return 0
+
+	# scanned first, so that a wrong directory doesn't leave an empty release behind (it can't be ingested again).
+	records = list(scanPayloads(directories, None, workers))
+	if not records:
+		raise ValueError("no firmware files found in %s" % ', '.join(directories))
+
+	count = 0
+	with connection:
+		cursor = connection.execute("INSERT INTO packages (label, source, ingested) VALUES (?, ?, ?)", (label, ', '.join(directories), datetime.utcnow().isoformat()))
+		packageID = cursor.lastrowid
+
+		for boardID, modelID, type, version, path in records:
+			cursor = connection.execute("INSERT OR IGNORE INTO versions (package_id, board_id, model_id, type, version) VALUES (?, ?, ?, ?, ?)", (packageID, boardID, modelID, type, version))
+			count += cursor.rowcount
+
+	return count
+
+
+def getPackages(connection):
+	return connection.execute("SELECT label, source, ingested FROM packages ORDER BY id").fetchall()
+
+
+def getHistory(connection, boardID, type):
+	# releases are ordered the way they were ingested.
+	return connection.execute("SELECT p.label, v.version FROM versions v JOIN packages p ON p.id = v.package_id WHERE v.board_id = ? AND v.type = ? ORDER BY p.id", (boardID, type)).fetchall()
+
+
+def getFirstRelease(connection, boardID, type, version):
+	row = connection.execute("SELECT p.label FROM versions v JOIN packages p ON p.id = v.package_id WHERE v.board_id = ? AND v.type = ? AND v.version = ? ORDER BY p.id LIMIT 1", (boardID, type, version)).fetchone()
+	if row:
+		return row[0]
+	return None
+
+
+def getPackageID(connection, label):
+	row = connection.execute("SELECT id FROM packages WHERE label = ?", (label,)).fetchone()
+	if row is None:
+		raise ValueError("unknown release label '%s'" % label)
+	return row[0]
+
+
+def getDiff(connection, oldLabel, newLabel):
+	# changed and added versions (no old version), followed by removed board-ids (no new version).
+	oldID = getPackageID(connection, oldLabel)
+	newID = getPackageID(connection, newLabel)
+	return connection.execute("""
+		SELECT n.board_id, n.model_id, n.type, o.version, n.version
+		FROM versions n
+		LEFT JOIN versions o ON o.package_id = ? AND o.board_id = n.board_id AND o.type = n.type
+		WHERE n.package_id = ? AND (o.version IS NULL OR o.version != n.version)
+		UNION ALL
+		SELECT o.board_id, o.model_id, o.type, o.version, NULL
+		FROM versions o
+		LEFT JOIN versions n ON n.package_id = ? AND n.board_id = o.board_id AND n.type = o.type
+		WHERE o.package_id = ? AND n.version IS NULL
+		ORDER BY 3, 1""", (oldID, newID, newID, oldID)).fetchall()
+
+
+def getChange(oldVersion, newVersion):
+	if oldVersion is None:
+		return 'added'
+	if newVersion is None:
+		return 'removed'
+	return 'changed'
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='EFI/SMC version history of FirmwareUpdate.pkg releases.')
+	parser.add_argument('-D', dest='database', default=DEFAULT_DATABASE, help='database file (default: %(default)s)')
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS, default='json')
+	subparsers = parser.add_subparsers(dest='command')
+
+	ingestParser = subparsers.add_parser('ingest', help='scan an expanded package and record its versions')
+	ingestParser.add_argument('-l', dest='label', required=True, help='release label (like 10.13.4-17E199)')
+	ingestParser.add_argument('-d', dest='directories', action='append', required=True)
+	ingestParser.add_argument('-j', dest='workers', type=int)
+
+	subparsers.add_parser('packages', help='list recorded releases')
+
+	historyParser = subparsers.add_parser('history', help='show all versions of a board-id')
+	historyParser.add_argument('-b', dest='boardID', required=True)
+	historyParser.add_argument('-t', dest='type', choices=['efi', 'smc'], default='efi')
+
+	firstParser = subparsers.add_parser('first', help='show the first release with a given version')
+	firstParser.add_argument('-b', dest='boardID', required=True)
+	firstParser.add_argument('-t', dest='type', choices=['efi', 'smc'], default='efi')
+	firstParser.add_argument('version')
+
+	diffParser = subparsers.add_parser('diff', help='show board-ids that were added, removed or got a different version between two releases')
+	diffParser.add_argument('oldLabel')
+	diffParser.add_argument('newLabel')
+
+	args = parser.parse_args(argv)
+
+	if args.command is None:
+		# Python 3 doesn't require a subcommand.
+		parser.error("no command given")
+
+	connection = openDatabase(args.database)
+
+	if args.command == 'ingest':
+		if isIngested(connection, args.label):
+			print("%s is already recorded (skipped)." % args.label, file=sys.stderr)
+		else:
+			try:
+				count = ingest(connection, args.label, args.directories, args.workers)
+			except ValueError as error:
+				print("ERROR: %s is not recorded (%s)." % (args.label, error), file=sys.stderr)
+				sys.exit(1)
+			print("%s: %d versions recorded." % (args.label, count), file=sys.stderr)
+	elif args.command == 'packages':
+		writer = RecordWriter(args.outputFormat, ['label', 'source', 'ingested'])
+		for label, source, ingested in getPackages(connection):
+			writer.write(label=label, source=source, ingested=ingested)
+	elif args.command == 'history':
+		writer = RecordWriter(args.outputFormat, ['label', 'version'])
+		for label, version in getHistory(connection, args.boardID, args.type):
+			writer.write(label=label, version=version)
+	elif args.command == 'first':
+		label = getFirstRelease(connection, args.boardID, args.type, args.version)
+		if label is None:
+			print("%s %s %s not found." % (args.boardID, args.type, args.version), file=sys.stderr)
+			sys.exit(1)
+		print(label)
+	elif args.command == 'diff':
+		try:
+			diff = getDiff(connection, args.oldLabel, args.newLabel)
+		except ValueError as error:
+			print("ERROR: %s." % error, file=sys.stderr)
+			sys.exit(1)
+		writer = RecordWriter(args.outputFormat, ['boardID', 'modelID', 'type', 'change', 'oldVersion', 'newVersion'])
+		for boardID, modelID, type, oldVersion, newVersion in diff:
+			writer.write(boardID=boardID, modelID=modelID, type=type, change=getChange(oldVersion, newVersion), oldVersion=oldVersion, newVersion=newVersion)
+
+	connection.close()
+
+
+if __name__ == "__main__":
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	main(sys.argv[1:])
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+#
+# Script (firmwareScan.py) to read EFI and SMC versions from firmware payloads (no IOKit required).
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version (payload parsing moved over from efiver.py and smcver.py).
+#		   - batched SMC JSON loader (threads, partial parsing and a cached version table).
+#		   - multiprocessing is imported on first use only.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import re
+import json
+import signal
+import binascii
+import argparse
+
+from os.path import basename, splitext
+from boardIDRegistry import getModelByBoardID, getBoardIDByModel
+from reportWriter import RecordWriter, OUTPUT_FORMATS
+
+VERSION = "1.0"
+
+GLOB_SCAP_EXTENSION = "*.scap"
+GLOB_FD_EXTENSION = "*.fd"
+SMC_JSONS_FOLDER = "SMCJSONs"
+SMC_VERSIONS_CACHE = "SMCVersions.cache.json"
+SMC_LOADER_THREADS = 8
+
+SMC_VERSION_RE = re.compile(r'"smc-version"\s*:\s*"([^"\\]*)"')
+
+REPORT_FIELDS = ['boardID', 'modelID', 'type', 'version', 'file']
+
+oldStyleFWModels = [
+ "MB51","MB52","MB61","MB71","MBP41","MBP51","MBP52","MBP53",
+ "MBP55","MBP61","MBP71","MBP81","MBP91","MBP101","MBP102","MBA21",
+ "MBA31","MBA41","MBA51","IM81","IM91","IM101","IM111","IM112",
+ "IM121","IM131","MM32","MM41","MM51","MM61","MP51","MP61"
+]
+
+
+def toString(data):
+	# hexlify returns bytes on Python 3.
+	if isinstance(data, str):
+		return data
+	return data.decode('ascii')
+
+
+def getFirmwareFiles(path):
+	return glob.glob(path)
+
+
+def shouldPerformGUIDCheck(filename):
+	id = filename.split('_')[0]
+
+	if id in oldStyleFWModels:
+		return False
+	return True
+
+
+def getBoardIDs(f, position, trailingBytes):
+	boardIDs = []
+	count = 15
+	# skip GUID + the the first four bytes of the structure.
+	position+=20
+	f.seek(position, 0)
+	while count > 1:
+		count-=1
+		# skip eight bytes (the first time this is the structure, and after that a board-id).
+		position+=8
+		f.seek(position, 0)
+		boardID = toString(binascii.hexlify(f.read(8)).upper())
+		if boardID == "FFFFFFFFFFFFFFFF":
+			break
+		else:
+			boardIDs.append("Mac-%s" % boardID)
+		#
+		if trailingBytes == True:
+			position+=2
+	return boardIDs
+
+
+def getEFIVersion(f, position):
+	f.seek(position, 0)
+
+	if position > 4096:
+		while not f.read(8) == b"$IBIOSI$":
+			position-=4
+			if position < 0:
+				raise ValueError("$IBIOSI$ signature not found")
+			f.seek(position)
+	else:
+		while True:
+			data = f.read(8)
+			if data == b"$IBIOSI$":
+				break
+			if len(data) < 8:
+				raise ValueError("$IBIOSI$ signature not found")
+			position+=4
+			f.seek(position)
+
+	return f.read(0x41)
+
+
+def getEFIData(f, position):
+	biosID = getEFIVersion(f, position)
+	model = biosID.split(b'.')[0]
+	modelID = getModelID(model)
+	boardID = getBoardIDByModel(modelID)
+	return (boardID, modelID, biosID)
+
+
+def getModelNumberString(decimals):
+	length = len(decimals)
+
+	if length == 2:
+		strData = decimals[0] + ',' + decimals[1]
+	elif length == 3:
+		strData = decimals[0] + decimals[1] + ',' + decimals[2]
+	return strData
+
+
+def getModelID(id):
+	did = id.decode('utf-16')
+	lid = did.lstrip()
+	length = (len(lid) - 1)
+
+	if lid.startswith('IM'):
+		number = lid.strip('IM')
+		return 'iMac%s' % getModelNumberString(number)
+	elif lid.startswith('MBP'):
+		number = lid.strip('MBP')
+		return 'MacBookPro%s' % getModelNumberString(number)
+	elif lid.startswith('MBA'):
+		number = lid.strip('MBA')
+		return 'MacBookAir%s' % getModelNumberString(number)
+	elif lid.startswith('MB'):
+		number = lid.strip('MB')
+		return 'MacBook%s' % getModelNumberString(number)
+	elif lid.startswith('MM'):
+		number = lid.strip('MP')
+		return 'Macmini%s' % getModelNumberString(number)
+	elif lid.startswith('MP'):
+		number = lid.strip('MP')
+		return 'MacPro%s' % getModelNumberString(number)
+
+	return 'Unknown'
+
+
+def getBiosIDString(biosID):
+	return biosID.replace(b'\x00', b'').decode('ascii', 'ignore').strip()
+
+
+def searchForGUID(f, filesize, filename):
+	# Check for MacPro5,1 because it uses a different UUID.
+	if filename.startswith('MP51'):
+		position = 0
+		# Check for Apple UUID(C3E36D09-8294-4B97-A857-D5288FE33E28)
+		while not binascii.hexlify(f.read(16)) == b"096de3c39482974ba857d5288fe33e28":
+			if position < (filesize-8):
+				position+=4
+				f.seek(position, 0)
+			else:
+				raise ValueError("Apple UUID not found in %s" % filename)
+	else:
+		position = 0x98
+		f.seek(position, 0)
+		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
+		if binascii.hexlify(f.read(16)) == b"4a251f7857c4135d92751bf5d56e0724":
+			return position
+
+		position = 0x1200
+		f.seek(position, 0)
+		# Check for Apple UUID(11380FF9-CFBF-5CD5-997E-83FD089569F0)
+		if binascii.hexlify(f.read(16)) == b"f90f3811bfcfd55c997e83fd089569f0":
+			return position
+
+		position = 0x1048
+		f.seek(position, 0)
+		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
+		if binascii.hexlify(f.read(16)) == b"4a251f7857c4135d92751bf5d56e0724":
+			return position
+
+		position = (filesize-8)
+		f.seek(position, 0)
+		# Check for Apple UUID(781F254A-C457-5D13-9275-1BF5D56E0724)
+		while not binascii.hexlify(f.read(16)) == b"4a251f7857c4135d92751bf5d56e0724":
+			if position > 8:
+				position-=4
+				f.seek(position, 0)
+			else:
+				raise ValueError("Apple UUID not found in %s" % filename)
+
+	#print 'GUID found @ byte 0x%x' % position
+	return position
+
+
+def scanFirmwareFile(firmwareFile):
+	firmwareData = []
+	filename = basename(firmwareFile)
+
+	with open(firmwareFile, 'rb') as f:
+		if shouldPerformGUIDCheck(filename):
+			filesize = os.stat(firmwareFile).st_size
+			if filename.endswith('.scap'):
+				position = 0xb0
+			else:
+				position = filesize-44
+			biosID = getEFIVersion(f, position)
+			position = searchForGUID(f, filesize, filename)
+			trailingBytes = False
+			if position == 0x1200:
+				trailingBytes = True
+			for boardID in getBoardIDs(f, position, trailingBytes):
+				firmwareData.append((boardID, getModelByBoardID(boardID), biosID))
+		else:
+			firmwareData.append(getEFIData(f, 0xb0))
+
+	return firmwareData
+
+
+def readSMCVersion(jsonFile):
+	boardID = splitext(basename(jsonFile))[0]
+
+	with open(jsonFile, 'r') as f:
+		jsonData = json.load(f)
+		return (boardID, jsonData[boardID]['smc-version'])
+
+
+def readSMCVersionFast(jsonFile):
+	boardID = splitext(basename(jsonFile))[0]
+
+	with open(jsonFile, 'r') as f:
+		data = f.read()
+	# every file has a single board-id, so we only need the first smc-version.
+	position = data.find('"smc-version"')
+	if position >= 0:
+		match = SMC_VERSION_RE.match(data, position)
+		if match:
+			return (boardID, match.group(1))
+	return (boardID, json.loads(data)[boardID]['smc-version'])
+
+
+def getSMCJSONsSignature(jsonFiles):
+	signature = []
+	for jsonFile in jsonFiles:
+		fileInfo = os.stat(jsonFile)
+		signature.append([basename(jsonFile), fileInfo.st_size, int(fileInfo.st_mtime)])
+	return sorted(signature)
+
+
+def readSMCVersions(jsonFiles, workers=SMC_LOADER_THREADS):
+	from multiprocessing.pool import ThreadPool
+	pool = ThreadPool(workers)
+
+	try:
+		return dict(pool.map(readSMCVersionFast, jsonFiles))
+	finally:
+		# no join(), the idle (daemon) threads would add a 100 ms poll delay on Python 2.
+		pool.close()
+
+
+def loadSMCVersionTable(jsonsPath, workers=SMC_LOADER_THREADS):
+	jsonFiles = glob.glob(jsonsPath)
+	# the cache is stored next to the SMCJSONs folder (in the expanded package).
+	cacheFile = os.path.join(os.path.dirname(os.path.dirname(jsonsPath)), SMC_VERSIONS_CACHE)
+	signature = getSMCJSONsSignature(jsonFiles)
+
+	try:
+		with open(cacheFile, 'r') as f:
+			cacheData = json.load(f)
+		if cacheData['signature'] == signature:
+			return cacheData['versions']
+	except (IOError, OSError, ValueError, KeyError):
+		pass
+
+	versions = readSMCVersions(jsonFiles, workers)
+
+	try:
+		temporaryFile = cacheFile + ".%d" % os.getpid()
+		with open(temporaryFile, 'w') as f:
+			json.dump({'signature': signature, 'versions': versions}, f)
+		os.rename(temporaryFile, cacheFile)
+	except (IOError, OSError):
+		pass
+
+	return versions
+
+
+def findPayloadFiles(directories):
+	firmwareFiles = []
+	jsonFiles = []
+
+	for directory in directories:
+		for root, dirs, files in os.walk(directory):
+			for filename in sorted(files):
+				path = os.path.join(root, filename)
+				if filename.endswith('.scap') or filename.endswith('.fd'):
+					firmwareFiles.append(path)
+				elif filename.endswith('.json') and basename(root) == SMC_JSONS_FOLDER:
+					jsonFiles.append(path)
+
+	return (firmwareFiles, jsonFiles)
+
+
+def scanPayloadFile(path):
+	# runs in a worker process, so errors are returned and not raised.
+	try:
+		if path.endswith('.json'):
+			boardID, smcVersion = readSMCVersionFast(path)
+			return [(boardID, getModelByBoardID(boardID), 'smc', smcVersion, path)]
+		records = []
+		for boardID, modelID, biosID in scanFirmwareFile(path):
+			records.append((boardID, modelID, 'efi', getBiosIDString(biosID), path))
+		return records
+	except (IOError, ValueError, KeyError) as error:
+		print("ERROR: scan of %s failed with %s." % (path, error), file=sys.stderr)
+		return []
+
+
+def scanPayloads(directories, boardIDs=None, workers=None):
+	from multiprocessing import Pool
+	firmwareFiles, jsonFiles = findPayloadFiles(directories)
+	pool = Pool(workers)
+
+	try:
+		for records in pool.imap(scanPayloadFile, firmwareFiles + jsonFiles, chunksize=4):
+			for record in records:
+				if not boardIDs or record[0] in boardIDs:
+					yield record
+	finally:
+		pool.close()
+		pool.join()
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Scan firmware payloads (*.scap, *.fd and SMCJSONs/*.json) for EFI and SMC versions.')
+	parser.add_argument('-d', dest='directories', action='append', required=True, help='directory to scan (can be used more than once)')
+	parser.add_argument('-b', dest='boardIDs', action='append', default=[], help='board-id (or comma separated board-ids) to report')
+	parser.add_argument('-j', dest='workers', type=int, help='number of worker processes (default: number of CPUs)')
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS, default='json')
+	args = parser.parse_args(argv)
+
+	boardIDs = set()
+	for arg in args.boardIDs:
+		boardIDs.update([boardID for boardID in arg.split(',') if boardID])
+
+	writer = RecordWriter(args.outputFormat, REPORT_FIELDS)
+
+	for boardID, modelID, type, version, path in scanPayloads(args.directories, boardIDs, args.workers):
+		writer.write(boardID=boardID, modelID=modelID, type=type, version=version, file=path)
+
+
+if __name__ == "__main__":
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	main(sys.argv[1:])
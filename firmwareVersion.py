@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+#
+# Script (firmwareVersion.py) to parse and compare SMC and EFI versions (one host or a whole fleet).
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+
+from __future__ import print_function
+
+import re
+import sys
+import csv
+import json
+import signal
+import argparse
+
+from array import array
+from reportWriter import RecordWriter, OUTPUT_FORMATS
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#
+# Python 2 has no 'Q' typecode ('L' is 64 bits wide on 64-bit macOS/Linux).
+#
+try:
+	ARRAY_TYPECODE = array('Q').typecode
+except ValueError:
+	ARRAY_TYPECODE = 'L'
+
+#
+# SMC versions look like 2.37f21 (major.minor, stage letter and build number).
+#
+SMC_VERSION_RE = re.compile(r'^\s*v?(\d+)\.(\d+)([a-z])(\d+)\s*$', re.IGNORECASE)
+#
+# EFI versions (BIOS ID) look like MBP114.88Z.0172.B00.1708311658 (model, OEM, version, build and date).
+#
+EFI_VERSION_RE = re.compile(r'^\s*([A-Za-z]+\d+)\.([0-9A-Za-z]+)\.([0-9A-Fa-f]{4})\.([A-Za-z])(\d+)\.(\d{10})')
+
+REPORT_FIELDS = ['host', 'boardID', 'type', 'version', 'latestVersion', 'needsUpdate']
+
+
+def parseSMCVersion(version):
+	match = SMC_VERSION_RE.match(version)
+	if not match:
+		raise ValueError("invalid SMC version: %r" % version)
+	major, minor, stage, build = match.groups()
+	return (int(major), int(minor), ord(stage.lower()), int(build))
+
+
+def parseEFIVersion(version):
+	match = EFI_VERSION_RE.match(version.replace('\x00', ''))
+	if not match:
+		raise ValueError("invalid EFI version: %r" % version)
+	model, oem, number, buildType, build, date = match.groups()
+	year, month, day, hour, minute = [int(date[i:i+2]) for i in range(0, 10, 2)]
+	# the build date comes first, that is what efiver.py used to compare.
+	return ((year, month, day, hour, minute), int(number, 16), ord(buildType.upper()), int(build))
+
+
+def encodeSMCVersion(version):
+	major, minor, stage, build = parseSMCVersion(version)
+	return (major << 40) | (minor << 24) | (stage << 16) | build
+
+
+def encodeEFIVersion(version):
+	(year, month, day, hour, minute), number, buildType, build = parseEFIVersion(version)
+	if build > 0xff:
+		raise ValueError("invalid EFI version: %r" % version)
+	date = (year << 20) | (month << 16) | (day << 11) | (hour << 6) | minute
+	return (date << 32) | (number << 16) | (buildType << 8) | build
+
+
+def encodeVersion(type, version):
+	# returns 0 for versions we can't parse (and don't compare).
+	try:
+		if type == 'smc':
+			return encodeSMCVersion(version)
+		return encodeEFIVersion(version)
+	except (ValueError, TypeError, AttributeError):
+		return 0
+
+
+def isNewerSMCVersion(currentVersion, version):
+	return encodeVersion('smc', version) > encodeVersion('smc', currentVersion) > 0
+
+
+def isNewerEFIVersion(currentVersion, version):
+	return encodeVersion('efi', version) > encodeVersion('efi', currentVersion) > 0
+
+
+def compareFleet(inventory, latestVersions):
+	#
+	# inventory is a list of (boardID, type, version) and latestVersions is a
+	# dictionary with (boardID, type) keys. Returns True/False per inventory
+	# item, or None when there is nothing to compare it with.
+	#
+	latestCodes = dict((key, encodeVersion(key[1], version)) for key, version in latestVersions.items())
+	currentArray = array(ARRAY_TYPECODE, [encodeVersion(type, version) for boardID, type, version in inventory])
+	latestArray = array(ARRAY_TYPECODE, [latestCodes.get((boardID, type), 0) for boardID, type, version in inventory])
+
+	if numpy is not None:
+		dtype = 'u%d' % currentArray.itemsize
+		current = numpy.frombuffer(currentArray, dtype=dtype)
+		latest = numpy.frombuffer(latestArray, dtype=dtype)
+		needsUpdate = (current < latest).tolist()
+		comparable = ((current > 0) & (latest > 0)).tolist()
+	else:
+		needsUpdate = [current < latest for current, latest in zip(currentArray, latestArray)]
+		comparable = [current > 0 and latest > 0 for current, latest in zip(currentArray, latestArray)]
+
+	return [result if known else None for result, known in zip(needsUpdate, comparable)]
+
+
+def readRecords(path):
+	# NDJSON (like the output of firmwareScan.py) or CSV with a header line.
+	with open(path, 'r') as f:
+		data = f.read()
+
+	if data.lstrip().startswith('{'):
+		return [json.loads(line) for line in data.splitlines() if line.strip()]
+	return list(csv.DictReader(data.splitlines()))
+
+
+def getLatestVersions(records):
+	latestVersions = {}
+
+	for record in records:
+		key = (record['boardID'], record.get('type', 'efi'))
+		if encodeVersion(key[1], record['version']) > encodeVersion(key[1], latestVersions.get(key)):
+			latestVersions[key] = record['version']
+
+	return latestVersions
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Check a fleet inventory (host, boardID, type, version) against the latest known versions.')
+	parser.add_argument('-i', dest='inventory', required=True, help='inventory (NDJSON or CSV)')
+	parser.add_argument('-l', dest='latest', required=True, help='latest versions (NDJSON or CSV, like the output of firmwareScan.py)')
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS, default='json')
+	parser.add_argument('-a', dest='all', action='store_true', help='also report hosts that are up-to-date')
+	args = parser.parse_args(argv)
+
+	latestVersions = getLatestVersions(readRecords(args.latest))
+	records = readRecords(args.inventory)
+	inventory = [(record['boardID'], record.get('type', 'efi'), record['version']) for record in records]
+	results = compareFleet(inventory, latestVersions)
+	writer = RecordWriter(args.outputFormat, REPORT_FIELDS)
+
+	for record, (boardID, type, version), needsUpdate in zip(records, inventory, results):
+		if needsUpdate or args.all:
+			writer.write(host=record.get('host', ''), boardID=boardID, type=type, version=version, latestVersion=latestVersions.get((boardID, type)), needsUpdate=needsUpdate)
+
+
+if __name__ == "__main__":
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	main(sys.argv[1:])
@@ -3,43 +3,330 @@
 #
 # Script (globResourceFiles.py) to get a list with boardID's and matching modelID from resource files.
 #
-# Version 1.1 - Copyright (c) 2016-2017 by Pike R. Alpha (PikeRAlpha@yahoo.com)
+# Version 1.2 - Copyright (c) 2016-2018 by Pike R. Alpha (PikeRAlpha@yahoo.com)
 #
 # Updates:
 #          - improved output (Pike R. Alpha, August 2017)
+#          - one modelPropertiesForBoardIDs_ call for all board-id's (cached per OS build).
+#          - option -m added to write a merged boardIDModelIDs.json
+#          - options -l and -q added to query the power-management data of all plists (parallel, cached).
+#          - data (like the FrequencyVectors) is now stored as its length, a SHA-1 and an excerpt (the first 32-bit values).
 #
 
+from __future__ import print_function
+
 import os
+import sys
 import glob
-import objc
+import json
+import struct
+import hashlib
+import argparse
+import plistlib
 
 from os.path import basename
 from os.path import splitext
+from boardIDRegistry import loadBoardIDModelIDs, REGISTRY_FILE
+
+RESOURCE_FILES = "/System/Library/Extensions/IOPlatformPluginFamily.kext/Contents/PlugIns/X86PlatformPlugin.kext/Contents/Resources/*.plist"
+SERVER_INFORMATION_FRAMEWORK = "/System/Library/PrivateFrameworks/ServerInformation.framework"
+SYSTEM_VERSION_PLIST = "/System/Library/CoreServices/SystemVersion.plist"
+CACHE_DIRECTORY = os.path.expanduser("~/Library/Caches/globResourceFiles")
+PROFILES_CACHE_VERSION = 3
+#
+# Number of 32-bit values (or bytes) of a data blob that are kept as its excerpt.
+#
+DATA_EXCERPT_LENGTH = 8
+
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
 
 class attrdict(dict):
     __getattr__ = dict.__getitem__
     __setattr__ = dict.__setitem__
 
-resourceFiles = glob.glob("/System/Library/Extensions/IOPlatformPluginFamily.kext/Contents/PlugIns/X86PlatformPlugin.kext/Contents/Resources/*.plist")
+ServerInformation = None
+
+
+def getServerInformation():
+    global ServerInformation
+    if ServerInformation is None:
+        import objc
+        ServerInformation = attrdict()
+        objc.loadBundle('ServerInformation', ServerInformation, bundle_path=SERVER_INFORMATION_FRAMEWORK)
+    return ServerInformation
+
+
+def getOSBuild():
+    try:
+        return plistlib.readPlist(SYSTEM_VERSION_PLIST)['ProductBuildVersion']
+    except (IOError, OSError, KeyError):
+        return 'Unknown'
+
+
+def getResourceBoardIDs(resourceFiles):
+    return sorted(splitext(basename(resourceFile))[0] for resourceFile in resourceFiles)
+
+
+def isMatchingResult(boardIDs, modelIDs):
+    # an (NS)Set has no order (and drops duplicate models), so only an array with one result per board-id will do.
+    if not (isinstance(modelIDs, (list, tuple)) or hasattr(modelIDs, 'objectAtIndex_')):
+        return False
+    if len(modelIDs) != len(boardIDs):
+        return False
+    # unknown board-id's come back as (a string with) the board-id, and never as another board-id.
+    for boardID, modelID in zip(boardIDs, modelIDs):
+        if 'Mac-' in str(modelID) and boardID not in str(modelID):
+            return False
+    return True
+
+
+def lookupModelID(modelInfo, boardID):
+    modelIDs = sorted(str(modelID) for modelID in modelInfo.modelPropertiesForBoardIDs_([boardID]))
+    if modelIDs:
+        return modelIDs[0]
+    return boardID
+
+
+def lookupModelIDs(boardIDs):
+    # one trip over the bridge, and one call per board-id when the result can't be matched with the board-id's.
+    modelInfo = getServerInformation().ServerInformationComputerModelInfo
+    modelIDs = modelInfo.modelPropertiesForBoardIDs_(boardIDs)
+
+    if isMatchingResult(boardIDs, modelIDs):
+        return dict((boardID, str(modelID)) for boardID, modelID in zip(boardIDs, modelIDs))
+    return dict((boardID, lookupModelID(modelInfo, boardID)) for boardID in boardIDs)
+
+
+def getCacheFile(osBuild):
+    return os.path.join(CACHE_DIRECTORY, "modelIDs.%s.json" % osBuild)
+
+
+def loadModelIDs(boardIDs, osBuild, refresh=False):
+    cacheFile = getCacheFile(osBuild)
+
+    if not refresh:
+        try:
+            with open(cacheFile, 'r') as f:
+                modelIDs = json.load(f)
+            if sorted(modelIDs) == boardIDs:
+                return modelIDs
+        except (IOError, OSError, ValueError):
+            pass
+
+    modelIDs = lookupModelIDs(boardIDs)
+
+    try:
+        if not os.path.isdir(CACHE_DIRECTORY):
+            os.makedirs(CACHE_DIRECTORY)
+        temporaryFile = cacheFile + ".%d" % os.getpid()
+        with open(temporaryFile, 'w') as f:
+            json.dump(modelIDs, f, indent=1, sort_keys=True)
+        os.rename(temporaryFile, cacheFile)
+    except (IOError, OSError):
+        pass
+
+    return modelIDs
+
+
+def mergeBoardIDModelIDs(boardIDModelIDs, modelIDs):
+    # existing entries stay first (and win), new board-id's are appended.
+    knownBoardIDs = set(boardID for boardID, modelID in boardIDModelIDs)
+    merged = list(boardIDModelIDs)
+
+    for boardID in sorted(modelIDs):
+        if boardID not in knownBoardIDs and boardID not in modelIDs[boardID]:
+            merged.append((boardID, modelIDs[boardID]))
+
+    return merged
+
+
+def writeBoardIDModelIDs(boardIDModelIDs, path):
+    # same layout as boardIDModelIDs.json (one pair per line).
+    lines = [' %s' % json.dumps([boardID, modelID]) for boardID, modelID in boardIDModelIDs]
+    data = '[\n' + ',\n'.join(lines) + '\n]\n'
+
+    if path == '-':
+        sys.stdout.write(data)
+        return
+
+    temporaryFile = path + ".%d" % os.getpid()
+    with open(temporaryFile, 'w') as f:
+        f.write(data)
+    os.rename(temporaryFile, path)
 
-ServerInformation = attrdict()
-ServerInformation_bundle = objc.loadBundle('ServerInformation', ServerInformation, bundle_path='/System/Library/PrivateFrameworks/ServerInformation.framework')
 
-print('-------------------------------------\n%i Resource files (plists) found\n-------------------------------------' % len(resourceFiles))
+def readPlist(path):
+    # plistlib.load (Python 3.4 and later) also reads binary plists.
+    if hasattr(plistlib, 'load'):
+        with open(path, 'rb') as f:
+            return plistlib.load(f)
+    return plistlib.readPlist(path)
 
-unknownBoardIDs = []
 
-for resourceFile in resourceFiles:
+def decodeData(data, count):
+    # the first count little-endian 32-bit values (the layout of the FrequencyVectors), or bytes when the length isn't a multiple of four.
+    if len(data) % 4:
+        return list(bytearray(data[:count]))
+    data = data[:count * 4]
+    return list(struct.unpack('<%dI' % (len(data) // 4), data))
+
+
+def flattenPlist(value, path, summary):
+    # scalars are stored as is, data as an excerpt (with its length and SHA-1) and arrays as the number of items.
+    if isinstance(value, dict):
+        for key in value:
+            flattenPlist(value[key], path + [str(key)], summary)
+    elif isinstance(value, list):
+        summary['.'.join(path) + '#count'] = len(value)
+        for index, item in enumerate(value):
+            flattenPlist(item, path + [str(index)], summary)
+    elif isinstance(value, (bool, int, float) + STRING_TYPES):
+        summary['.'.join(path)] = value
+    elif isinstance(value, bytes) or hasattr(value, 'data'):
+        # plistlib.Data (Python 2) or bytes (Python 3), like the FrequencyVectors.
+        data = getattr(value, 'data', value)
+        summary['.'.join(path)] = decodeData(data, DATA_EXCERPT_LENGTH)
+        summary['.'.join(path) + '#bytes'] = len(data)
+        summary['.'.join(path) + '#sha1'] = hashlib.sha1(data).hexdigest()
+    else:
+        summary['.'.join(path)] = str(value)
+
+
+def readResourceFile(resourceFile):
+    # runs in a worker process, so errors are returned and not raised.
     boardID = splitext(basename(resourceFile))[0]
+    summary = {}
+    try:
+        flattenPlist(readPlist(resourceFile), [], summary)
+    except Exception as error:
+        print('ERROR: reading of %s failed with %s.' % (resourceFile, error), file=sys.stderr)
+    return (boardID, summary)
+
+
+def getResourceFilesSignature(resourceFiles):
+    signature = []
+    for resourceFile in resourceFiles:
+        fileInfo = os.stat(resourceFile)
+        signature.append([basename(resourceFile), fileInfo.st_size, int(fileInfo.st_mtime)])
+    return sorted(signature)
+
+
+def buildProfileColumns(summaries):
+    # columnar layout: one list per key (None for board-id's without it).
+    boardIDs = sorted(summaries)
+    columnNames = sorted(set(key for summary in summaries.values() for key in summary))
+    columns = dict((name, [summaries[boardID].get(name) for boardID in boardIDs]) for name in columnNames)
+    return {'boardIDs': boardIDs, 'columns': columns}
+
+
+def readProfiles(resourceFiles, workers=None):
+    from multiprocessing import Pool
+    pool = Pool(workers)
+
+    try:
+        return buildProfileColumns(dict(pool.map(readResourceFile, resourceFiles)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def loadProfiles(resourceFiles, osBuild, workers=None, refresh=False):
+    cacheFile = os.path.join(CACHE_DIRECTORY, "profiles.%s.json" % osBuild)
+    signature = getResourceFilesSignature(resourceFiles)
+
+    if not refresh:
+        try:
+            with open(cacheFile, 'r') as f:
+                cacheData = json.load(f)
+            if cacheData['version'] == PROFILES_CACHE_VERSION and cacheData['signature'] == signature:
+                return cacheData['profiles']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    profiles = readProfiles(resourceFiles, workers)
+
+    try:
+        if not os.path.isdir(CACHE_DIRECTORY):
+            os.makedirs(CACHE_DIRECTORY)
+        temporaryFile = cacheFile + ".%d" % os.getpid()
+        with open(temporaryFile, 'w') as f:
+            json.dump({'version': PROFILES_CACHE_VERSION, 'signature': signature, 'profiles': profiles}, f)
+        os.rename(temporaryFile, cacheFile)
+    except (IOError, OSError):
+        pass
+
+    return profiles
 
-    for modelID in ServerInformation.ServerInformationComputerModelInfo.modelPropertiesForBoardIDs_([boardID]):
+
+def showProfileColumns(profiles, pattern):
+    import fnmatch
+    columns = profiles['columns']
+
+    for name in sorted(columns):
+        if fnmatch.fnmatch(name, pattern):
+            boardCount = len([value for value in columns[name] if value is not None])
+            print('%-64s %3i board-id\'s' % (name, boardCount))
+
+
+def queryProfiles(profiles, modelIDs, names):
+    import fnmatch
+    columns = profiles['columns']
+    selectedNames = [name for name in sorted(columns) if [pattern for pattern in names if fnmatch.fnmatch(name, pattern)]]
+
+    for index, boardID in enumerate(profiles['boardIDs']):
+        values = ['%s=%s' % (name, columns[name][index]) for name in selectedNames if columns[name][index] is not None]
+        if values:
+            print('%s - %s: %s' % (boardID, modelIDs.get(boardID, 'Unknown'), ', '.join(values)))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Show the board-id and model of the X86PlatformPlugin resource files.')
+    parser.add_argument('-f', dest='refresh', action='store_true', help='ignore the cached model and plist data')
+    parser.add_argument('-m', dest='mergedFile', help='write the merged board-id registry to this file (- for stdout)')
+    parser.add_argument('-r', dest='registryFile', default=REGISTRY_FILE, help='board-id registry to merge with (default: %(default)s)')
+    parser.add_argument('-l', dest='columnPattern', nargs='?', const='*', help='list the power-management keys (matching the optional pattern)')
+    parser.add_argument('-q', dest='queryNames', action='append', help='show the value of a power-management key (pattern) for all board-id\'s')
+    parser.add_argument('-j', dest='workers', type=int, help='number of worker processes used to read the plists (default: number of CPUs)')
+    args = parser.parse_args(argv)
+
+    resourceFiles = glob.glob(RESOURCE_FILES)
+    boardIDs = getResourceBoardIDs(resourceFiles)
+    osBuild = getOSBuild()
+
+    if args.columnPattern:
+        showProfileColumns(loadProfiles(resourceFiles, osBuild, args.workers, args.refresh), args.columnPattern)
+        return
+
+    modelIDs = loadModelIDs(boardIDs, osBuild, args.refresh)
+
+    if args.queryNames:
+        queryProfiles(loadProfiles(resourceFiles, osBuild, args.workers, args.refresh), modelIDs, args.queryNames)
+        return
+
+    if args.mergedFile:
+        writeBoardIDModelIDs(mergeBoardIDModelIDs(loadBoardIDModelIDs(args.registryFile), modelIDs), args.mergedFile)
+        return
+
+    print('-------------------------------------\n%i Resource files (plists) found\n-------------------------------------' % len(resourceFiles))
+
+    unknownBoardIDs = []
+
+    for boardID in boardIDs:
+        modelID = modelIDs[boardID]
         if boardID not in modelID:
             print('%s - %s' % (boardID, modelID))
         else:
             unknownBoardIDs.append(boardID)
 
-if len(unknownBoardIDs):
-    print('---------------------------------------')
-    for boardID in unknownBoardIDs:
-        print('-- No match for %s --' % boardID)
-    print('---------------------------------------\n')
+    if len(unknownBoardIDs):
+        print('---------------------------------------')
+        for boardID in unknownBoardIDs:
+            print('-- No match for %s --' % boardID)
+        print('---------------------------------------\n')
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -82,6 +82,20 @@
 #		   - update key and targetPath in getPackages().
 #		   - save files in the directory with the selected key.
 #		   - skip partition selection if there is only one.
+#		   - load Seeding.framework, Foundation and other heavy modules on first use only.
+#		   - importable API (findProduct, fetchPackages and expandPackage) for efiver.py and smcver.py.
+#		   - catalog is fetched and parsed only once per process.
+#		   - retry (and resume) interrupted downloads.
+#		   - options -T <file> and -P <directory> added (stage timing trace and cProfile stats).
+#		   - show total/per-file download rate and ETA, option -S <file> added (progress status file).
+#		   - options -L <rate/schedule> and -G <file> added (download bandwidth cap, shared by all runs using the file).
+#		   - option -A <connections> added (Range segments, number of connections follows the throughput).
+#		   - option -N added (get verified packages from LAN peers first, and share the downloaded ones).
+#		   - product selection moved to selectProducts(), packages staged by seedWatcher.py are not downloaded again.
+#		   - option -s added (search the catalogs of all seed programs, fetched and parsed in parallel).
+#		   - concurrent runs share downloads (per-file lock, <file>.part renamed when complete).
+#		   - failed downloads raise DownloadError (no more sys.exit in the Pool workers).
+#		   - failed catalog and distribution downloads raise DownloadError, products without our language are skipped.
 #
 # License:
 #		   -  BSD 3-Clause License
@@ -123,25 +137,32 @@ import urllib2
 import platform
 import getopt
 import signal
-import objc
+import tracing
+import downloadProgress
+import bandwidthLimiter
+import singleFlight
 
 from os.path import basename
-from Foundation import NSLocale, NSBundle, NSClassFromString
-from multiprocessing import Pool
-from xml.etree import ElementTree
 from numbers import Number
 from subprocess import Popen, PIPE
-from ctypes import CDLL, c_uint, byref
 from datetime import datetime
 
 VERSION = "5.3"
 DISKUTIL = "/usr/sbin/diskutil"
 IATOOL = "Contents/MacOS/InstallAssistant"
 STARTOSINSTALL = "Contents/Resources/startosinstall"
+CATALOG_URL = "https://swscan.apple.com/content/catalogs/others/"
+DEFAULT_TARGET_OS_VERSION = "10.13.3"
+DOWNLOAD_RETRIES = 3
 
 os.environ['__OS_INSTALL'] = "1"
 
-SeedingBundle = NSBundle.bundleWithPath_('/System/Library/PrivateFrameworks/Seeding.framework')
+SEEDING_FRAMEWORK = "/System/Library/PrivateFrameworks/Seeding.framework"
+
+#
+# Seeding.framework functions (loaded on first use by getSeedingFunctions).
+#
+Seeding = None
 
 functions = [
 			 ('_stringForSeedProgram_', '@I'),
@@ -152,8 +173,6 @@ functions = [
 			 ('_createFeedbackAssistantSymlink','@'),
 			 ]
 
-objc.loadBundleFunctions(SeedingBundle, globals(), functions)
-
 #
 # Setup seed program data.
 #
@@ -216,6 +235,56 @@ tmpDirectory="tmp"
 #
 installerPackage="installer.pkg"
 
+#
+# Parsed catalogs (by URL) so that we only fetch/parse them once.
+#
+catalogCache = {}
+
+#
+# Download progress (JSON) is written to this file, when set (option -S).
+#
+progressStatusFile = None
+
+#
+# Download bandwidth cap ([HH:MM-HH:MM=]rate[,...] option -L), and the file used to share it with other runs (option -G).
+#
+downloadLimit = None
+downloadLimitFile = None
+
+#
+# Maximum number of connections for segmented downloads (option -A), None means one process per package.
+#
+adaptiveConnections = None
+
+#
+# Ask LAN peers (peerCache.py) for the packages first, and add the downloaded packages to the index (option -N).
+#
+peerSharing = False
+
+#
+# Search the catalogs of all seed programs (option -s), and the seed programs of each product key.
+#
+searchAllPrograms = False
+productPrograms = {}
+
+
+class attrdict(dict):
+	__getattr__ = dict.__getitem__
+	__setattr__ = dict.__setitem__
+
+
+def getSeedingFunctions():
+	global Seeding
+	# loading Seeding.framework also makes SDSeedProgramManager available.
+	if Seeding is None:
+		import objc
+		from Foundation import NSBundle
+		SeedingBundle = NSBundle.bundleWithPath_(SEEDING_FRAMEWORK)
+		Seeding = attrdict()
+		objc.loadBundleFunctions(SeedingBundle, Seeding, functions)
+	return Seeding
+
+
 def enrollInSeedProgram(targetVolume, targetProductVersion):
 	print "\n[ 1 ] Customer Seed"
 	print "[ 2 ] Developer Seed"
@@ -231,6 +300,8 @@ def enrollInSeedProgram(targetVolume, targetProductVersion):
 		except:
 			sys.stdout.write("\033[F\033[K")
 
+	from Foundation import NSClassFromString
+	getSeedingFunctions()
 	seedProgramManager = NSClassFromString('SDSeedProgramManager')
 	seedProgram = seedProgramManager._stringForSeedProgram_(program)
 	print "Seeding: Enrolling in seed program: %s" % seedProgram
@@ -282,6 +353,7 @@ def getICUName(id):
 
 def selectLanguage(macOSVersion):
 	if macOSVersion > 10.11:
+		from Foundation import NSLocale
 		locale = NSLocale.currentLocale()
 		languageCode = NSLocale.languageCode(locale)
 		id = languageCode
@@ -352,26 +424,38 @@ def getPath(targetVolume, targetPath):
 	return os.path.join("/", targetPath)
 
 
-def downloadDistributionFile(url, targetPath):
-	try:
-		req = urllib2.urlopen(url)
-	except urllib2.URLError:
-		print >> sys.stderr("\nERROR: opening of (%s) failed. Aborting ...\n" % url)
+class DownloadError(Exception):
+	# raised for failed downloads (a sys.exit would end the callers of the API, and can hang p.map in the Pool workers).
+	pass
+
 
+def downloadDistributionFile(url, targetPath):
+	# raises DownloadError when the download failed.
+	import socket
+	import httplib
 	filename = basename(url)
-	filesize = req.info().getheader('Content-Length')
 	distributionFile = os.path.join(targetPath, filename)
 
-	if os.path.exists(distributionFile):
-		os.remove(distributionFile)
-
-	with open(distributionFile, 'w') as file:
-		while True:
-			chunk = req.read(1024)
-			if not chunk:
-				break
-			file.write(chunk)
+	# written to a temporary file and renamed, for concurrent runs.
+	temporaryFile = distributionFile + ".%d" % os.getpid()
 
+	try:
+		with tracing.span('distribution', url=url) as span:
+			req = urllib2.urlopen(url)
+			with open(temporaryFile, 'w') as file:
+				while True:
+					chunk = req.read(1024)
+					if not chunk:
+						break
+					file.write(chunk)
+					span.addBytes(len(chunk))
+	except (urllib2.URLError, socket.error, httplib.HTTPException), error:
+		print >> sys.stderr, ("\nERROR: download of (%s) failed with %s" % (url, error))
+		if os.path.isfile(temporaryFile):
+			os.remove(temporaryFile)
+		raise DownloadError(url)
+
+	os.rename(temporaryFile, distributionFile)
 	return distributionFile
 
 
@@ -408,34 +492,39 @@ def getSeedProgram(targetVolume):
 	return (seedProgram, targetProductVersion)
 
 
-def getCatalogData(targetVolume):
+def getCatalogURL(targetVolume, interactive=True):
 	seedProgram, targetProductVersion = getSeedProgram(targetVolume)
 
-	if seedProgram == None:
+	if seedProgram == None and interactive:
 		print "\nERROR: No .SeedEnrollment.plist found. Initialising ..."
 		enrollInSeedProgram(targetVolume, targetProductVersion)
 		seedProgram, targetProductVersion = getSeedProgram(targetVolume)
 
 	catalog = seedProgramData.get(seedProgram, seedProgramData['Regular'])
-	catalogURL = "https://swscan.apple.com/content/catalogs/others/" + catalog
-	try:
-		catalogReq = urllib2.urlopen(catalogURL)
-	except URLError:
-		print >> sys.stderr, ("\nERROR: opening of (%s) failed. Aborting ...\n" % url)
-		sys.exit(-1)
+	return CATALOG_URL + catalog
 
-	return catalogReq.read()
 
+def getCatalog(catalogURL):
+	# raises DownloadError when the catalog can't be fetched.
+	import socket
+	import httplib
+	if catalogURL not in catalogCache:
+		with tracing.span('catalog', url=catalogURL) as span:
+			try:
+				catalogData = urllib2.urlopen(catalogURL).read()
+			except (urllib2.URLError, socket.error, httplib.HTTPException), error:
+				print >> sys.stderr, ("\nERROR: opening of (%s) failed with %s" % (catalogURL, error))
+				raise DownloadError(catalogURL)
+
+			span.addBytes(len(catalogData))
+			catalogCache[catalogURL] = plistlib.readPlistFromString(catalogData)
+
+	return catalogCache[catalogURL]
 
-def getProduct(productType, macOSVersion, targetVolume, targetPackageName):
+
+def selectProducts(products, productType, macOSVersion):
+	# returns a list with the key and product of the InstallAssistant products, or of the macOS updates for macOSVersion.
 	packageData = []
-	catalogData = getCatalogData(targetVolume)
-	root = plistlib.readPlistFromString(catalogData)
-	products = root['Products']
-	if targetPackageName == "*":
-		print "Searching for macOS: %s" % macOSVersion
-	else:
-		print "Searching for: %s for macOS %s" % (targetPackageName, macOSVersion)
 
 	if productType == "install":
 		for key in products:
@@ -458,28 +547,164 @@ def getProduct(productType, macOSVersion, targetVolume, targetPackageName):
 	return packageData
 
 
+def fetchCatalogData(catalogURL):
+	# runs in a thread, errors are returned as None.
+	with tracing.span('catalog', url=catalogURL) as span:
+		try:
+			catalogData = urllib2.urlopen(catalogURL).read()
+		except urllib2.URLError, error:
+			print >> sys.stderr, ("\nERROR: opening of (%s) failed with %s" % (catalogURL, error))
+			return None
+		span.addBytes(len(catalogData))
+	return catalogData
+
+
+def parseCatalogData(argumentData):
+	# runs in a worker process, only the selected products are sent back.
+	catalogData, productType, macOSVersion = argumentData
+	products = plistlib.readPlistFromString(catalogData)['Products']
+	return selectProducts(products, productType, macOSVersion)
+
+
+def getAllProducts(productType, macOSVersion):
+	# the products of all seed programs, one entry per key (the seed programs are in productPrograms).
+	from multiprocessing import Pool
+	from multiprocessing.pool import ThreadPool
+	programs = sorted(seedProgramData)
+	catalogURLs = [CATALOG_URL + seedProgramData[program] for program in programs]
+
+	threadPool = ThreadPool(len(catalogURLs))
+	catalogData = threadPool.map(fetchCatalogData, catalogURLs)
+	threadPool.close()
+
+	fetchedPrograms = [program for program, data in zip(programs, catalogData) if data]
+	with tracing.span('parse', count=len(fetchedPrograms)):
+		p = Pool(min(len(fetchedPrograms), 4) or 1)
+		selections = p.map(parseCatalogData, [(data, productType, macOSVersion) for data in catalogData if data])
+		p.close()
+
+	packageData = []
+	productPrograms.clear()
+
+	for program, selection in zip(fetchedPrograms, selections):
+		for index in range(0, len(selection), 2):
+			key = selection[index]
+			if key not in productPrograms:
+				productPrograms[key] = []
+				packageData.extend([key, selection[index+1]])
+			productPrograms[key].append(program)
+
+	return packageData
+
+
+def getProduct(productType, macOSVersion, targetVolume, targetPackageName, interactive=True):
+	if targetPackageName == "*":
+		print "Searching for macOS: %s" % macOSVersion
+	else:
+		print "Searching for: %s for macOS %s" % (targetPackageName, macOSVersion)
+
+	if searchAllPrograms:
+		return getAllProducts(productType, macOSVersion)
+
+	root = getCatalog(getCatalogURL(targetVolume, interactive))
+	return selectProducts(root['Products'], productType, macOSVersion)
+
+
+def initDownloadWorker(progressQueue, bucket):
+	downloadProgress.initWorker(progressQueue)
+	bandwidthLimiter.initWorker(bucket)
+
+
+def downloadFile(url, targetFilename, filesize, reporter):
+	import socket
+	import httplib
+	filename = basename(url)
+	retries = 0
+	throttle = bandwidthLimiter.Throttle()
+
+	with tracing.span('download', file=filename) as span, singleFlight.openPartFile(targetFilename, filesize) as file:
+		# bytes of an earlier (interrupted) attempt.
+		reporter.add(file.tell())
+		while True:
+			offset = file.tell()
+			request = urllib2.Request(url)
+			# resume where the previous attempt stopped.
+			if offset:
+				request.add_header('Range', "bytes=%d-" % offset)
+			try:
+				fileReq = urllib2.urlopen(request)
+				if offset and fileReq.getcode() != 206:
+					# no Range support, start over.
+					file.seek(0)
+					file.truncate()
+					reporter.restart()
+				while True:
+					chunk = fileReq.read(4096)
+					if not chunk:
+						break
+					file.write(chunk)
+					reporter.add(len(chunk))
+					throttle.add(len(chunk))
+			except (urllib2.URLError, socket.error, httplib.HTTPException), error:
+				print >> sys.stderr, ("Download of %s interrupted (%s)" % (filename, error))
+
+			if filesize == None or file.tell() >= filesize:
+				span.addBytes(file.tell())
+				span.setArgument('retries', retries)
+				break
+
+			if retries == DOWNLOAD_RETRIES:
+				reporter.fail()
+				raise DownloadError(url)
+			retries+=1
+			reporter.retry()
+
+	os.rename(singleFlight.getPartFilename(targetFilename), targetFilename)
+	return retries
+
+
 def downloadFiles(argumentData):
 	url = argumentData[0]
 	targetFilename = argumentData[1]
-	try:
-		fileReq = urllib2.urlopen(url)
-	except:
-		print >> sys.stderr, ("\nERROR: opening of (%s) failed. Aborting ...\n" % url)
-		sys.exit(-1)
-
 	filename = basename(url)
 	filesize = argumentData[2]
+	retries = 0
+	reporter = downloadProgress.Reporter(filename)
+	# one download per file, also when other runs (installSeed.py, efiver.py or smcver.py) need the same file.
+	lock = singleFlight.FileLock(targetFilename)
 
-	with open(targetFilename, 'wb') as file:
-		while True:
-			chunk = fileReq.read(4096)
-			if not chunk:
-				print "Download of %s finished" % filename
-				break
-			file.write(chunk)
+	if not lock.tryAcquire():
+		print "Waiting for the download of %s (by another process)" % filename
+		if singleFlight.waitForDownload(lock, targetFilename, reporter.add):
+			reporter.restart()
+
+	try:
+		if singleFlight.isComplete(targetFilename, filesize):
+			reporter.add(os.path.getsize(targetFilename))
+		else:
+			retries = downloadFile(url, targetFilename, filesize, reporter)
+	finally:
+		lock.release(singleFlight.isComplete(targetFilename, filesize))
+
+	# the progress monitor shows the finished downloads, when there is one.
+	if downloadProgress.isReporting():
+		reporter.finish()
+	else:
+		print "Download of %s finished" % filename
+	return retries
+
+
+def downloadFallback(argumentData):
+	# for adaptiveDownload.downloadSegments, which returns the failed downloads in its statistics.
+	try:
+		downloadFiles(argumentData)
+		return True
+	except DownloadError:
+		return False
 
 
 def isBetaSeed(distributionFile):
+	from xml.etree import ElementTree
 	tree = ElementTree.parse(distributionFile)
 	root = tree.getroot()
 	localization = root.find('localization')
@@ -499,6 +724,7 @@ def isBetaSeed(distributionFile):
 
 
 def getBuildAndVersion(distributionFile, targetPackageName, unpackFolder):
+	from xml.etree import ElementTree
 	build  = 0
 	version = 0
 	tree = ElementTree.parse(distributionFile)
@@ -566,60 +792,201 @@ def confirmAPFSConversion(targetVolume):
 
 
 def expandPackage(packageName, targetFolder):
+	# returns the target folder, or None when the package wasn't expanded.
 	if os.path.isdir(targetFolder):
 		print "\nError: Given target path already exists!"
 		print "       Please remove it or use a different path!\n\nAborting ...\n"
-		sys.exit(17)
+		return None
 	print "Expanding %s to %s" %(basename(packageName), targetFolder)
-	subprocess.call(['pkgutil', '--expand', packageName, targetFolder])
-	sys.exit(0)
+	with tracing.span('pkgutil --expand', package=basename(packageName)):
+		if subprocess.call(['pkgutil', '--expand', packageName, targetFolder]) != 0:
+			return None
+	return targetFolder
 
 
-def getPackages(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder, askForConfirmation, languageSelector):
-	if targetVolume == '':
-		targetVolume = getTargetVolume()
-
-	data = getProduct(productType, macOSVersion, targetVolume, targetPackageName)
-
-	if data == None:
-		print >> sys.stderr, ("\nERROR: target macOS version (%s) not found. Aborting ..." % macOSVersion)
-		print >> sys.stderr, ("       - you may need to use the -m <version> argument\n")
-		sys.exit(1)
+def findProducts(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder, languageSelector, interactive=True):
+	# raises DownloadError when the catalog or a distribution file can't be fetched.
+	products = []
+	data = getProduct(productType, macOSVersion, targetVolume, targetPackageName, interactive)
 
-	list = []
-	buildIDs = []
-	item = 0
-	index = 0
-	indent = ' - '
-	selectorText = ''
-	currentBuildID = getSystemVersionPlist(targetVolume, 'ProductBuildVersion')
-	packageCount = (len(data)/2)
-
-	while(index < (packageCount*2)):
+	for index in range(0, len(data), 2):
 		key = data[index]
 		product = data[index+1]
-		index+=2
 		targetPath = os.path.join(targetVolume, tmpDirectory, key)
 
 		if not os.path.isdir(targetPath):
 			os.makedirs(targetPath)
 
-		distributions = product['Distributions']
+		distributionURL = product.get('Distributions', {}).get(languageSelector)
 
-		if distributions[languageSelector]:
-			distributionURL = distributions.get(languageSelector)
-			distributionFile = downloadDistributionFile(distributionURL, targetPath)
+		if distributionURL == None:
+			print >> sys.stderr, ("\nWarning: %s has no %s distribution (skipped)." % (key, languageSelector))
+			continue
 
+		distributionFile = downloadDistributionFile(distributionURL, targetPath)
 		seedVersion, seedBuildID = getBuildAndVersion(distributionFile, targetPackageName, unpackFolder)
 
 		if productType == 'update' and seedVersion == 0:
 			seedVersion = macOSVersion
 
 		if seedVersion >= macOSVersion:
-			buildIDs.append(seedBuildID)
-		else:
-			continue
+			products.append((key, product, distributionFile, seedVersion, seedBuildID))
+
+	return products
+
+
+def findProduct(productType, macOSVersion, targetPackageName='*', targetVolume='/', unpackFolder='', languageSelector=None):
+	# non-interactive: returns the product with the highest build (or None), and raises DownloadError like findProducts.
+	if languageSelector == None:
+		languageSelector = selectLanguage(getOSVersion())
+
+	products = findProducts(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder, languageSelector, False)
+
+	if len(products) == 0:
+		return None
+
+	return max(products, key=lambda product: product[4])
 
+
+def fetchPackages(key, product, targetPackageName, targetVolume):
+	# returns the filenames of the downloaded packages, and raises DownloadError when a download failed.
+	list = []
+	catalogPackages = {}
+	targetPath = os.path.join(targetVolume, tmpDirectory, key)
+
+	for package in product['Packages']:
+		url = package.get('URL')
+		filename = basename(url)
+		targetFilename = os.path.join(targetPath, filename)
+
+		if filename == targetPackageName or targetPackageName == "*":
+			filesize = package.get('Size')
+			args = [url, targetFilename, filesize]
+			list.append(args)
+			catalogPackages[url] = package
+
+			if not targetPackageName == "*":
+				break;
+
+	if not len(list) == 0:
+		print "\nQueued Download(s):"
+		for array in list:
+			print "%s [%s bytes]" % (basename(array[1]), array[2])
+		print ''
+		downloads = []
+		peerPackages = []
+
+		for array in list:
+			# complete files (staged by seedWatcher.py or an earlier run) are used as is.
+			if array[2] and os.path.isfile(array[1]) and os.path.getsize(array[1]) == array[2]:
+				print "Found %s (already downloaded)" % basename(array[1])
+			else:
+				downloads.append(array)
+
+		if peerSharing:
+			# verified copies from LAN peers, everything else is downloaded from Apple.
+			import peerCache
+			with tracing.span('peers', count=len(downloads)):
+				missing = downloads
+				downloads = []
+				for array in missing:
+					sha256 = peerCache.fetchFromPeers(array[0], array[1], array[2], catalogPackages[array[0]])
+					if sha256:
+						peerPackages.append((array[0], array[1], catalogPackages[array[0]], sha256))
+					else:
+						downloads.append(array)
+
+		if len(downloads):
+			from multiprocessing import Pool
+			files = [(basename(array[1]), array[2]) for array in downloads]
+			bucket = None
+			if downloadLimit:
+				bucket = bandwidthLimiter.createBucket(downloadLimit, downloadLimitFile)
+			with tracing.span('packages', count=len(downloads)) as span, downloadProgress.DownloadProgress(files, sys.stdout, progressStatusFile) as progress:
+				if adaptiveConnections:
+					# the segments are downloaded by threads of this process.
+					import adaptiveDownload
+					initDownloadWorker(progress.queue, bucket)
+					statistics = adaptiveDownload.downloadSegments(downloads, adaptiveConnections, fallback=downloadFallback)
+					initDownloadWorker(None, None)
+					span.setArgument('connections', statistics['connections'])
+					failedURLs = statistics['errors']
+				else:
+					# the workers report their byte counts to the queue of the progress monitor (and share the bucket).
+					p = Pool(initializer=initDownloadWorker, initargs=(progress.queue, bucket))
+					results = [p.apply_async(downloadFiles, (array,)) for array in downloads]
+					p.close()
+					failedURLs = []
+					# not p.map, which raises on the first error, while the other downloads are still running.
+					for array, result in zip(downloads, results):
+						try:
+							result.get()
+						except DownloadError:
+							failedURLs.append(array[0])
+				span.addBytes(sum([array[2] or 0 for array in downloads]))
+
+			if len(failedURLs):
+				raise DownloadError(failedURLs[0])
+
+		if peerSharing:
+			peerCache.addPackages(os.path.join(targetVolume, tmpDirectory), peerPackages + [(array[0], array[1], catalogPackages[array[0]]) for array in list])
+	else:
+		if targetPackageName != "*":
+			print "\nWarning: target package > %s < not found!" % targetPackageName
+
+	return [array[1] for array in list]
+
+
+def fetchAndExpandPackage(productType, macOSVersion, targetPackageName, unpackFolder, targetVolume='/'):
+	# what 'installSeed.py -a <type> -f <package> -t / -c 0 -u <folder>' does, but without the exit.
+	try:
+		match = findProduct(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder)
+	except DownloadError, error:
+		print >> sys.stderr, ("\nERROR: download of (%s) failed.\n" % error)
+		return None
+
+	if match == None:
+		print >> sys.stderr, ("\nERROR: target macOS version (%s) not found." % macOSVersion)
+		return None
+
+	key, product, distributionFile, seedVersion, seedBuildID = match
+	print "\nFound update for macOS %s (%s) with key: %s" % (seedVersion, seedBuildID, key)
+
+	try:
+		packageFiles = fetchPackages(key, product, targetPackageName, targetVolume)
+	except DownloadError, error:
+		print >> sys.stderr, ("\nERROR: download of (%s) failed.\n" % error)
+		return None
+
+	if len(packageFiles) == 0:
+		return None
+
+	return expandPackage(packageFiles[-1], unpackFolder)
+
+
+def getPackages(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder, askForConfirmation, languageSelector):
+	if targetVolume == '':
+		targetVolume = getTargetVolume()
+
+	try:
+		products = findProducts(productType, macOSVersion, targetPackageName, targetVolume, unpackFolder, languageSelector)
+	except DownloadError, error:
+		print >> sys.stderr, ("\nERROR: download of (%s) failed. Aborting ...\n" % error)
+		sys.exit(-1)
+
+	if searchAllPrograms:
+		# newest build first.
+		products.sort(key=lambda product: product[4], reverse=True)
+
+	buildIDs = []
+	item = 0
+	indent = ' - '
+	selectorText = ''
+	currentBuildID = getSystemVersionPlist(targetVolume, 'ProductBuildVersion')
+	packageCount = len(products)
+
+	for key, product, distributionFile, seedVersion, seedBuildID in products:
+		buildIDs.append(seedBuildID)
 		item+=1
 
 		if packageCount > 1:
@@ -628,6 +995,9 @@ def getPackages(productType, macOSVersion, targetPackageName, targetVolume, unpa
 
 		print "\n%sFound update for macOS %s (%s) with key: %s" % (selectorText, seedVersion, seedBuildID, key)
 
+		if key in productPrograms:
+			print "%savailable in: %s" % (indent, ', '.join(productPrograms[key]))
+
 		if currentBuildID == seedBuildID:
 			print "%swarning: seed build version is the same as macOS on this Mac!" % indent
 		elif currentBuildID > seedBuildID:
@@ -670,41 +1040,20 @@ def getPackages(productType, macOSVersion, targetPackageName, targetVolume, unpa
 	if askForConfirmation == True:
 		confirmWithText(confirmationText, True)
 
-	# update key / use key from the selected item.
-	key = data[(number*2)]
-	# update targetPath / use path from the selected item.
-	targetPath = os.path.join(targetVolume, tmpDirectory, key)
-	product = data[((number*2)+1)]
-	packages = product['Packages']
-
-	for package in packages:
-		url = package.get('URL')
-		filename = basename(url)
-		targetFilename = os.path.join(targetPath, filename)
-
-		if filename == targetPackageName or targetPackageName == "*":
-			filesize = package.get('Size')
-			args = [url, targetFilename, filesize]
-			list.append(args)
+	# use key and distribution file from the selected item.
+	key, product, distributionFile, seedVersion, seedBuildID = products[number]
 
-			if not targetPackageName == "*":
-				break;
+	try:
+		packageFiles = fetchPackages(key, product, targetPackageName, targetVolume)
+	except DownloadError, error:
+		print >> sys.stderr, ("\nERROR: download of (%s) failed. Aborting ...\n" % error)
+		sys.exit(-1)
 
-	if not len(list) == 0:
-		print "\nQueued Download(s):"
-		for array in list:
-			print "%s [%s bytes]" % (basename(array[1]), array[2])
-		print ''
-		p = Pool()
-		p.map(downloadFiles, list)
-		p.close()
-	else:
-		if targetPackageName != "*":
-			print "\nWarning: target package > %s < not found!" % targetPackageName
+	if not unpackFolder == '' and len(packageFiles):
+		if expandPackage(packageFiles[-1], unpackFolder) == None:
+			sys.exit(17)
+		sys.exit(0)
 
-	if not unpackFolder == '':
-		expandPackage(targetFilename, unpackFolder)
-	
 	return (key, distributionFile, targetVolume)
 
 
@@ -777,20 +1126,23 @@ def copyFiles(distributionFile, key, targetVolume, applicationPath):
 
 def runInstaller(installerPkg, targetVolume):
 	print "\nRunning installer ..."
-	subprocess.call(['sudo', '/usr/sbin/installer', '-pkg', installerPkg, '-target', targetVolume])
+	with tracing.span('installer', package=basename(installerPkg)):
+		subprocess.call(['sudo', '/usr/sbin/installer', '-pkg', installerPkg, '-target', targetVolume])
 
 
 def installPackage(distributionFile, key, targetVolume):
 	targetPath = os.path.join(targetVolume, tmpDirectory, key)
 	installerPkg = os.path.join(targetPath, installerPackage)
 	print "\nCreating installer.pkg ..."
-	subprocess.call(['sudo', 'productbuild', '--distribution', distributionFile, '--package-path', targetPath, installerPkg])
+	with tracing.span('productbuild'):
+		subprocess.call(['sudo', 'productbuild', '--distribution', distributionFile, '--package-path', targetPath, installerPkg])
 
 	if os.path.exists(installerPkg):
 		runInstaller(installerPkg, targetVolume)
 
 
 def getActiveCSRConfig():
+	from ctypes import CDLL, c_uint, byref
 	libSystem = CDLL('/usr/lib/system/libsystem_kernel.dylib')
 	i = c_uint(0)
 	if libSystem.csr_get_active_config(byref(i)) == 0:
@@ -860,10 +1212,19 @@ def showUsage(error, arg):
 	print "installSeed.py -a install -f <packagename> -t <volume> -u [target path]"
 	print "installSeed.py -a install -f <packagename> -t <volume> -c [0/1] (0 skips confirmation)\n"
 	print "installSeed.py -a install -f <packagename> -t <volume> -c [0/1] (0 skips confirmation) -m [10.13.x]\n"
+	print "installSeed.py [...] -T <trace file> (Chrome trace with the time spent per stage)"
+	print "installSeed.py [...] -P <directory> (cProfile stats per stage)"
+	print "installSeed.py [...] -S <status file> (download progress as JSON, updated every second)"
+	print "installSeed.py [...] -L [HH:MM-HH:MM=]<rate>[,...] (download cap in bytes/s, K/M/G suffix, like 08:00-18:00=2M,20M)"
+	print "installSeed.py [...] -L <rate> -G <file> (one download cap for all runs using this file)"
+	print "installSeed.py [...] -A <connections> (download in segments, with up to this many connections)"
+	print "installSeed.py [...] -N (get packages from LAN peers first, see peerCache.py)"
+	print "installSeed.py [...] -s (search the catalogs of all seed programs, newest build first)\n"
 	sys.exit(2)
 
 
 def main(argv):
+	global progressStatusFile, downloadLimit, downloadLimitFile, adaptiveConnections, peerSharing, searchAllPrograms
 	sys.stdout.write("\x1b[2J\x1b[H")
 	YEAR = datetime.now().year
 	print "----------------------------------------------------------------"
@@ -876,10 +1237,12 @@ def main(argv):
 	unpackFolder = ''
 	macOSVersion = getOSVersion()
 	languageSelector = selectLanguage(macOSVersion)
-	targetOSVersion = '10.13.3'
+	targetOSVersion = DEFAULT_TARGET_OS_VERSION
+	traceFile = None
+	profileDirectory = None
 
 	try:
-		opts, args = getopt.getopt(argv,"h:a:f:t:c:u:m:",["help","action","file","target","confirmation","unpack","mac"])
+		opts, args = getopt.getopt(argv,"h:a:f:t:c:u:m:T:P:S:L:G:A:Ns",["help","action","file","target","confirmation","unpack","mac","trace=","profile=","status=","limit=","shared-limit=","adaptive=","peers","all-programs"])
 	except getopt.GetoptError as error:
 		print str(error)
 		showUsage(True, '')
@@ -905,9 +1268,34 @@ def main(argv):
 				showUsage(True, arg)
 		elif opt == '-m':
 			targetOSVersion = arg
+		elif opt in ('-T', '--trace'):
+			traceFile = arg
+		elif opt in ('-P', '--profile'):
+			profileDirectory = arg
+		elif opt in ('-S', '--status'):
+			progressStatusFile = arg
+		elif opt in ('-L', '--limit'):
+			try:
+				bandwidthLimiter.parseSchedule(arg)
+			except ValueError:
+				showUsage(True, arg)
+			downloadLimit = arg
+		elif opt in ('-G', '--shared-limit'):
+			downloadLimitFile = arg
+		elif opt in ('-A', '--adaptive'):
+			if not arg.isdigit() or int(arg) < 1:
+				showUsage(True, arg)
+			adaptiveConnections = int(arg)
+		elif opt in ('-N', '--peers'):
+			peerSharing = True
+		elif opt in ('-s', '--all-programs'):
+			searchAllPrograms = True
 		else:
 			showUsage(True, arg)
 
+	if traceFile or profileDirectory:
+		tracing.enableTracing(traceFile, profileDirectory)
+
 	key, distributionFile, targetVolume = getPackages(action, targetOSVersion, target, volume, unpackFolder, confirm, languageSelector)
 
  	if key == "":
@@ -922,7 +1310,8 @@ def main(argv):
 
 		if action == "install" and target == "*":
 			installPackage(distributionFile, key, targetVolume)
-			copyFiles(distributionFile, key, targetVolume, applicationPath)
+			with tracing.span('copyFiles'):
+				copyFiles(distributionFile, key, targetVolume, applicationPath)
 			startOSInstall(targetVolume, applicationPath, macOSVersion)
 		elif action == "update":
 			if confirmWithText("\nDo you want to upgrade now ? ", True):
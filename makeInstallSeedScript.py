@@ -14,13 +14,19 @@
 #          - graceful exit with instructions to install pip/request module.
 #          - now using a generator object to get the buildID.
 #          - use urllib2 instead of requests (thanks to Per Olofsson aka MagerValp).
+#          - template is compiled once (split on its placeholders).
+#          - option -a added to write scripts for all products of all seed programs (in parallel).
+#          - distribution is parsed while it is downloaded (no more /tmp/distribution.xml).
+#          - option -a now adds the product key to the script name (installSeed-<build>-<key>.sh).
 #
 
 import os
+import re
 import sys
 import plistlib
 import fileinput
 import urllib2
+import argparse
 
 from Foundation import NSLocale
 
@@ -39,6 +45,18 @@ gitHubBranch="master"
 #
 gitHubContentURL="https://raw.githubusercontent.com/Piker-Alpha/HandyScripts"
 
+#
+# Template with the key="*", version="*" and salt="*" placeholders.
+#
+templateFileName="installScriptTemplate.sh"
+
+TEMPLATE_PLACEHOLDER_RE = re.compile(r'(key|version|salt)="\*"')
+
+#
+# Number of scripts written at the same time (option -a).
+#
+WRITER_THREADS = 8
+
 #
 # Setup seed program data.
 #
@@ -129,122 +147,259 @@ def downloadTemplate(fileName):
 		file.write(chunk)
 	file.close()
 
-def downloadDistributionFile(product):
+def getDistributionURL(product, languageSelector=None):
 	if 'Distributions' in product:
 		distributions = product['Distributions']
 		
-		languageSelector = selectLanguage()
+		if languageSelector == None:
+			languageSelector = selectLanguage()
 		
 		if distributions[languageSelector]:
-			distributionURL = distributions.get(languageSelector)
-			req = urllib2.urlopen(distributionURL)
-			distributionFile = os.path.join("/tmp", "distribution.xml")
-			file = open(distributionFile, 'w')
-			
-			while True:
-				chunk = req.read(4096)
-				if not chunk:
-					break
-				file.write(chunk)
-			file.close()
+			return distributions.get(languageSelector)
+
+class RecordingReader(object):
+	#
+	# File object wrapper that keeps a copy of the data that passes through it.
+	#
+	def __init__(self, file):
+		self.file = file
+		self.chunks = []
 
-			return distributionURL
+	def read(self, size=-1):
+		chunk = self.file.read(size)
+		self.chunks.append(chunk)
+		return chunk
 
-def getBuildID():
+	def getData(self):
+		return ''.join(self.chunks)
+
+def getBuildID(source):
+	#
+	# Incremental parse of a distribution (file name or file object) that stops at auxinfo/BUILD,
+	# so that we don't have to read (download) the rest of it.
+	#
 	import xml.etree.ElementTree as ET
-	tree = ET.parse("/tmp/distribution.xml")
-	root = tree.getroot()
-	auxinfo = root.find('auxinfo')
-	
-	if auxinfo is not None:
-		auxinfo_iter = auxinfo.iter()
+	depth = 0
+	auxinfoDepth = None
+	foundBuildKey = False
 
-		for element in auxinfo_iter:
-			if element.tag == 'key' and element.text == 'BUILD':
-				try:
-					return auxinfo_iter.next().text
-				except StopIteration:
-					pass
+	for event, element in ET.iterparse(source, events=('start', 'end')):
+		if event == 'start':
+			depth+=1
+			if element.tag == 'auxinfo' and auxinfoDepth == None:
+				auxinfoDepth = depth
+			continue
 
-def writeScript(key, url):
-	url_parts = url.split('/')
-	version = url_parts[5] + '/' + url_parts[6]
-	salt = url_parts[8]
-	buildID = getBuildID() or ""
-	scriptName = "installSeed-" + buildID + ".sh"
-	templateFileName = "installScriptTemplate.sh"
-	
+		depth-=1
+
+		if auxinfoDepth == None:
+			continue
+		elif depth < auxinfoDepth:
+			# end of auxinfo (without a BUILD key).
+			return None
+		elif foundBuildKey:
+			return element.text
+		elif element.tag == 'key' and element.text == 'BUILD':
+			foundBuildKey = True
+
+def getDistributionBuildID(distributionURL, keepData=False):
+	#
+	# Returns the BUILD and, when keepData is set, the (complete) distribution data.
+	#
+	req = urllib2.urlopen(distributionURL)
+
+	try:
+		reader = RecordingReader(req)
+		buildID = getBuildID(reader)
+
+		if not keepData:
+			return (buildID, None)
+
+		reader.chunks.append(req.read())
+		return (buildID, reader.getData())
+	finally:
+		req.close()
+
+def compileTemplate(templateData):
+	#
+	# Split the template once, so that rendering is a single join (literal text on the even,
+	# placeholder names on the odd indexes).
+	#
+	return TEMPLATE_PLACEHOLDER_RE.split(templateData)
+
+def loadTemplate():
 	if not os.path.exists(templateFileName):
 		downloadTemplate(templateFileName)
 
 	with open(templateFileName, "r") as file:
-		filedata = file.read()
-		filedata = filedata.replace("key=\"*\"", "key=\"" + key + "\"")
-		filedata = filedata.replace("version=\"*\"", "version=\"" + version + "\"")
-		filedata = filedata.replace("salt=\"*\"", "salt=\"" + salt + "\"")
-		
-		with open(scriptName, 'w') as file:
-			file.write(filedata)
+		return compileTemplate(file.read())
 
-#
-# Read ProductBuildVersion from SystemVersionplist.
-#
-systemVersionPlist = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
-buildID = systemVersionPlist['ProductBuildVersion']
+def renderTemplate(template, values):
+	parts = list(template)
 
-#
-# Read ProductVersion from SystemVersionplist.
-#
-if systemVersionPlist['ProductVersion'] == '10.9':
+	for index in range(1, len(parts), 2):
+		parts[index] = parts[index] + "=\"" + values[parts[index]] + "\""
+	return ''.join(parts)
+
+def writeFileAtomically(fileName, data):
+	temporaryFileName = fileName + ".%d.tmp" % os.getpid()
+
+	with open(temporaryFileName, 'w') as file:
+		file.write(data)
+	os.rename(temporaryFileName, fileName)
+
+def getScriptValues(key, url):
+	url_parts = url.split('/')
+	version = url_parts[5] + '/' + url_parts[6]
+	salt = url_parts[8]
+	return dict(key=key, version=version, salt=salt)
+
+def getScriptName(buildID, key=None):
 	#
-	# Read enrollment plist for 10.9.
+	# installSeed-<build>.sh, and installSeed-<build>-<key>.sh for option -a (products can share a build, or have none).
 	#
-	seedEnrollmentPlist = plistlib.readPlist("/Library/Application Support/App Store/.SeedEnrollment.plist")
-else:
+	if key == None:
+		return "installSeed-" + (buildID or "") + ".sh"
+	elif buildID == None:
+		return "installSeed-" + key + ".sh"
+	return "installSeed-" + buildID + "-" + key + ".sh"
+
+def writeScript(key, url, template=None, buildID=None, withKey=False):
+	if buildID == None:
+		buildID, data = getDistributionBuildID(url)
+	scriptName = getScriptName(buildID, key if withKey else None)
+
+	if template == None:
+		template = loadTemplate()
+
+	writeFileAtomically(scriptName, renderTemplate(template, getScriptValues(key, url)))
+	return scriptName
+
+def getCatalogURL(seedProgram):
 	#
-	# Read enrollment plist for 10.10 and greater.
+	# Get catalog path from seedProgramData.
 	#
-	seedEnrollmentPlist = plistlib.readPlist("/Users/Shared/.SeedEnrollment.plist")
+	catalog = seedProgramData.get(seedProgram, seedProgramData['PublicSeed'])
+	return "https://swscan.apple.com/content/catalogs/others/" + catalog
 
-#
-# Read SeedProgram from enrollment plist.
-#
-seedProgram = seedEnrollmentPlist['SeedProgram']
-print 'Seed Program Enrollment: ' + seedProgram
+def getInstallProducts(catalogURL):
+	#
+	# Get the software update catalog (sucatalog).
+	#
+	catalogReq = urllib2.urlopen(catalogURL)
+	catalogData = catalogReq.read()
+	#
+	# Get root.
+	#
+	root = plistlib.readPlistFromString(catalogData)
+	#
+	# Get available products.
+	#
+	products = root['Products']
+	installProducts = []
+	#
+	# Loop through the product available keys.
+	#
+	for key in products:
+		if 'ExtendedMetaInfo' in products[key]:
+			extendedMetaInfo = products[key]['ExtendedMetaInfo']
+			
+			if 'InstallAssistantPackageIdentifiers' in extendedMetaInfo:
+				IAPackageIDs = extendedMetaInfo['InstallAssistantPackageIdentifiers']
+				
+				if IAPackageIDs['InstallInfo'] == 'com.apple.plist.InstallInfo' and IAPackageIDs['OSInstall'] == 'com.apple.mpkg.OSInstall':
+					installProducts.append((key, products[key]))
 
-#
-# Get catalog path from seedProgramData.
-#
-catalog = seedProgramData.get(seedProgram, seedProgramData['PublicSeed'])
-catalogURL = "https://swscan.apple.com/content/catalogs/others/" + catalog
+	return installProducts
 
-#
-# Get the software update catalog (sucatalog).
-#
-catalogReq = urllib2.urlopen(catalogURL)
-catalogData = catalogReq.read()
+def makeScript(argumentData):
+	# runs in a worker thread (option -a).
+	key, product, languageSelector, template = argumentData
 
-#
-# Get root.
-#
-root = plistlib.readPlistFromString(catalogData)
-#
-# Get available products.
-#
-products = root['Products']
+	try:
+		distributionURL = getDistributionURL(product, languageSelector)
+		if distributionURL == None:
+			return None
+		return writeScript(key, distributionURL, template, withKey=True)
+	except KeyError:
+		# no distribution in our language, the other products still get their script.
+		print >> sys.stderr, ("WARNING: %s has no %s distribution (skipped)." % (key, languageSelector))
+	except (urllib2.URLError, IOError, OSError, SyntaxError), error:
+		# ElementTree.ParseError is a SyntaxError.
+		print >> sys.stderr, ("ERROR: script for %s failed with %s." % (key, error))
 
-#
-# Loop through the product available keys.
-#
-for key in products:
-	if 'ExtendedMetaInfo' in products[key]:
-		extendedMetaInfo = products[key]['ExtendedMetaInfo']
-		
-		if 'InstallAssistantPackageIdentifiers' in extendedMetaInfo:
-			IAPackageIDs = extendedMetaInfo['InstallAssistantPackageIdentifiers']
-			
-			if IAPackageIDs['InstallInfo'] == 'com.apple.plist.InstallInfo' and IAPackageIDs['OSInstall'] == 'com.apple.mpkg.OSInstall':
-				product = products[key]
-				distributionURL = downloadDistributionFile(product)
-				writeScript(key, distributionURL)
-				break
+def makeAllScripts(workers=WRITER_THREADS):
+	from multiprocessing.pool import ThreadPool
+	template = loadTemplate()
+	languageSelector = selectLanguage()
+	argumentData = []
+	seenKeys = set()
+
+	for seedProgram in sorted(seedProgramData):
+		installProducts = getInstallProducts(getCatalogURL(seedProgram))
+		print '%s: %d product(s)' % (seedProgram, len(installProducts))
+		#
+		# Products can be listed in more than one catalog, but we only need one script.
+		#
+		for key, product in installProducts:
+			if key not in seenKeys:
+				seenKeys.add(key)
+				argumentData.append((key, product, languageSelector, template))
+
+	pool = ThreadPool(workers)
+
+	try:
+		scriptNames = pool.map(makeScript, argumentData)
+	finally:
+		pool.close()
+
+	for scriptName in scriptNames:
+		if scriptName:
+			print 'Created: %s' % scriptName
+
+def getSeedProgram():
+	#
+	# Read ProductBuildVersion from SystemVersionplist.
+	#
+	systemVersionPlist = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
+	buildID = systemVersionPlist['ProductBuildVersion']
+
+	#
+	# Read ProductVersion from SystemVersionplist.
+	#
+	if systemVersionPlist['ProductVersion'] == '10.9':
+		#
+		# Read enrollment plist for 10.9.
+		#
+		seedEnrollmentPlist = plistlib.readPlist("/Library/Application Support/App Store/.SeedEnrollment.plist")
+	else:
+		#
+		# Read enrollment plist for 10.10 and greater.
+		#
+		seedEnrollmentPlist = plistlib.readPlist("/Users/Shared/.SeedEnrollment.plist")
+
+	#
+	# Read SeedProgram from enrollment plist.
+	#
+	return seedEnrollmentPlist['SeedProgram']
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Create installSeed-<build>.sh script(s) for the latest seed.')
+	parser.add_argument('-a', dest='all', action='store_true', help='create scripts for all products of all seed programs')
+	parser.add_argument('-j', dest='workers', type=int, default=WRITER_THREADS, help='number of scripts written at the same time (default: %(default)s)')
+	args = parser.parse_args(argv)
+
+	if args.all:
+		makeAllScripts(args.workers)
+		return
+
+	seedProgram = getSeedProgram()
+	print 'Seed Program Enrollment: ' + seedProgram
+
+	for key, product in getInstallProducts(getCatalogURL(seedProgram)):
+		distributionURL = getDistributionURL(product)
+		writeScript(key, distributionURL)
+		break
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+
+#
+# Script (pbzx.py) to read pbzx compressed payloads and extract selected files from them.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version (filtered extraction straight from the cpio stream).
+#		   - decompress chunks in a thread pool (lzma releases the GIL).
+#		   - the cpio fallback (without lzma) refuses payloads with uncompressed chunks.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import struct
+import shutil
+import fnmatch
+import tempfile
+import argparse
+import subprocess
+
+from os.path import basename, splitext
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+try:
+	import lzma
+except ImportError:
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
+PBZX_MAGIC = b"pbzx"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+CPIO_ODC_MAGIC = b"070707"
+CPIO_NEWC_MAGIC = b"070701"
+CPIO_CRC_MAGIC = b"070702"
+CPIO_TRAILER = "TRAILER!!!"
+CPIO_TYPE_MASK = 0o170000
+CPIO_TYPE_REGULAR = 0o100000
+
+COPY_CHUNK_SIZE = 1024 * 1024
+#
+# Default pbzx chunk size (used when the header doesn't tell us) and the
+# default limit for compressed plus decompressed chunks that are in flight.
+#
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 512 * 1024 * 1024
+
+
+def readChunks(payloadPath):
+	with open(payloadPath, 'rb') as sourceFile:
+		# Payload Binary ZX magic found?
+		if sourceFile.read(4) != PBZX_MAGIC:
+			raise IOError("%s is not a pbzx payload" % payloadPath)
+		flags = struct.unpack('>Q', sourceFile.read(8))[0]
+		# bit 24 is set as long as there are more chunks.
+		while flags & (1 << 24):
+			header = sourceFile.read(16)
+			if len(header) < 16:
+				break
+			flags, length = struct.unpack('>QQ', header)
+			data = sourceFile.read(length)
+			if len(data) != length:
+				raise IOError("%s is truncated" % payloadPath)
+			yield data
+
+
+def decompressChunk(data):
+	# chunks that didn't compress well are stored as is.
+	if not data.startswith(XZ_MAGIC):
+		return data
+	return lzma.decompress(data)
+
+
+def readChunkSize(payloadPath):
+	with open(payloadPath, 'rb') as sourceFile:
+		if sourceFile.read(4) != PBZX_MAGIC:
+			raise IOError("%s is not a pbzx payload" % payloadPath)
+		# the header holds the (decompressed) chunk size, 0x1000000 in Apple's payloads.
+		chunkSize = struct.unpack('>Q', sourceFile.read(8))[0]
+	return chunkSize or DEFAULT_CHUNK_SIZE
+
+
+def getMaxPendingChunks(chunkSize, workers, memoryLimit):
+	# each pending chunk holds its compressed and its decompressed data.
+	maxPending = memoryLimit // (2 * chunkSize)
+	return max(1, min(maxPending, workers * 2))
+
+
+def readPayload(payloadPath, workers=None, memoryLimit=DEFAULT_MEMORY_LIMIT):
+	if workers is None:
+		workers = cpu_count()
+
+	if workers < 2:
+		for data in readChunks(payloadPath):
+			yield decompressChunk(data)
+		return
+
+	maxPending = getMaxPendingChunks(readChunkSize(payloadPath), workers, memoryLimit)
+	pool = ThreadPool(workers)
+	# chunks are handed out in order, and the results are collected in that same
+	# order, so the deque is our (bounded) reorder buffer.
+	pending = deque()
+
+	try:
+		for data in readChunks(payloadPath):
+			pending.append(pool.apply_async(decompressChunk, (data,)))
+			if len(pending) >= maxPending:
+				yield pending.popleft().get()
+		while pending:
+			yield pending.popleft().get()
+	finally:
+		pool.terminate()
+
+
+class StreamReader(object):
+	def __init__(self, chunks):
+		self.chunks = iter(chunks)
+		self.buffer = b""
+		self.offset = 0
+		self.position = 0
+
+	def fill(self, size):
+		while (len(self.buffer) - self.offset) < size:
+			try:
+				chunk = next(self.chunks)
+			except StopIteration:
+				return False
+			self.buffer = self.buffer[self.offset:] + chunk
+			self.offset = 0
+		return True
+
+	def read(self, size):
+		if not self.fill(size):
+			size = len(self.buffer) - self.offset
+		data = self.buffer[self.offset:self.offset+size]
+		self.offset += size
+		self.position += size
+		return data
+
+	def skip(self, size):
+		# chunks are taken as the new buffer (not appended), so skipped data isn't copied.
+		while size > 0:
+			available = len(self.buffer) - self.offset
+			if available == 0:
+				try:
+					self.buffer = next(self.chunks)
+				except StopIteration:
+					return
+				self.offset = 0
+				continue
+			step = min(size, available)
+			self.offset += step
+			self.position += step
+			size -= step
+
+	def copy(self, size, targetFile):
+		while size > 0:
+			data = self.read(min(size, COPY_CHUNK_SIZE))
+			if not data:
+				raise IOError("unexpected end of cpio archive")
+			targetFile.write(data)
+			size -= len(data)
+
+
+def readCpioHeader(reader):
+	magic = reader.read(6)
+
+	if magic == CPIO_ODC_MAGIC:
+		header = reader.read(70)
+		mode = int(header[12:18], 8)
+		nameSize = int(header[53:59], 8)
+		fileSize = int(header[59:70], 8)
+		name = reader.read(nameSize)
+		padding = 0
+	elif magic in (CPIO_NEWC_MAGIC, CPIO_CRC_MAGIC):
+		header = reader.read(104)
+		mode = int(header[8:16], 16)
+		fileSize = int(header[48:56], 16)
+		nameSize = int(header[88:96], 16)
+		name = reader.read(nameSize)
+		# name and data are padded to a multiple of four bytes.
+		reader.skip((4 - ((110 + nameSize) % 4)) % 4)
+		padding = (4 - (fileSize % 4)) % 4
+	else:
+		raise IOError("unsupported cpio header (%r)" % magic)
+
+	name = name.rstrip(b"\x00").decode('utf-8')
+	return (name, mode, fileSize, padding)
+
+
+def matchesPattern(name, patterns):
+	name = name[2:] if name.startswith('./') else name
+	for pattern in patterns:
+		if fnmatch.fnmatchcase(name, pattern):
+			return True
+	return False
+
+
+def getTargetFilename(targetDirectory, name, extractedFiles):
+	# files are extracted without their directory, so a second file with the same name gets a -2, -3 ... suffix.
+	filename = basename(name)
+	root, extension = splitext(filename)
+	targetFile = os.path.join(targetDirectory, filename)
+	count = 1
+	while targetFile in extractedFiles:
+		count += 1
+		targetFile = os.path.join(targetDirectory, "%s-%d%s" % (root, count, extension))
+	return targetFile
+
+
+def extractFromStream(chunks, patterns, targetDirectory):
+	extractedFiles = []
+	reader = StreamReader(chunks)
+
+	while True:
+		name, mode, fileSize, padding = readCpioHeader(reader)
+		if name == CPIO_TRAILER:
+			break
+		if (mode & CPIO_TYPE_MASK) == CPIO_TYPE_REGULAR and matchesPattern(name, patterns):
+			targetFile = getTargetFilename(targetDirectory, name, extractedFiles)
+			with open(targetFile, 'wb') as f:
+				reader.copy(fileSize, f)
+			extractedFiles.append(targetFile)
+		else:
+			reader.skip(fileSize)
+		reader.skip(padding)
+
+	return extractedFiles
+
+
+def convertPayloadToZX(payloadPath, zxPath):
+	# the XZ chunks are concatenated XZ streams, but a stored (uncompressed) chunk in between would corrupt the file.
+	with open(zxPath, 'wb') as outFile:
+		for data in readChunks(payloadPath):
+			if not data.startswith(XZ_MAGIC):
+				raise IOError("%s has uncompressed chunks, which need the lzma module" % payloadPath)
+			outFile.write(data)
+	# check the footer of the created file.
+	with open(zxPath, 'rb') as checkFile:
+		checkFile.seek(-2, 2)
+		if checkFile.read(2) == b"YZ":
+			return True
+	return False
+
+
+def extractWithCpio(payloadPath, patterns, targetDirectory):
+	extractedFiles = []
+	workDirectory = tempfile.mkdtemp(prefix='pbzx.')
+	zxPath = os.path.join(workDirectory, "payload.zx")
+
+	try:
+		if not convertPayloadToZX(payloadPath, zxPath):
+			return extractedFiles
+		# let cpio skip everything that doesn't match one of the patterns.
+		cmd = ['/usr/bin/cpio', '-i', '-d', '--quiet', '-F', zxPath]
+		cmd.extend(patterns)
+		cmd.extend(['./' + pattern for pattern in patterns])
+		try:
+			subprocess.call(cmd, cwd=workDirectory)
+		except OSError as error:
+			print("ERROR: cpio -i -d -F %s failed with %s." % (zxPath, error), file=sys.stderr)
+			return extractedFiles
+
+		for root, dirs, files in os.walk(workDirectory):
+			for filename in sorted(files):
+				sourceFile = os.path.join(root, filename)
+				if sourceFile != zxPath and matchesPattern(os.path.relpath(sourceFile, workDirectory), patterns):
+					targetFile = getTargetFilename(targetDirectory, filename, extractedFiles)
+					shutil.move(sourceFile, targetFile)
+					extractedFiles.append(targetFile)
+	finally:
+		shutil.rmtree(workDirectory, ignore_errors=True)
+
+	return extractedFiles
+
+
+def extractPayload(payloadPath, patterns, targetDirectory, workers=None, memoryLimit=DEFAULT_MEMORY_LIMIT):
+	if not os.path.isdir(targetDirectory):
+		os.makedirs(targetDirectory)
+	# without lzma we fall back to a filtered cpio run (raises IOError for payloads with uncompressed chunks).
+	if lzma is None:
+		return extractWithCpio(payloadPath, patterns, targetDirectory)
+	chunks = readPayload(payloadPath, workers, memoryLimit)
+	return extractFromStream(chunks, patterns, targetDirectory)
+
+
+def main(argv):
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-j', dest='workers', type=int, help='number of decompression threads (default: number of CPUs)')
+	parser.add_argument('-M', dest='memoryLimit', type=int, default=DEFAULT_MEMORY_LIMIT // (1024 * 1024), help='memory limit in MB for chunks in flight')
+	parser.add_argument('payload')
+	parser.add_argument('targetDirectory')
+	parser.add_argument('patterns', nargs='+')
+	args = parser.parse_args(argv)
+
+	memoryLimit = args.memoryLimit * 1024 * 1024
+
+	for extractedFile in extractPayload(args.payload, args.patterns, args.targetDirectory, args.workers, memoryLimit):
+		print("Extracted: %s" % extractedFile)
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
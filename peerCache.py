@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+
+#
+# Script (peerCache.py) to share downloaded (and verified) packages with other Macs on the same LAN.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#		   - packages are only fetched from peers (and shared) when they match the Digest or chunklist of the catalog.
+#
+# Usage:
+#		   - peerCache.py -d /tmp (serve the packages listed in /tmp/peerCache.json to peers).
+#		   - peerCache.py -d /tmp -a <url> <file> <sha1> (add a downloaded package, with the Digest of the catalog, to the index).
+#		   - peerCache.py -d /tmp -l (show the index).
+#		   - installSeed.py [...] -N (ask peers first, and add the downloaded packages to the index).
+#
+# Notes:
+#		   - there is no central server: a client broadcasts a query (UDP) with the URL and size of the package,
+#		     and every peer with a verified copy replies with the SHA-256 of its copy and the port of its HTTP server.
+#		   - the package is then fetched (with Range resume) from a peer with the most common copy (one vote per host), and
+#		     checked against the size and the SHA-1 Digest (or the IntegrityDataURL chunklist) of the catalog.
+#		   - packages without a Digest or chunklist in the catalog are never fetched from (or shared with) peers.
+#		   - the package is written to <file>.part (under the lock of singleFlight.py), and renamed when it is verified.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import struct
+import socket
+import hashlib
+import binascii
+import argparse
+import threading
+
+import singleFlight
+
+try:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+	from urllib2 import Request, urlopen, URLError
+	from httplib import HTTPException
+except ImportError:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+	from urllib.request import Request, urlopen
+	from urllib.error import URLError
+	from http.client import HTTPException
+
+PROTOCOL_VERSION = 1
+DISCOVERY_PORT = 41953
+BROADCAST_ADDRESS = '<broadcast>'
+QUERY_TIMEOUT = 1.0
+INDEX_FILE = "peerCache.json"
+BLOCK_SIZE = 64 * 1024
+PEER_RETRIES = 2
+#
+# Chunklist (IntegrityDataURL) header: magic, header size, version, chunk method, signature method,
+# chunk count, chunk offset and signature offset, followed by the chunks (size and SHA-256).
+#
+CHUNKLIST_MAGIC = b"CNKL"
+CHUNKLIST_HEADER = "<4sIBBBxQQQ"
+CHUNKLIST_CHUNK = "<I32s"
+
+
+def hashFile(path, algorithm='sha256'):
+	digest = hashlib.new(algorithm)
+	with open(path, 'rb') as f:
+		while True:
+			block = f.read(BLOCK_SIZE * 16)
+			if not block:
+				break
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def parseChunklist(data):
+	# returns (size, sha256) of every chunk (the signature of the chunklist isn't checked).
+	try:
+		magic, headerSize, version, chunkMethod, signatureMethod, chunkCount, chunkOffset, signatureOffset = struct.unpack_from(CHUNKLIST_HEADER, data)
+		if magic != CHUNKLIST_MAGIC:
+			raise ValueError("not a chunklist")
+		chunkSize = struct.calcsize(CHUNKLIST_CHUNK)
+		chunks = []
+		for index in range(chunkCount):
+			size, digest = struct.unpack_from(CHUNKLIST_CHUNK, data, chunkOffset + index * chunkSize)
+			chunks.append((size, binascii.hexlify(digest).decode('ascii')))
+		return chunks
+	except struct.error:
+		raise ValueError("truncated chunklist")
+
+
+def hasIntegrityData(package):
+	return bool(package and (package.get('Digest') or package.get('IntegrityDataURL')))
+
+
+def getIntegrityData(package):
+	# the SHA-1 Digest of the catalog, or the chunks of its IntegrityDataURL (None when the catalog has neither).
+	if not package:
+		return None
+	if package.get('Digest'):
+		return dict(digest=package['Digest'].lower())
+	if package.get('IntegrityDataURL'):
+		try:
+			return dict(chunks=parseChunklist(urlopen(package['IntegrityDataURL'], timeout=30).read()))
+		except (URLError, socket.error, HTTPException, ValueError) as error:
+			print("Chunklist of %s not available (%s)" % (os.path.basename(package.get('URL', '')), error), file=sys.stderr)
+	return None
+
+
+def verifyPackage(path, size, integrityData):
+	# returns the SHA-256 of the file when it matches the size and integrity data of the catalog, or None.
+	if not integrityData or not os.path.isfile(path) or os.path.getsize(path) != size:
+		return None
+
+	sha256 = hashlib.sha256()
+	sha1 = hashlib.sha1()
+	chunks = integrityData.get('chunks')
+
+	if chunks is not None and sum(chunk[0] for chunk in chunks) != size:
+		return None
+
+	with open(path, 'rb') as f:
+		if chunks is not None:
+			for chunkSize, chunkDigest in chunks:
+				data = f.read(chunkSize)
+				if len(data) != chunkSize or hashlib.sha256(data).hexdigest() != chunkDigest:
+					return None
+				sha256.update(data)
+		else:
+			while True:
+				block = f.read(BLOCK_SIZE * 16)
+				if not block:
+					break
+				sha256.update(block)
+				sha1.update(block)
+			if sha1.hexdigest() != integrityData['digest']:
+				return None
+
+	return sha256.hexdigest()
+
+
+class PackageIndex(object):
+	# url -> {path, size, sha256} of the verified packages in (and below) the store directory.
+
+	def __init__(self, directory):
+		self.path = os.path.join(directory, INDEX_FILE)
+		self.packages = {}
+		self.modificationTime = None
+		self.lock = threading.Lock()
+
+	def load(self):
+		# reloaded when installSeed.py (another process) added packages.
+		with self.lock:
+			try:
+				modificationTime = os.stat(self.path).st_mtime
+				if modificationTime != self.modificationTime:
+					with open(self.path, 'r') as f:
+						self.packages = json.load(f)
+					self.modificationTime = modificationTime
+			except (IOError, OSError, ValueError):
+				self.packages = {}
+		return self
+
+	def save(self):
+		temporaryFile = self.path + ".%d" % os.getpid()
+		with open(temporaryFile, 'w') as f:
+			json.dump(self.packages, f, indent=1, sort_keys=True)
+		os.rename(temporaryFile, self.path)
+
+	def add(self, url, path, sha256=None):
+		path = os.path.abspath(path)
+		self.packages[url] = dict(path=path, size=os.path.getsize(path), sha256=sha256 or hashFile(path))
+
+	def lookup(self, url, size):
+		package = self.packages.get(url)
+		# only files that are still there, and have the size of the catalog.
+		if package and package['size'] == size and os.path.isfile(package['path']) and os.path.getsize(package['path']) == size:
+			return package
+		return None
+
+	def lookupHash(self, sha256):
+		for package in self.packages.values():
+			if package['sha256'] == sha256 and os.path.isfile(package['path']):
+				return package
+		return None
+
+
+def addPackages(directory, packages):
+	# packages: list of (url, path, catalog package[, sha256 of a verified copy]), already indexed files (same path and size)
+	# aren't hashed again, and the others are only shared when they match the catalog.
+	index = PackageIndex(directory).load()
+	for package in packages:
+		url, path, catalogPackage = package[:3]
+		if not os.path.isfile(path):
+			continue
+		indexed = index.packages.get(url)
+		if indexed and indexed['path'] == os.path.abspath(path) and indexed['size'] == os.path.getsize(path):
+			continue
+		sha256 = package[3] if len(package) > 3 else None
+		if sha256 is None:
+			sha256 = verifyPackage(path, catalogPackage.get('Size'), getIntegrityData(catalogPackage))
+		if sha256 is None:
+			print("%s is not shared (no match with the catalog)" % os.path.basename(path), file=sys.stderr)
+			continue
+		index.add(url, path, sha256)
+	index.save()
+
+
+class PeerServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, index, port=0):
+		HTTPServer.__init__(self, ('', port), PeerHandler)
+		self.index = index
+
+
+class PeerHandler(BaseHTTPRequestHandler):
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		# /packages/<sha256>, with an optional 'bytes=<first>-[<last>]' Range.
+		parts = self.path.strip('/').split('/')
+		package = None
+		if len(parts) == 2 and parts[0] == 'packages':
+			package = self.server.index.load().lookupHash(parts[1])
+		if package is None:
+			self.send_error(404)
+			return
+
+		size = package['size']
+		first, last = (0, size - 1)
+		rangeValue = self.headers.get('Range')
+
+		if rangeValue and rangeValue.startswith('bytes='):
+			try:
+				start, end = rangeValue[len('bytes='):].split('-', 1)
+				if start:
+					first = int(start)
+					last = min(int(end), size - 1) if end else size - 1
+				else:
+					# suffix range: the last <end> bytes.
+					first = max(size - int(end), 0)
+					last = size - 1
+			except ValueError:
+				# (also) multiple ranges.
+				first, last = (1, 0)
+			if first > last:
+				self.send_error(416)
+				return
+			self.send_response(206)
+			self.send_header('Content-Range', "bytes %d-%d/%d" % (first, last, size))
+		else:
+			self.send_response(200)
+
+		self.send_header('Accept-Ranges', 'bytes')
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(last - first + 1))
+		self.end_headers()
+
+		with open(package['path'], 'rb') as f:
+			f.seek(first)
+			remaining = last - first + 1
+			while remaining > 0:
+				block = f.read(min(BLOCK_SIZE, remaining))
+				if not block:
+					break
+				try:
+					self.wfile.write(block)
+				except socket.error:
+					return
+				remaining -= len(block)
+
+
+class DiscoveryResponder(threading.Thread):
+	# answers queries for the packages in the index, with the port of the HTTP server.
+
+	def __init__(self, index, httpPort, port=DISCOVERY_PORT):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.index = index
+		self.httpPort = httpPort
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		# more than one peer on the same Mac (or test box).
+		if hasattr(socket, 'SO_REUSEPORT'):
+			self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		self.socket.bind(('', port))
+
+	def run(self):
+		while True:
+			data, address = self.socket.recvfrom(65536)
+			try:
+				query = json.loads(data.decode('utf-8'))
+				if query.get('version') != PROTOCOL_VERSION or 'query' not in query:
+					continue
+				package = self.index.load().lookup(query['query'], query['size'])
+			except (ValueError, KeyError, AttributeError):
+				continue
+			if package:
+				reply = dict(version=PROTOCOL_VERSION, url=query['query'], size=package['size'], sha256=package['sha256'], port=self.httpPort)
+				self.socket.sendto(json.dumps(reply).encode('utf-8'), address)
+
+
+def findPeers(url, size, broadcastAddress=None, timeout=QUERY_TIMEOUT, port=DISCOVERY_PORT):
+	# returns (host, port, sha256) of the peers that have the package, fastest reply first.
+	peers = []
+	hosts = set()
+	querySocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	querySocket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+	try:
+		query = dict(version=PROTOCOL_VERSION, query=url, size=size)
+		querySocket.sendto(json.dumps(query).encode('utf-8'), (broadcastAddress or BROADCAST_ADDRESS, port))
+		endTime = time.time() + timeout
+
+		while time.time() < endTime:
+			querySocket.settimeout(max(endTime - time.time(), 0.01))
+			try:
+				data, address = querySocket.recvfrom(65536)
+			except socket.timeout:
+				break
+			try:
+				reply = json.loads(data.decode('utf-8'))
+				# one reply per host, so that a host can't outvote the others.
+				if reply['url'] == url and reply['size'] == size and address[0] not in hosts:
+					hosts.add(address[0])
+					peers.append((address[0], reply['port'], reply['sha256']))
+			except (ValueError, KeyError, TypeError):
+				continue
+	except socket.error as error:
+		print("Peer query for %s failed (%s)" % (os.path.basename(url), error), file=sys.stderr)
+	finally:
+		querySocket.close()
+
+	return peers
+
+
+def fetchFromPeer(host, port, sha256, targetFilename, size, integrityData):
+	# returns the SHA-256 of the file when it is complete and verified (and renamed), the .part file is removed otherwise.
+	peerURL = "http://%s:%d/packages/%s" % (host, port, sha256)
+	partFilename = singleFlight.getPartFilename(targetFilename)
+	retries = 0
+
+	# continues an interrupted download (from Apple or a peer), the result is checked against the catalog anyway.
+	with singleFlight.openPartFile(targetFilename, size) as file:
+		while file.tell() < size and retries <= PEER_RETRIES:
+			request = Request(peerURL)
+			if file.tell():
+				request.add_header('Range', "bytes=%d-" % file.tell())
+			try:
+				response = urlopen(request, timeout=30)
+				if file.tell() and response.getcode() != 206:
+					file.seek(0)
+					file.truncate()
+				while True:
+					block = response.read(BLOCK_SIZE)
+					if not block:
+						break
+					file.write(block)
+			except (URLError, socket.error, HTTPException):
+				pass
+			retries += 1
+
+	verifiedHash = verifyPackage(partFilename, size, integrityData)
+
+	if verifiedHash is None:
+		os.remove(partFilename)
+	else:
+		os.rename(partFilename, targetFilename)
+	return verifiedHash
+
+
+def fetchFromPeers(url, targetFilename, size, catalogPackage, broadcastAddress=None):
+	# returns the SHA-256 of the package when it was fetched from a peer, or None (download it from Apple).
+	if not size or not hasIntegrityData(catalogPackage):
+		# without a Digest (or chunklist) of the catalog, we can't tell a good copy from a tampered one.
+		return None
+
+	peers = findPeers(url, size, broadcastAddress)
+
+	if not peers:
+		return None
+
+	integrityData = getIntegrityData(catalogPackage)
+	lock = singleFlight.FileLock(targetFilename)
+
+	# a file that another run is downloading is left to installSeed.py (which waits for it).
+	if integrityData is None or not lock.tryAcquire():
+		return None
+
+	try:
+		if singleFlight.isComplete(targetFilename, size):
+			return None
+		# the copy that most peers have is tried first.
+		hashCounts = dict((sha256, len([peer for peer in peers if peer[2] == sha256])) for host, port, sha256 in peers)
+		peers.sort(key=lambda peer: -hashCounts[peer[2]])
+
+		for host, port, sha256 in peers:
+			start = time.time()
+			verifiedHash = fetchFromPeer(host, port, sha256, targetFilename, size, integrityData)
+			if verifiedHash:
+				print("Download of %s from peer %s finished (%.1f MB/s)" % (os.path.basename(targetFilename), host,
+					size / (1024 * 1024.0) / max(time.time() - start, 0.001)))
+				return verifiedHash
+			print("Download of %s from peer %s failed verification" % (os.path.basename(targetFilename), host), file=sys.stderr)
+	finally:
+		lock.release(singleFlight.isComplete(targetFilename, size))
+
+	return None
+
+
+def servePeers(directory, discoveryPort=DISCOVERY_PORT, httpPort=0):
+	index = PackageIndex(directory).load()
+	server = PeerServer(index, httpPort)
+	responder = DiscoveryResponder(index, server.server_address[1], discoveryPort)
+	responder.start()
+	print("Sharing %i package(s) from %s on port %d" % (len(index.packages), directory, server.server_address[1]))
+	server.serve_forever()
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Share downloaded installSeed.py packages with other Macs on the LAN.')
+	parser.add_argument('-d', dest='directory', required=True, help='store directory with the index (like /tmp)')
+	parser.add_argument('-a', dest='addPackage', nargs=3, metavar=('URL', 'FILE', 'SHA1'), help='add a package, with the Digest of the catalog, to the index (and quit)')
+	parser.add_argument('-l', dest='showIndex', action='store_true', help='show the index (and quit)')
+	parser.add_argument('-p', dest='httpPort', type=int, default=0, help='port of the HTTP server (default: any)')
+	args = parser.parse_args(argv)
+
+	if args.addPackage:
+		url, path, digest = args.addPackage
+		addPackages(args.directory, [(url, path, dict(URL=url, Size=os.path.isfile(path) and os.path.getsize(path), Digest=digest))])
+	elif args.showIndex:
+		for url, package in sorted(PackageIndex(args.directory).load().packages.items()):
+			print("%s\n  %s [%i bytes] %s" % (url, package['path'], package['size'], package['sha256']))
+	else:
+		servePeers(args.directory, httpPort=args.httpPort)
+
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+#
+# Script (reportWriter.py) to write machine-readable (NDJSON/CSV) records for efiver.py and smcver.py
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+
+import sys
+import csv
+import json
+
+OUTPUT_FORMATS = ['json', 'csv']
+
+
+class RecordWriter(object):
+	def __init__(self, outputFormat, fields, stream=sys.stdout):
+		if outputFormat not in OUTPUT_FORMATS:
+			raise ValueError("unsupported output format: %s" % outputFormat)
+		self.outputFormat = outputFormat
+		self.fields = fields
+		self.stream = stream
+		if outputFormat == 'csv':
+			self.csvWriter = csv.DictWriter(stream, fieldnames=fields)
+			self.csvWriter.writeheader()
+			self.stream.flush()
+
+	def write(self, **record):
+		if self.outputFormat == 'json':
+			# one JSON object per line (NDJSON).
+			self.stream.write(json.dumps(record, sort_keys=True) + '\n')
+		else:
+			self.csvWriter.writerow(record)
+		# flush every record so that readers get it right away.
+		self.stream.flush()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+#
+# Script (seedWatcher.py) to watch the software update catalogs for new seed builds, and to download them during off-hours.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+# Usage:
+#		   - sudo ./seedWatcher.py (checks all catalogs every hour, and downloads new installers between 01:00 and 06:00).
+#		   - sudo ./seedWatcher.py -o -n (check once, without downloads).
+#		   - sudo ./seedWatcher.py -a install -a update -m 10.13.4 -w 22:00-07:00 -L 5M
+#
+# Notes:
+#		   - catalogs are fetched with If-None-Match/If-Modified-Since, an unchanged catalog costs one 304 response.
+#		   - packages are staged in <target>/tmp/<key>, where installSeed.py finds (and uses) them.
+#		   - the products found by the first check of a catalog are only recorded (use -e to stage them).
+#		   - a product is downloaded in a child process (group), which is stopped when the off-hours window ends.
+#		     The .part files are kept, and the next window continues with them.
+#		   - a product is only marked as staged when all its packages are there (with the size of the catalog).
+#		   - a product with a distribution file that can't be fetched isn't recorded, and the next check tries it again.
+#
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import signal
+import urllib2
+import argparse
+import plistlib
+import multiprocessing
+
+from datetime import datetime
+
+import installSeed
+import singleFlight
+
+STATE_FILE = "/Library/Caches/seedWatcher/state.json"
+DEFAULT_INTERVAL = 60
+DEFAULT_WINDOW = "01:00-06:00"
+#
+# Seconds between two checks of the off-hours window, while a product is downloaded.
+#
+WINDOW_CHECK_INTERVAL = 30
+
+
+def log(text):
+	print("%s %s" % (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), text))
+	sys.stdout.flush()
+
+
+def loadState(path):
+	try:
+		with open(path, 'r') as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return {'catalogs': {}, 'products': {}}
+
+
+def saveState(state, path):
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	temporaryFile = path + ".%d" % os.getpid()
+	with open(temporaryFile, 'w') as f:
+		json.dump(state, f, indent=1, sort_keys=True)
+	os.rename(temporaryFile, path)
+
+
+def fetchCatalog(catalogURL, catalogState):
+	# returns the products, or None when the catalog didn't change (or can't be read).
+	request = urllib2.Request(catalogURL)
+
+	if catalogState.get('etag'):
+		request.add_header('If-None-Match', catalogState['etag'])
+	if catalogState.get('lastModified'):
+		request.add_header('If-Modified-Since', catalogState['lastModified'])
+
+	try:
+		response = urllib2.urlopen(request)
+	except urllib2.HTTPError as error:
+		if error.code != 304:
+			log("ERROR: opening of (%s) failed with %s" % (catalogURL, error))
+		return None
+	except urllib2.URLError as error:
+		log("ERROR: opening of (%s) failed with %s" % (catalogURL, error))
+		return None
+
+	catalog = plistlib.readPlistFromString(response.read())
+	catalogState['etag'] = response.info().getheader('ETag')
+	catalogState['lastModified'] = response.info().getheader('Last-Modified')
+	# also used by installSeed.py (in this pass).
+	installSeed.catalogCache[catalogURL] = catalog
+	return catalog.get('Products', {})
+
+
+def getProductBuild(key, product, languageSelector, targetVolume):
+	# the version and build are only in the distribution file (raises installSeed.DownloadError when it can't be fetched).
+	distributions = product.get('Distributions', {})
+	distributionURL = distributions.get(languageSelector) or distributions.get('English')
+
+	if distributionURL == None:
+		return ('Unknown', 'Unknown')
+
+	targetPath = os.path.join(targetVolume, installSeed.tmpDirectory, key)
+	if not os.path.isdir(targetPath):
+		os.makedirs(targetPath)
+	distributionFile = installSeed.downloadDistributionFile(distributionURL, targetPath)
+	return installSeed.getBuildAndVersion(distributionFile, '*', '')
+
+
+def checkCatalogs(state, programs, productTypes, macOSVersion, languageSelector, targetVolume, stageExisting=False):
+	# returns the keys of the products that we haven't seen before.
+	newKeys = []
+
+	for program in programs:
+		catalogURL = installSeed.CATALOG_URL + installSeed.seedProgramData[program]
+		isFirstCheck = program not in state['catalogs']
+		catalogState = state['catalogs'].setdefault(program, {})
+		products = fetchCatalog(catalogURL, catalogState)
+
+		if products == None:
+			continue
+
+		status = 'new'
+		if isFirstCheck and not stageExisting:
+			status = 'existing'
+
+		for productType in productTypes:
+			packageData = installSeed.selectProducts(products, productType, macOSVersion)
+
+			for index in range(0, len(packageData), 2):
+				key = packageData[index]
+				product = packageData[index+1]
+				known = state['products'].get(key)
+
+				if known:
+					if program not in known['programs']:
+						known['programs'].append(program)
+					continue
+
+				try:
+					version, build = getProductBuild(key, product, languageSelector, targetVolume)
+				except (installSeed.DownloadError, SyntaxError) as error:
+					# ElementTree.ParseError is a SyntaxError.
+					log("ERROR: distribution of %s in %s failed (%s), retried in the next check" % (key, program, error))
+					# without the ETag/Last-Modified, so that the next check gets the products again.
+					catalogState.pop('etag', None)
+					catalogState.pop('lastModified', None)
+					continue
+
+				state['products'][key] = dict(type=productType, version=version, build=build, programs=[program],
+					catalogURL=catalogURL, firstSeen=datetime.now().isoformat(), status=status)
+				newKeys.append(key)
+				log("%s %s for macOS %s (%s) with key: %s in %s" % (status.capitalize(), productType, version, build, key, program))
+
+	return newKeys
+
+
+def isInWindow(window, now=None):
+	# HH:MM-HH:MM, can span midnight.
+	start, end = [int(value.split(':')[0]) * 60 + int(value.split(':')[1]) for value in window.split('-')]
+	localTime = time.localtime(now)
+	minute = localTime.tm_hour * 60 + localTime.tm_min
+
+	if start <= end:
+		return start <= minute < end
+	return minute >= start or minute < end
+
+
+def getUnstagedKeys(state):
+	return sorted(key for key in state['products'] if state['products'][key]['status'] == 'new')
+
+
+def getMissingPackages(product, targetPath):
+	# packages that aren't there, or don't have the size of the catalog.
+	missing = []
+	for package in product.get('Packages', []):
+		targetFilename = os.path.join(targetPath, os.path.basename(package.get('URL')))
+		if not singleFlight.isComplete(targetFilename, package.get('Size')):
+			missing.append(os.path.basename(targetFilename))
+	return missing
+
+
+def fetchProductPackages(key, product, targetVolume):
+	# runs in a child process, with its own process group (for the Pool workers of installSeed.py).
+	os.setpgrp()
+	try:
+		installSeed.fetchPackages(key, product, '*', targetVolume)
+	except installSeed.DownloadError as error:
+		log("ERROR: download of (%s) failed" % error)
+		sys.exit(1)
+	except (urllib2.URLError, IOError, OSError) as error:
+		log("ERROR: downloads of %s failed with %s" % (key, error))
+		sys.exit(1)
+
+
+def downloadProduct(key, product, targetVolume, window):
+	# returns False when the downloads failed, or were stopped at the end of the off-hours window.
+	process = multiprocessing.Process(target=fetchProductPackages, args=(key, product, targetVolume))
+	process.start()
+
+	while process.is_alive():
+		process.join(WINDOW_CHECK_INTERVAL)
+		if process.is_alive() and not isInWindow(window):
+			log("Off-hours window (%s) ended, downloads of %s stopped (continued in the next window)" % (window, key))
+			try:
+				os.killpg(process.pid, signal.SIGTERM)
+			except OSError:
+				process.terminate()
+			process.join()
+			return False
+
+	return process.exitcode == 0
+
+
+def stageProducts(state, targetVolume, statePath, window):
+	for key in getUnstagedKeys(state):
+		if not isInWindow(window):
+			break
+
+		productState = state['products'][key]
+		catalogURL = productState['catalogURL']
+
+		if catalogURL not in installSeed.catalogCache:
+			# not fetched in this pass (304), so we need the full catalog.
+			if fetchCatalog(catalogURL, {}) == None:
+				continue
+
+		product = installSeed.catalogCache[catalogURL]['Products'].get(key)
+
+		if product == None:
+			# pulled from the catalog before we got to it.
+			productState['status'] = 'pulled'
+			saveState(state, statePath)
+			continue
+
+		log("Staging macOS %s (%s) with key: %s" % (productState['version'], productState['build'], key))
+		targetPath = os.path.join(targetVolume, installSeed.tmpDirectory, key)
+		downloaded = downloadProduct(key, product, targetVolume, window)
+		missing = getMissingPackages(product, targetPath)
+
+		if not downloaded or missing:
+			# still 'new', so it is tried again in the next pass.
+			productState['failures'] = productState.get('failures', 0) + 1
+			saveState(state, statePath)
+			if missing:
+				log("Staging of %s not complete, missing: %s" % (key, ', '.join(missing)))
+			continue
+
+		productState['status'] = 'staged'
+		productState['staged'] = datetime.now().isoformat()
+		saveState(state, statePath)
+		log("Staged macOS %s (%s) in %s" % (productState['version'], productState['build'], targetPath))
+
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Watch the software update catalogs, and download new seed builds during off-hours.')
+	parser.add_argument('-p', dest='programs', action='append', choices=sorted(installSeed.seedProgramData), help='seed program to watch (default: all)')
+	parser.add_argument('-a', dest='productTypes', action='append', choices=['install', 'update'], help='product type to watch (default: install)')
+	parser.add_argument('-m', dest='macOSVersion', default=installSeed.DEFAULT_TARGET_OS_VERSION, help='macOS version of the updates (default: %(default)s)')
+	parser.add_argument('-t', dest='targetVolume', default='/', help='volume with the tmp directory used by installSeed.py (default: %(default)s)')
+	parser.add_argument('-l', dest='languageSelector', default='English', help='language of the distribution files (default: %(default)s)')
+	parser.add_argument('-i', dest='interval', type=int, default=DEFAULT_INTERVAL, help='minutes between two checks (default: %(default)s)')
+	parser.add_argument('-w', dest='window', default=DEFAULT_WINDOW, help='off-hours window for downloads, HH:MM-HH:MM (default: %(default)s)')
+	parser.add_argument('-L', dest='downloadLimit', help='download cap, like installSeed.py -L')
+	parser.add_argument('-e', dest='stageExisting', action='store_true', help='also stage the products found by the first check')
+	parser.add_argument('-n', dest='noDownloads', action='store_true', help='only report new products')
+	parser.add_argument('-s', dest='statePath', default=STATE_FILE, help='state file (default: %(default)s)')
+	parser.add_argument('-o', dest='once', action='store_true', help='check (and stage) once, and exit')
+	args = parser.parse_args(argv)
+
+	try:
+		isInWindow(args.window)
+	except (ValueError, IndexError):
+		parser.error("invalid window '%s'" % args.window)
+
+	installSeed.downloadLimit = args.downloadLimit
+	programs = args.programs or sorted(installSeed.seedProgramData)
+	productTypes = args.productTypes or ['install']
+	state = loadState(args.statePath)
+
+	while True:
+		# a new pass starts with the catalogs of the server, and not those of the previous pass.
+		installSeed.catalogCache.clear()
+		checkCatalogs(state, programs, productTypes, args.macOSVersion, args.languageSelector, args.targetVolume, args.stageExisting)
+		saveState(state, args.statePath)
+
+		if not args.noDownloads:
+			if isInWindow(args.window):
+				stageProducts(state, args.targetVolume, args.statePath, args.window)
+			elif len(getUnstagedKeys(state)):
+				log("Waiting for the off-hours window (%s) to download" % args.window)
+
+		if args.once:
+			break
+		time.sleep(args.interval * 60)
+
+
+if __name__ == "__main__":
+	# Allows seedWatcher.py to exit quickly when pressing Ctrl+C.
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	main(sys.argv[1:])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#
+# Script (singleFlight.py) with per-file locks, so that concurrent runs (installSeed.py, efiver.py and smcver.py) download a file only once.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+# Usage:
+#		   - lock = FileLock(targetFilename)
+#		   - if not lock.tryAcquire(): waitForDownload(lock, targetFilename) (tails <target>.part until the lock is ours).
+#		   - if not isComplete(targetFilename, size): download to getPartFilename(targetFilename), and rename it.
+#		   - lock.release(isComplete(targetFilename, size))
+#
+# Notes:
+#		   - the lock is an flock on <target>.lock, and it is released by the kernel when the downloading process dies.
+#		   - the file is written to <target>.part and renamed when complete, so <target> is either missing or complete.
+#		   - segmented downloads keep a list of their finished segments in <target>.segments (until the file is complete).
+#
+
+from __future__ import print_function
+
+import os
+import time
+import fcntl
+
+POLL_INTERVAL = 0.5
+
+
+def getLockFilename(targetFilename):
+	return targetFilename + ".lock"
+
+
+def getPartFilename(targetFilename):
+	return targetFilename + ".part"
+
+
+def getSegmentsFilename(targetFilename):
+	# the finished segments of a segmented (adaptiveDownload.py) download.
+	return targetFilename + ".segments"
+
+
+def isComplete(targetFilename, size):
+	if not os.path.isfile(targetFilename):
+		return False
+	return size == None or os.path.getsize(targetFilename) == size
+
+
+def openPartFile(targetFilename, size):
+	# continues where a previous (interrupted) download stopped.
+	partFilename = getPartFilename(targetFilename)
+	segmentsFilename = getSegmentsFilename(targetFilename)
+
+	if os.path.isfile(segmentsFilename):
+		# the .part of a segmented download has holes, so we start over.
+		os.remove(segmentsFilename)
+	elif size and os.path.isfile(partFilename) and os.path.getsize(partFilename) < size:
+		file = open(partFilename, 'r+b')
+		file.seek(0, os.SEEK_END)
+		return file
+
+	return open(partFilename, 'wb')
+
+
+class FileLock(object):
+
+	def __init__(self, targetFilename):
+		self.path = getLockFilename(targetFilename)
+		self.fd = None
+
+	def open(self):
+		if self.fd is None:
+			self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+
+	def tryAcquire(self):
+		self.open()
+		try:
+			fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			return True
+		except (IOError, OSError):
+			return False
+
+	def acquire(self):
+		self.open()
+		fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+	def release(self, remove=False):
+		# the lock file is only removed when the file is complete (nobody will download it again).
+		if self.fd is None:
+			return
+		if remove:
+			try:
+				os.remove(self.path)
+			except OSError:
+				pass
+		fcntl.flock(self.fd, fcntl.LOCK_UN)
+		os.close(self.fd)
+		self.fd = None
+
+
+def waitForDownload(lock, targetFilename, progress=None):
+	# waits for the lock, and reports the growth of the .part file (of the other process) to progress(byteCount).
+	# returns the number of reported bytes.
+	partFilename = getPartFilename(targetFilename)
+	reportedBytes = 0
+
+	while not lock.tryAcquire():
+		try:
+			partSize = os.path.getsize(partFilename)
+		except OSError:
+			partSize = reportedBytes
+		if progress and partSize > reportedBytes:
+			progress(partSize - reportedBytes)
+			reportedBytes = partSize
+		time.sleep(POLL_INTERVAL)
+
+	return reportedBytes
@@ -17,6 +17,15 @@
 #		   - script will now stop/abort when Ctrl+C is pressed.
 #		   - update model information.
 #		   - fixed a typo: missing comma.
+#		   - board-id/model data moved to boardIDRegistry.py (shared with EFIver.py).
+#		   - added support for the -o argument (json/csv records instead of a table).
+#		   - SMC JSON reading moved to firmwareScan.py (can be used without IOKit).
+#		   - SMC versions are now read in parallel and cached next to the SMCJSONs folder.
+#		   - SMC versions are now compared as numbers (2.9f1 is older than 2.37f21).
+#		   - load IOKit on first use only (also fixes the missing urllib2/stat imports).
+#		   - use the installSeed.py API instead of launching it.
+#		   - added support for the -T and -P arguments (stage timing trace and cProfile stats).
+#		   - installSeed.py is no longer downloaded (the API is only in the local copy).
 #
 # License:
 #		   -  BSD 3-Clause License
@@ -50,18 +59,20 @@
 #
 
 import os
-import glob
-import objc
-import json
 import sys
-import subprocess
 import signal
+import argparse
+import tracing
 
-from os.path import basename
-from Foundation import NSBundle
-from os.path import splitext
+from boardIDRegistry import getModelByBoardID
+from firmwareScan import loadSMCVersionTable
+from firmwareVersion import isNewerSMCVersion
+from reportWriter import RecordWriter, OUTPUT_FORMATS
 
-IOKitBundle = NSBundle.bundleWithIdentifier_('com.apple.framework.IOKit')
+#
+# IOKit functions (loaded on first use by getIOKitFunctions).
+#
+IOKit = None
 
 functions = [
 			 ("IOServiceGetMatchingService", b"II@"),
@@ -69,166 +80,69 @@ functions = [
 			 ("IORegistryEntryCreateCFProperty", b"@I@@I")
 			 ]
 
-objc.loadBundleFunctions(IOKitBundle, globals(), functions)
-
 
 VERSION = 1.5
 INSTALLSEED = "installSeed.py"
 FIRMWARE_PATH = "/tmp/FirmwareUpdate"
 JSONS_PATH = "Scripts/Tools/SMCJSONs/*.json"
-
-boardIDModelIDs = [
- ["Mac-F22C8AC8", "MacBook6,1"],
- ["Mac-F22C89C8", "MacBook7,1"],
- ["Mac-BE0E8AC46FE800CC", "MacBook8,1"],
- ["Mac-F305150B0C7DEEEF", "MacBook8,x"],
- ["Mac-9AE82516C7C6B903", "MacBook9,1"],
- ["Mac-EE2EBD4B90B839A8", "MacBook10,1"],
- ["Mac-F22589C8", "MacBookPro6,1"],
- ["Mac-F22586C8", "MacBookPro6,2"],
- ["Mac-F222BEC8", "MacBookPro7,1"],
- ["Mac-94245B3640C91C81", "MacBookPro8,1"],
- ["Mac-94245A3940C91C80", "MacBookPro8,2"],
- ["Mac-942459F5819B171B", "MacBookPro8,3"],
- ["Mac-4B7AC7E43945597E", "MacBookPro9,1"],
- ["Mac-6F01561E16C75D06", "MacBookPro9,2"],
- ["Mac-C3EC7CD22292981F", "MacBookPro10,1"],
- ["Mac-AFD8A9D944EA4843", "MacBookPro10,2"],
- ["Mac-189A3D4F975D5FFC", "MacBookPro11,1"],
- ["Mac-D1FF70AF6D8C849A", "MacBookPro11,x"],
- ["Mac-3CBD00234E554E41", "MacBookPro11,2"],
- ["Mac-2BD1B31983FE1663", "MacBookPro11,3"],
- ["Mac-06F11FD93F0323C5", "MacBookPro11,4"],
- ["Mac-06F11F11946D27C5", "MacBookPro11,5"],
- ["Mac-E43C1C25D4880AD6", "MacBookPro12,1"],
- ["Mac-473D31EABEB93F9B", "MacBookPro13,1"],
- ["Mac-66E35819EE2D0D05", "MacBookPro13,2"],
- ["Mac-1BDAB09B689867E2", "MacBookPro13,x"],
- ["Mac-A5C67F76ED83108C", "MacBookPro13,3"],
- ["Mac-B4831CEBD52A0C4C","MacBookPro14,1"],
- ["Mac-CAD6701F7CEA0921","MacBookPro14,2"],
- ["Mac-551B86E5744E2388","MacBookPro14,3"],
- ["Mac-942452F5819B1C1B", "MacBookAir3,1"],
- ["Mac-942C5DF58193131B", "MacBookAir3,2"],
- ["Mac-C08A6BB70A942AC2", "MacBookAir4,1"],
- ["Mac-742912EFDBEE19B3", "MacBookAir4,2"],
- ["Mac-66F35F19FE2A0D05", "MacBookAir5,1"],
- ["Mac-2E6FAB96566FE58C", "MacBookAir5,2"],
- ["Mac-35C1E88140C3E6CF", "MacBookAir6,1"],
- ["Mac-7DF21CB3ED6977E5", "MacBookAir6,2"],
- ["Mac-9F18E312C5C2BF0B", "MacBookAir7,1"],
- ["Mac-937CB26E2E02BB01", "MacBookAir7,2"],
- ["Mac-F2268CC8", "iMac10,1"],
- ["Mac-F2268DAE", "iMac11,1"],
- ["Mac-F2238AC8", "iMac11,2"],
- ["Mac-F2238BAE", "iMac11,3"],
- ["Mac-942B5BF58194151B", "iMac12,1"],
- ["Mac-942B59F58194171B", "iMac12,2"],
- ["Mac-00BE6ED71E35EB86", "iMac13,1"],
- ["Mac-FC02E91DDD3FA6A4", "iMac13,2"],
- ["Mac-7DF2A3B5E5D671ED", "iMac13,3"],
- ["Mac-031B6874CF7F642A", "iMac14,1"],
- ["Mac-27ADBB7B4CEE8E61", "iMac14,2"],
- ["Mac-77EB7D7DAF985301", "iMac14,3"],
- ["Mac-81E3E92DD6088272", "iMac14,4"],
- ["Mac-FA842E06C61E91C5", "iMac15,1"],
- ["Mac-42FD25EABCABB274", "iMac15,1"],
- ["Mac-A369DDC4E67F1C45", "iMac16,1"],
- ["Mac-FFE5EF870D7BA81A", "iMac16,2"],
- ["Mac-DB15BD556843C820", "iMac17,1"],
- ["Mac-65CE76090165799A", "iMac17,1"],
- ["Mac-B809C3757DA9BB8D", "iMac17,1"],
- ["Mac-4B682C642B45593E", "iMac18,1"],
- ["Mac-77F17D7DA9285301", "iMac18,2"],
- ["Mac-BE088AF8C5EB4FA2", "iMac18,3"],
- ["Mac-F2208EC8", "Macmini4,1"],
- ["Mac-8ED6AF5B48C039E1", "Macmini5,1"],
- ["Mac-4BC72D62AD45599E", "Macmini5,2"],
- ["Mac-7BA5B2794B2CDB12", "Macmini5,3"],
- ["Mac-031AEE4D24BFF0B1", "Macmini6,1"],
- ["Mac-F65AE981FFA204ED", "Macmini6,2"],
- ["Mac-35C5E08120C7EEAF", "Macmini7,1"],
- ["Mac-F221BEC8", "MacPro4,1"],
- ["Mac-F221DCC8", "MacPro5,1"],
- ["Mac-F60DEB81FF30ACF6", "MacPro6,1"],
- ["Mac-7BA5B2D9E42DDD94", "iMacPro1,1"],
- ["Mac-CF21D135A7D34AA6","Unknown"],
- ["Mac-112B0A653D3AAB9C","Unknown"],
- ["Mac-90BE64C3CB5A9AEB","Unknown"]
-]
+REPORT_FIELDS = ['boardID', 'modelID', 'smcVersion', 'isCurrentMachine', 'needsUpdate']
 
 class attrdict(dict):
 	__getattr__ = dict.__getitem__
 	__setattr__ = dict.__setitem__
 
 
-def getInstallSeed(scriptDirectory):
-	URL = "https://raw.githubusercontent.com/Piker-Alpha/HandyScripts/master/installSeed.py"
-	try:
-		req = urllib2.urlopen(URL)
-	except urllib2.URLError:
-		print >> sys.stderr("\nERROR: opening of (%s) failed. Aborting ...\n" % URL)
-	
-	filename = basename(URL)
-	filesize = req.info().getheader('Content-Length')
-	targetFile = os.path.join(scriptDirectory, filename)
-
-	if os.path.exists(targetFile):
-		os.remove(targetFile)
-	
-	with open(targetFile, 'w') as f:
-		print '\nDownloading: %s [%s bytes] ...' % (filename, filesize)
-		while True:
-			chunk = req.read(1024)
-			if not chunk:
-				break
-			f.write(chunk)
-		# get/set file mode (think chmod +x <filename>)
-		mode = os.fstat(f.fileno()).st_mode
-		mode |= stat.S_IXUSR
-		os.fchmod(f.fileno(), stat.S_IMODE(mode))
-
-
-def launchInstallSeed(unpackPath):
+def getIOKitFunctions():
+	global IOKit
+	if IOKit is None:
+		import objc
+		from Foundation import NSBundle
+		IOKitBundle = NSBundle.bundleWithIdentifier_('com.apple.framework.IOKit')
+		IOKit = attrdict()
+		objc.loadBundleFunctions(IOKitBundle, IOKit, functions)
+	return IOKit
+
+
+def launchInstallSeed(unpackPath, output=None):
 	scriptDirectory = os.path.dirname(os.path.abspath(__file__))
 	helperScript = os.path.join(scriptDirectory, INSTALLSEED)
-	# download installSeed if it isn't there
+	# the API and helper modules (tracing.py, singleFlight.py ...) are only in the local copy, so we no longer download it.
 	if not os.path.exists(helperScript):
-		getInstallSeed(scriptDirectory)
+		print >> sys.stderr, ("\nERROR: %s not found (it should be in %s with the other scripts). Aborting ...\n" % (INSTALLSEED, scriptDirectory))
+		sys.exit(-1)
 	#
-	# installSeed -a update -f FirmwareUpdate.pkg -t / -c 0 -u /tmp/FirmwareUpdate
+	# in-process version of: installSeed -a update -f FirmwareUpdate.pkg -t / -c 0 -u /tmp/FirmwareUpdate
 	#
-	cmd = [os.path.join(scriptDirectory, INSTALLSEED)]
-	cmd.extend(['-a', 'update'])
-	cmd.extend(['-f', 'FirmwareUpdate.pkg'])
-	cmd.extend(['-t', '/'])
-	cmd.extend(['-c', '0'])
-	cmd.extend(['-u', unpackPath])
-
+	# installSeed.py sets __OS_INSTALL (on import) for its installer runs, and not for the rest of this process.
+	osInstall = os.environ.get('__OS_INSTALL')
 	try:
-		retcode = subprocess.call(cmd)
-	except OSError, error:
-		print >> sys.stderr, ("ERROR: launch of installSeed.py failed with %s." % error)
-
-
-def getJSONFiles(path):
-	return glob.glob(path)
-
-
-def getModelByBoardID(boardID):
-	for x in boardIDModelIDs:
-		if boardID == x[0]:
-			return x[1]
-
-	return 'Unknown'
+		import installSeed
+	except ImportError, error:
+		print >> sys.stderr, ("\nERROR: import of %s failed with %s. Aborting ...\n" % (helperScript, error))
+		sys.exit(-1)
+	stdout = sys.stdout
+	os.environ['__OS_INSTALL'] = "1"
+
+	if output:
+		sys.stdout = output
+	try:
+		return installSeed.fetchAndExpandPackage('update', installSeed.DEFAULT_TARGET_OS_VERSION, 'FirmwareUpdate.pkg', unpackPath)
+	finally:
+		sys.stdout = stdout
+		if osInstall is None:
+			del os.environ['__OS_INSTALL']
+		else:
+			os.environ['__OS_INSTALL'] = osInstall
 
 
 def getMyBoardID():
-	return IORegistryEntryCreateCFProperty(IOServiceGetMatchingService(0, IOServiceMatching("IOPlatformExpertDevice")), "board-id", None, 0)
+	IOKit = getIOKitFunctions()
+	return IOKit.IORegistryEntryCreateCFProperty(IOKit.IOServiceGetMatchingService(0, IOKit.IOServiceMatching("IOPlatformExpertDevice")), "board-id", None, 0)
 
 
 def getMySMCVersion():
-	return IORegistryEntryCreateCFProperty(IOServiceGetMatchingService(0, IOServiceMatching("AppleSMC")), "smc-version", None, 0)
+	IOKit = getIOKitFunctions()
+	return IOKit.IORegistryEntryCreateCFProperty(IOKit.IOServiceGetMatchingService(0, IOKit.IOServiceMatching("AppleSMC")), "smc-version", None, 0)
 
 
 def showSystemData(linePrinted, boardID, modelID, smcVersion):
@@ -240,43 +154,63 @@ def showSystemData(linePrinted, boardID, modelID, smcVersion):
 
 
 def shouldWarnAboutUpdate(mySMCVersion, smcVersion):
-	if mySMCVersion < smcVersion:
-		return True
-	
-	return False
+	return isNewerSMCVersion(mySMCVersion, smcVersion)
 
 
 def main():
-	sys.stdout.write("\x1b[2J\x1b[H")
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-o', dest='outputFormat', choices=OUTPUT_FORMATS)
+	parser.add_argument('-T', '--trace', dest='traceFile')
+	parser.add_argument('-P', '--profile', dest='profileDirectory')
+	args = parser.parse_args()
+
+	if args.traceFile or args.profileDirectory:
+		tracing.enableTracing(args.traceFile, args.profileDirectory)
+
+	writer = None
+	installSeedOutput = None
+
+	if args.outputFormat:
+		writer = RecordWriter(args.outputFormat, REPORT_FIELDS)
+		# keep stdout clean for the records.
+		installSeedOutput = sys.stderr
+	else:
+		sys.stdout.write("\x1b[2J\x1b[H")
 
 	if not os.path.exists(FIRMWARE_PATH):
-		launchInstallSeed(FIRMWARE_PATH)
+		with tracing.span('installSeed', package='FirmwareUpdate.pkg'):
+			launchInstallSeed(FIRMWARE_PATH, installSeedOutput)
 
-	print '-----------------------------------------------------------'
-	print '  SMCver.py v%s Copyright (c) 2017 by Dr. Pike R. Alpha' % VERSION
-	print '-----------------------------------------------------------'
+	if not writer:
+		print '-----------------------------------------------------------'
+		print '  SMCver.py v%s Copyright (c) 2017 by Dr. Pike R. Alpha' % VERSION
+		print '-----------------------------------------------------------'
 
 	linePrinted = True
 	warnAboutSMCVersion = False
 	myBoardID = getMyBoardID()
 	mySMCVersion = getMySMCVersion()
 	jsonsPath = os.path.join(FIRMWARE_PATH, JSONS_PATH)
-	jsonFiles = getJSONFiles(jsonsPath)
+	with tracing.span('smcVersionTable'):
+		smcVersions = loadSMCVersionTable(jsonsPath)
 
-	for jsonFile in jsonFiles:
-		boardID = splitext(basename(jsonFile))[0]
+	for boardID in sorted(smcVersions):
+		smcVersion = smcVersions[boardID]
 		modelID = getModelByBoardID(boardID)
-
-		with open(jsonFile, 'r') as jsonFile:
-			jsonData = json.load(jsonFile)
-			smcData = jsonData[boardID]
-			if boardID == myBoardID:
-				linePrinted = showSystemData(linePrinted, boardID, modelID, smcData['smc-version'])
-				if shouldWarnAboutUpdate(mySMCVersion, smcData['smc-version']):
-					warnAboutSMCVersion = True
-			else:
-				print '  %20s | %16s |  v%-11s' % (boardID, modelID, smcData['smc-version'])
-				linePrinted = False
+		isCurrentMachine = (boardID == myBoardID)
+		needsUpdate = isCurrentMachine and shouldWarnAboutUpdate(mySMCVersion, smcVersion)
+		if needsUpdate:
+			warnAboutSMCVersion = True
+		if writer:
+			writer.write(boardID=boardID, modelID=modelID, smcVersion=smcVersion, isCurrentMachine=isCurrentMachine, needsUpdate=needsUpdate)
+		elif isCurrentMachine:
+			linePrinted = showSystemData(linePrinted, boardID, modelID, smcVersion)
+		else:
+			print '  %20s | %16s |  v%-11s' % (boardID, modelID, smcVersion)
+			linePrinted = False
+
+	if writer:
+		return
 
 	if linePrinted == False:
 		print '-----------------------------------------------------------'
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+#
+# Script (tracing.py) with timed spans (Chrome trace format) and optional cProfile stats per stage.
+#
+# Version 1.0 - Copyright (c) 2017-2018 by Dr. Pike R. Alpha (PikeRAlpha@yahoo.com)
+#
+# Updates:
+#		   - initial version.
+#
+# Usage:
+#		   - with tracing.span('catalog', url=catalogURL) as span:
+#		         span.addBytes(len(data))
+#		   - open the written trace file in chrome://tracing (or https://ui.perfetto.dev).
+#
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import threading
+
+#
+# Tracing is off until enableTracing is called (spans are almost free then).
+#
+traceFile = None
+profileDirectory = None
+mainPID = None
+events = []
+profileCount = [0]
+localData = threading.local()
+
+
+class NullSpan(object):
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		return False
+
+	def addBytes(self, count):
+		pass
+
+	def setArgument(self, name, value):
+		pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span(object):
+
+	def __init__(self, name, args):
+		self.name = name
+		self.args = args
+		self.profiler = None
+
+	def __enter__(self):
+		depth = getattr(localData, 'depth', 0)
+		localData.depth = depth + 1
+		# only stages (top level spans) are profiled, cProfile can't be nested.
+		if profileDirectory and depth == 0:
+			import cProfile
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		self.start = time.time()
+		return self
+
+	def __exit__(self, type, value, traceback):
+		end = time.time()
+		localData.depth -= 1
+		if self.profiler:
+			self.profiler.disable()
+			profileCount[0] += 1
+			name = re.sub(r'[^A-Za-z0-9_.-]', '_', self.name)
+			self.profiler.dump_stats(os.path.join(profileDirectory, "%s.%d.%d.prof" % (name, os.getpid(), profileCount[0])))
+		if type is not None:
+			self.args['error'] = str(value)
+		addEvent({'name': self.name, 'ph': 'X', 'ts': int(self.start * 1000000), 'dur': int((end - self.start) * 1000000),
+			'pid': os.getpid(), 'tid': threading.current_thread().ident, 'args': self.args})
+		return False
+
+	def addBytes(self, count):
+		self.args['bytes'] = self.args.get('bytes', 0) + count
+
+	def setArgument(self, name, value):
+		self.args[name] = value
+
+
+def span(name, **args):
+	if traceFile is None:
+		return NULL_SPAN
+	return Span(name, args)
+
+
+def addEvent(event):
+	if os.getpid() == mainPID:
+		events.append(event)
+	else:
+		# (Pool) worker processes don't run atexit handlers, so their events are written right away.
+		with open("%s.%d" % (traceFile, os.getpid()), 'a') as f:
+			f.write(json.dumps(event) + "\n")
+
+
+def enableTracing(path, profilePath=None):
+	# without a trace file, the trace is written next to the profile stats.
+	global traceFile, profileDirectory, mainPID
+	traceFile = os.path.abspath(path or os.path.join(profilePath, "trace.json"))
+	mainPID = os.getpid()
+
+	if profilePath:
+		profileDirectory = os.path.abspath(profilePath)
+		if not os.path.isdir(profileDirectory):
+			os.makedirs(profileDirectory)
+
+	atexit.register(writeTrace)
+
+
+def readWorkerEvents():
+	import glob
+	workerEvents = []
+
+	for path in glob.glob(traceFile + ".*"):
+		if not re.match(r'\d+$', path[len(traceFile) + 1:]):
+			continue
+		with open(path, 'r') as f:
+			workerEvents.extend(json.loads(line) for line in f if line.strip())
+		os.remove(path)
+
+	return workerEvents
+
+
+def writeTrace():
+	if traceFile is None or os.getpid() != mainPID:
+		return
+
+	allEvents = events + readWorkerEvents()
+	allEvents.sort(key=lambda event: event['ts'])
+	temporaryFile = traceFile + ".tmp"
+
+	try:
+		with open(temporaryFile, 'w') as f:
+			json.dump({'traceEvents': allEvents, 'displayTimeUnit': 'ms'}, f)
+		os.rename(temporaryFile, traceFile)
+	except (IOError, OSError) as error:
+		print("ERROR: writing of %s failed with %s." % (traceFile, error), file=sys.stderr)
+
+
+def showSummary(path):
+	# total time per span name, for a quick look without a trace viewer.
+	with open(path, 'r') as f:
+		traceEvents = json.load(f)['traceEvents']
+	totals = {}
+
+	for event in traceEvents:
+		count, duration, byteCount = totals.get(event['name'], (0, 0, 0))
+		totals[event['name']] = (count + 1, duration + event['dur'], byteCount + event['args'].get('bytes', 0))
+
+	for name, (count, duration, byteCount) in sorted(totals.items(), key=lambda item: -item[1][1]):
+		print("%-24s %6i x %12.3f s %14i bytes" % (name, count, duration / 1000000.0, byteCount))
+
+
+if __name__ == "__main__":
+	for path in sys.argv[1:]:
+		showSummary(path)